@@ -4,30 +4,50 @@ from langgraph.checkpoint.memory import MemorySaver
 from src.agent.state import State
 from langchain_openai import ChatOpenAI
 import os
+import time
 from dotenv import load_dotenv
 from src.agent.utils import create_agent
 from src.agent.prompts import system_prompt 
 from src.agent.tools import get_all_tools_async
 
+try:
+    # 在 su-cli 中运行时，使用 CLI 提供的共享连接池
+    from llm_factory import get_chat_model
+except ImportError:
+    get_chat_model = None
+
 load_dotenv()
 
-# 创建ChatOpenAI实例
-model_name = os.getenv("DEEPSEEK_MODEL") or os.getenv("MODEL_NAME")
-llm = ChatOpenAI(
-    model=model_name,
-    base_url=os.getenv("DEEPSEEK_BASE_URL"),
-    api_key=os.getenv("DEEPSEEK_API_KEY"),
-    temperature=0
-)
+# ChatOpenAI 实例在第一次调用时创建，按模型名缓存
+_llms = {}
+
+def get_default_model_name():
+    return os.getenv("DEEPSEEK_MODEL") or os.getenv("MODEL_NAME")
+
+def get_llm(model_name=None):
+    """获取聊天模型（首次调用时创建），未指定模型时使用默认模型"""
+    model_name = model_name or get_default_model_name()
+    if model_name not in _llms:
+        model_kwargs = dict(
+            model=model_name,
+            base_url=os.getenv("DEEPSEEK_BASE_URL"),
+            api_key=os.getenv("DEEPSEEK_API_KEY"),
+            temperature=0
+        )
+        _llms[model_name] = get_chat_model(**model_kwargs) if get_chat_model else ChatOpenAI(**model_kwargs)
+    return _llms[model_name]
 
 # 全局工具缓存
 _tools_cache = None
 _tools_initialized = False
 _mcp_manager = None
+_tool_result_cache = None
+_model_router = None
+_tool_selector = None
 
 async def _initialize_tools():
     """初始化工具（只执行一次）"""
-    global _tools_cache, _tools_initialized, _mcp_manager
+    global _tools_cache, _tools_initialized, _mcp_manager, _tool_result_cache, _model_router, _tool_selector
     
     if _tools_initialized:
         # print(f"🔄 使用缓存的 {len(_tools_cache)} 个工具（跳过初始化）")
@@ -36,19 +56,19 @@ async def _initialize_tools():
     # print("🔧 开始初始化工具...")
     
     try:
-        # 本地工具
-        from src.agent.tools import get_current_time
-        local_tools = [get_current_time]
-        
         # 使用 MCP 管理器获取 MCP 工具 - 只创建一次并缓存
         from src.agent.mcp_utils import MCPToolManager
+        from src.agent.tools import get_local_tools, merge_tools
         _mcp_manager = MCPToolManager()
         client_config = _mcp_manager._convert_config_for_client()
         
+        # 本地工具（包括按配置启用的原生文件系统工具）
+        local_tools = get_local_tools(_mcp_manager.config)
+        
         if client_config:
-            # 使用缓存的 MCP 管理器加载工具
+            # 使用缓存的 MCP 管理器加载工具，同名工具由本地实现接管
             mcp_tools = await _mcp_manager.load_tools()
-            _tools_cache = local_tools + mcp_tools
+            _tools_cache = merge_tools(local_tools, mcp_tools)
             
             # 调试信息：显示可用的工具
             tool_names = [tool.name for tool in _tools_cache]
@@ -59,6 +79,32 @@ async def _initialize_tools():
             tool_names = [tool.name for tool in _tools_cache]
             # print(f"✅ {len(tool_names)} tools initialized (local only)")
         
+        # 为幂等工具加上结果缓存；启用原生文件系统工具时，相对路径与工具一样按沙箱根目录解析
+        from src.agent.tool_cache import wrap_idempotent_tools
+        fs_config = _mcp_manager.config.get("nativeTools", {}).get("filesystem", {})
+        _tools_cache, _tool_result_cache = wrap_idempotent_tools(
+            _tools_cache, _mcp_manager.config.get("toolCache", {}),
+            root=fs_config.get("root") if fs_config.get("enabled") else None,
+        )
+        
+        # 过大的工具输出转存到磁盘，消息中只保留开头和 handle
+        from src.agent.output_store import wrap_large_output_tools
+        _tools_cache = wrap_large_output_tools(
+            _tools_cache, _mcp_manager.config.get("toolOutputStore", {})
+        )
+
+        # 工具定义位于请求前缀中，按名称排序使其不受 MCP 服务器发现顺序影响，
+        # 让模型服务的前缀缓存能够命中
+        _tools_cache = sorted(_tools_cache, key=lambda tool: tool.name)
+
+        # 按相关性为每轮选择工具子集
+        from src.agent.tool_selection import build_tool_selector
+        _tool_selector = build_tool_selector(_tools_cache, _mcp_manager.config.get("toolSelection", {}))
+        
+        # 按配置在快速模型和强模型之间路由
+        from src.agent.router import build_router
+        _model_router = build_router(_mcp_manager.config.get("modelRouting", {}), get_default_model_name())
+        
         _tools_initialized = True
         # print("🎯 工具初始化完成，设置缓存标志")
         return _tools_cache
@@ -71,20 +117,66 @@ async def _initialize_tools():
         _tools_initialized = True
         return _tools_cache
 
+def get_tool_cache_stats():
+    """获取工具结果缓存的每工具命中统计，未启用缓存时返回空字典"""
+    if _tool_result_cache is None:
+        return {}
+    return _tool_result_cache.get_stats()
+
+def get_tool_names():
+    """获取已加载的工具名称（供 CLI 补全），工具尚未初始化时返回空列表"""
+    if not _tools_initialized:
+        return []
+    return [tool.name for tool in _tools_cache]
+
+async def close_resources():
+    """释放模块级的 MCP 会话和连接池（CLI 退出时调用）"""
+    global _mcp_manager, _tools_initialized
+    if _mcp_manager is not None:
+        await _mcp_manager.close()
+        _mcp_manager = None
+    _tools_initialized = False
+    
+    from src.agent.tools import close_mcp_manager
+    await close_mcp_manager()
+
+def get_route_stats():
+    """获取模型路由的统计，未启用路由时返回空字典"""
+    if _model_router is None:
+        return {}
+    return _model_router.get_stats()
+
 async def chatbot_node(state: State):
     """聊天机器人节点"""
     try:
         # 获取缓存的工具（首次调用时初始化）
         tools = await _initialize_tools()
         
-        # 创建agent，添加系统提示和所有工具
-        agent = create_agent("chatbot", llm, tools, system_prompt)
+        # 选择本轮使用的模型
+        route = _model_router.route(state["messages"]) if _model_router else None
+        llm = get_llm(route.model if route else None)
+        
+        # 只绑定与本轮相关的工具（启用 toolSelection 时；会改变请求前缀，降低前缀缓存命中率）
+        if _tool_selector:
+            tools = _tool_selector.select(state["messages"])
+        
+        # 创建agent，添加系统提示和工具；此前对话的摘要追加在系统提示之后（只有一条系统消息，
+        # 系统提示本身作为不变的前缀，前缀缓存仍能命中）
+        prompt = system_prompt
+        if state.get("summary"):
+            prompt = f"{system_prompt}\n\n此前对话的摘要：\n{state['summary']}"
+        agent = create_agent("chatbot", llm, tools, prompt)
         
         # 执行 agent 并返回结果
+        start = time.perf_counter()
         response = await agent.ainvoke(state)
+        if route:
+            _model_router.record(route, time.perf_counter() - start)
         
         if isinstance(response, dict) and 'messages' in response:
             new_messages = response['messages'][len(state['messages']):]
+            if _tool_selector:
+                _tool_selector.record_usage(new_messages)
             return {"messages": new_messages}
         else:
             return response
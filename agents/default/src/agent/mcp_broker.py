@@ -0,0 +1,553 @@
+"""共享 MCP broker
+
+多个 su-cli 进程默认各自启动 mcp_config.json 中的所有 MCP 服务器。
+broker 是一个可选的本地常驻进程：它持有每个 stdio 服务器的唯一一个进程，
+通过 Unix socket 接受多个 su-cli 客户端的连接，并把它们的 JSON-RPC 请求
+复用到同一个服务器上：
+
+- 每个客户端连接通过首行 {"op": "attach", "server": <name>} 绑定到一个服务器，
+  之后双方直接交换按行分隔的 JSON-RPC 消息（与 MCP stdio 传输的格式一致）
+- 客户端的请求 id 会被重新映射为 broker 内唯一的上游 id，响应再映射回来
+- initialize 由 broker 对每个服务器只执行一次，客户端的 initialize 直接返回缓存结果
+- 各客户端的请求进入独立队列，按轮询方式分发，并限制每个服务器的在途请求数，
+  避免单个客户端的大量请求饿死其他客户端
+
+启动方式（在 agent 目录下）：
+
+    uv run python -m src.agent.mcp_broker
+
+MCPToolManager 在检测到 broker 正在运行时会自动通过它连接 stdio 服务器。
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import os
+import signal
+import socket
+from collections import deque
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from .utils import get_state_dir
+
+if TYPE_CHECKING:
+    from .mcp_utils import MCPToolManager
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = "2025-03-26"
+DEFAULT_MAX_IN_FLIGHT = 8
+# 单条 JSON-RPC 消息的最大长度
+STREAM_LIMIT = 64 * 1024 * 1024
+
+
+def get_socket_path(config: Dict[str, Any]) -> Path:
+    """获取 broker 的 socket 路径，默认位于 su-cli 状态目录下"""
+    socket_path = config.get("broker", {}).get("socket")
+    if socket_path:
+        return Path(socket_path).expanduser()
+    return get_state_dir() / "mcp-broker.sock"
+
+
+def is_broker_running(socket_path: Path) -> bool:
+    """检测 broker 是否在指定 socket 上监听"""
+    if not hasattr(socket, "AF_UNIX") or not socket_path.exists():
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(0.2)
+        try:
+            sock.connect(str(socket_path))
+            return True
+        except OSError:
+            return False
+
+
+def _encode(message: Dict[str, Any]) -> bytes:
+    return (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class _ClientConnection:
+    """broker 侧的客户端连接，发送经由独立的写任务，避免慢客户端阻塞上游读取"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.id = next(self._ids)
+        self.reader = reader
+        self.writer = writer
+        self._outbox: asyncio.Queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._write_loop())
+
+    def send(self, message: Dict[str, Any]):
+        self._outbox.put_nowait(message)
+
+    async def _write_loop(self):
+        try:
+            while True:
+                message = await self._outbox.get()
+                self.writer.write(_encode(message))
+                await self.writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    async def close(self):
+        self._writer_task.cancel()
+        with contextlib.suppress(Exception):
+            self.writer.close()
+            await self.writer.wait_closed()
+
+
+class UpstreamServer:
+    """broker 持有的单个 stdio MCP 服务器进程"""
+
+    def __init__(self, name: str, command: str, args: list, env: Dict[str, str],
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT):
+        self.name = name
+        self.command = command
+        self.args = args
+        self.env = env
+        self.max_in_flight = max_in_flight
+
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.init_result: Optional[Dict[str, Any]] = None
+        self.clients: Dict[int, _ClientConnection] = {}
+
+        # 上游 id -> (客户端, 客户端原始 id)
+        self._pending: Dict[int, Tuple[_ClientConnection, Any]] = {}
+        self._internal: Dict[int, asyncio.Future] = {}
+        self._queues: Dict[int, deque] = {}
+        self._ready: deque = deque()
+        self._in_flight = 0
+        self._ids = itertools.count(1)
+        self._wakeup = asyncio.Event()
+        self._start_lock = asyncio.Lock()
+        self._tasks: list = []
+        # 发出后不等待的任务（转发通知、按需重启），保留引用以免被垃圾回收
+        self._background: set = set()
+        self._restarting: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    @property
+    def ready(self) -> bool:
+        """进程在运行且已完成 initialize 握手；服务器退出时 _fail_pending 会清除握手结果"""
+        return self.running and self.init_result is not None
+
+    async def ensure_started(self):
+        """启动服务器进程并完成 initialize 握手（已在运行时直接返回）"""
+        async with self._start_lock:
+            if self.ready:
+                return
+
+            # 重启时先结束上一个进程的读取和分发任务，避免两组任务同时运行
+            await self._stop_tasks()
+            if self.running:
+                # 关闭了 stdout 但仍未退出的旧进程
+                self.process.kill()
+
+            env = {**os.environ, **self.env}
+            self.process = await asyncio.create_subprocess_exec(
+                self.command, *self.args,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                env=env,
+                limit=STREAM_LIMIT,
+            )
+            self._tasks = [
+                asyncio.create_task(self._read_loop()),
+                asyncio.create_task(self._dispatch_loop()),
+            ]
+
+            response = await self._request("initialize", {
+                "protocolVersion": PROTOCOL_VERSION,
+                "capabilities": {},
+                "clientInfo": {"name": "su-cli-mcp-broker", "version": "0.1.0"},
+            })
+            if "error" in response:
+                raise RuntimeError(f"MCP 服务器 {self.name} 初始化失败: {response['error']}")
+            self.init_result = response["result"]
+            await self._write({"jsonrpc": "2.0", "method": "notifications/initialized"})
+            logger.info(f"MCP 服务器已就绪: {self.name} (pid {self.process.pid})")
+            # 重启期间排队的请求开始分发
+            self._wakeup.set()
+
+    async def _stop_tasks(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _request(self, method: str, params: Dict[str, Any], timeout: float = 120.0) -> Dict[str, Any]:
+        """broker 自己发出的请求（不经过客户端队列）"""
+        upstream_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._internal[upstream_id] = future
+        try:
+            await self._write({"jsonrpc": "2.0", "id": upstream_id, "method": method, "params": params})
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._internal.pop(upstream_id, None)
+
+    async def _write(self, message: Dict[str, Any]):
+        self.process.stdin.write(_encode(message))
+        await self.process.stdin.drain()
+
+    def attach(self, client: _ClientConnection):
+        self.clients[client.id] = client
+        self._queues[client.id] = deque()
+
+    def detach(self, client: _ClientConnection):
+        """客户端断开：丢弃其排队的请求，并取消其在途请求"""
+        self.clients.pop(client.id, None)
+        self._queues.pop(client.id, None)
+        with contextlib.suppress(ValueError):
+            self._ready.remove(client.id)
+
+        for upstream_id, (owner, _) in list(self._pending.items()):
+            if owner is client:
+                self._abandon(upstream_id, "client disconnected")
+
+    def handle_client_message(self, client: _ClientConnection, message: Dict[str, Any]):
+        """处理客户端发来的一条 JSON-RPC 消息"""
+        method = message.get("method")
+        if method is None:
+            # 客户端对服务器请求的响应；broker 不转发服务器发起的请求，忽略
+            return
+
+        if method == "initialize":
+            client.send({"jsonrpc": "2.0", "id": message["id"], "result": self.init_result})
+        elif method == "notifications/initialized":
+            pass
+        elif method == "ping" and "id" in message:
+            client.send({"jsonrpc": "2.0", "id": message["id"], "result": {}})
+        elif method == "notifications/cancelled":
+            self._cancel(client, message.get("params", {}).get("requestId"))
+        elif "id" not in message:
+            self._forward_soon(message)
+        else:
+            self._queues[client.id].append(message)
+            if client.id not in self._ready:
+                self._ready.append(client.id)
+            if self.ready:
+                self._wakeup.set()
+            elif self._restarting is None:
+                # 服务器进程已退出：按需重启，请求在重启完成后分发
+                self._restarting = self._spawn(self._restart())
+
+    def _cancel(self, client: _ClientConnection, request_id: Any):
+        """取消客户端的请求：仍在排队的直接移除，已发出的转发取消通知"""
+        queue = self._queues.get(client.id)
+        if queue:
+            for queued in list(queue):
+                if queued.get("id") == request_id:
+                    queue.remove(queued)
+                    return
+
+        for upstream_id, (owner, original_id) in list(self._pending.items()):
+            if owner is client and original_id == request_id:
+                self._abandon(upstream_id)
+                return
+
+    def _abandon(self, upstream_id: int, reason: Optional[str] = None):
+        """
+        放弃一个在途请求：通知服务器取消，并立即释放在途名额
+
+        按 MCP 规范，服务器收到取消通知后不再响应该请求，不能等响应到达时才释放名额，
+        否则每次取消或断开都会永久占用一个名额。取消后仍到达的响应在 _route_response 中忽略。
+        """
+        params: Dict[str, Any] = {"requestId": upstream_id}
+        if reason:
+            params["reason"] = reason
+        # 先安排写出取消通知，再唤醒分发循环，保证取消通知先于下一个请求到达服务器
+        self._forward_soon({"jsonrpc": "2.0", "method": "notifications/cancelled", "params": params})
+
+        self._pending.pop(upstream_id, None)
+        self._in_flight -= 1
+        self._wakeup.set()
+
+    def _forward_soon(self, message: Dict[str, Any]):
+        if self.running:
+            self._spawn(self._write(message))
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._on_background_done)
+        return task
+
+    def _on_background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"MCP 服务器 {self.name} 的后台任务失败: {task.exception()}")
+
+    async def _restart(self):
+        try:
+            await self.ensure_started()
+        except Exception as e:
+            logger.error(f"重启 MCP 服务器 {self.name} 失败: {e}")
+            self._fail_queued(f"MCP server restart failed: {e}")
+        finally:
+            self._restarting = None
+
+    async def _dispatch_loop(self):
+        """按客户端轮询分发排队的请求，并限制在途请求数"""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            while self._ready and self._in_flight < self.max_in_flight and self.ready:
+                client_id = self._ready.popleft()
+                queue = self._queues.get(client_id)
+                if not queue:
+                    continue
+                message = queue.popleft()
+                if queue:
+                    self._ready.append(client_id)
+
+                upstream_id = next(self._ids)
+                self._pending[upstream_id] = (self.clients[client_id], message["id"])
+                self._in_flight += 1
+                await self._write({**message, "id": upstream_id})
+
+    async def _read_loop(self):
+        """读取服务器输出并把响应路由回对应的客户端"""
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                break
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                # 部分服务器会向 stdout 打印非 JSON 日志
+                continue
+
+            if "method" not in message and "id" in message:
+                self._route_response(message)
+            elif "method" in message and "id" in message:
+                # 服务器发起的请求（sampling、roots 等），broker 不支持
+                await self._write({
+                    "jsonrpc": "2.0",
+                    "id": message["id"],
+                    "error": {"code": -32601, "message": "Not supported by su-cli MCP broker"},
+                })
+            elif message.get("method", "").endswith("/list_changed"):
+                for client in self.clients.values():
+                    client.send(message)
+
+        logger.warning(f"MCP 服务器进程已退出: {self.name}")
+        # 已连接客户端的在途和排队请求立即返回错误，之后的请求会触发重启
+        self._fail_pending("MCP server process exited")
+        self._fail_queued("MCP server process exited")
+
+    def _route_response(self, message: Dict[str, Any]):
+        upstream_id = message["id"]
+        future = self._internal.get(upstream_id)
+        if future is not None:
+            if not future.done():
+                future.set_result(message)
+            return
+
+        entry = self._pending.pop(upstream_id, None)
+        if entry is None:
+            return
+        self._in_flight -= 1
+        self._wakeup.set()
+
+        client, original_id = entry
+        if client.id in self.clients:
+            client.send({**message, "id": original_id})
+
+    def _fail_pending(self, reason: str):
+        for client, original_id in self._pending.values():
+            if client.id in self.clients:
+                client.send({
+                    "jsonrpc": "2.0",
+                    "id": original_id,
+                    "error": {"code": -32603, "message": reason},
+                })
+        self._pending.clear()
+        self._in_flight = 0
+        self.init_result = None
+        for future in self._internal.values():
+            if not future.done():
+                future.set_exception(RuntimeError(reason))
+
+    def _fail_queued(self, reason: str):
+        for client_id, queue in self._queues.items():
+            client = self.clients[client_id]
+            while queue:
+                client.send({
+                    "jsonrpc": "2.0",
+                    "id": queue.popleft()["id"],
+                    "error": {"code": -32603, "message": reason},
+                })
+        self._ready.clear()
+
+    async def close(self):
+        for task in [*self._tasks, *self._background]:
+            task.cancel()
+        if self.running:
+            self.process.terminate()
+            try:
+                await asyncio.wait_for(self.process.wait(), 2.0)
+            except asyncio.TimeoutError:
+                self.process.kill()
+
+
+class MCPBroker:
+    """在 Unix socket 上为多个客户端复用 MCP 服务器进程"""
+
+    def __init__(self, manager: "MCPToolManager", socket_path: Path):
+        self.socket_path = socket_path
+        max_in_flight = manager.config.get("broker", {}).get("maxInFlight", DEFAULT_MAX_IN_FLIGHT)
+
+        # 复用 MCPToolManager 的 stdio 配置转换（npx 静默参数、静默环境变量）
+        self.servers: Dict[str, UpstreamServer] = {}
+        for name, connection in manager._convert_config_for_client().items():
+            if connection.get("transport") != "stdio":
+                continue
+            self.servers[name] = UpstreamServer(
+                name, connection["command"], list(connection.get("args", [])),
+                dict(connection.get("env") or {}), max_in_flight,
+            )
+
+    async def serve(self, stop: asyncio.Event):
+        """启动所有服务器并监听 socket，直到 stop 被设置"""
+        results = await asyncio.gather(
+            *(server.ensure_started() for server in self.servers.values()), return_exceptions=True
+        )
+        for server, result in zip(self.servers.values(), results):
+            if isinstance(result, Exception):
+                logger.error(f"启动 MCP 服务器 {server.name} 失败: {result}")
+
+        if self.socket_path.exists() and not is_broker_running(self.socket_path):
+            self.socket_path.unlink()
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+
+        listener = await asyncio.start_unix_server(
+            self._handle_client, path=str(self.socket_path), limit=STREAM_LIMIT
+        )
+        os.chmod(self.socket_path, 0o600)
+        logger.info(f"MCP broker 正在监听: {self.socket_path} (服务器: {', '.join(self.servers)})")
+
+        try:
+            await stop.wait()
+        finally:
+            listener.close()
+            await listener.wait_closed()
+            with contextlib.suppress(FileNotFoundError):
+                self.socket_path.unlink()
+            await asyncio.gather(*(server.close() for server in self.servers.values()))
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = _ClientConnection(reader, writer)
+        server = None
+        try:
+            line = await reader.readline()
+            if not line:
+                return
+            hello = json.loads(line)
+            server = self.servers.get(hello.get("server"))
+            if hello.get("op") != "attach" or server is None:
+                client.send({"op": "error", "message": f"unknown server: {hello.get('server')}"})
+                return
+
+            await server.ensure_started()
+            server.attach(client)
+            client.send({"op": "attached", "server": server.name})
+
+            while line := await reader.readline():
+                try:
+                    server.handle_client_message(client, json.loads(line))
+                except (json.JSONDecodeError, KeyError) as e:
+                    logger.debug(f"忽略无效的客户端消息: {e}")
+        except Exception as e:
+            logger.error(f"处理 broker 客户端连接失败: {e}")
+            client.send({"op": "error", "message": str(e)})
+        finally:
+            if server is not None:
+                server.detach(client)
+            await asyncio.sleep(0)
+            await client.close()
+
+
+@contextlib.asynccontextmanager
+async def broker_streams(socket_path: Path, server_name: str):
+    """通过 broker 连接到指定服务器，返回供 mcp.ClientSession 使用的读写流
+
+    与 mcp 的 stdio_client 相同，产出 (read_stream, write_stream)。
+    """
+    import anyio
+    from mcp import types
+    from mcp.shared.message import SessionMessage
+
+    reader, writer = await asyncio.open_unix_connection(str(socket_path), limit=STREAM_LIMIT)
+    writer.write(_encode({"op": "attach", "server": server_name}))
+    await writer.drain()
+    ack = json.loads(await reader.readline() or b"{}")
+    if ack.get("op") != "attached":
+        writer.close()
+        raise ConnectionError(f"broker 拒绝连接 {server_name}: {ack.get('message', 'no response')}")
+
+    read_stream_writer, read_stream = anyio.create_memory_object_stream(0)
+    write_stream, write_stream_reader = anyio.create_memory_object_stream(0)
+
+    async def socket_reader():
+        async with read_stream_writer:
+            while line := await reader.readline():
+                try:
+                    message = types.JSONRPCMessage.model_validate_json(line)
+                except Exception as exc:
+                    await read_stream_writer.send(exc)
+                    continue
+                await read_stream_writer.send(SessionMessage(message))
+
+    async def socket_writer():
+        async with write_stream_reader:
+            async for session_message in write_stream_reader:
+                payload = session_message.message.model_dump_json(by_alias=True, exclude_none=True)
+                writer.write((payload + "\n").encode("utf-8"))
+                await writer.drain()
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(socket_reader)
+        tg.start_soon(socket_writer)
+        try:
+            yield read_stream, write_stream
+        finally:
+            writer.close()
+            tg.cancel_scope.cancel()
+
+
+async def _main(config_path: str, socket_override: Optional[str]):
+    from .mcp_utils import MCPToolManager
+
+    manager = MCPToolManager(config_path)
+    socket_path = Path(socket_override).expanduser() if socket_override else get_socket_path(manager.config)
+    if is_broker_running(socket_path):
+        logger.error(f"已有 broker 在运行: {socket_path}")
+        return
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await MCPBroker(manager, socket_path).serve(stop)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Su-Cli 共享 MCP broker")
+    parser.add_argument("--config", default="mcp_config.json", help="MCP 配置文件路径")
+    parser.add_argument("--socket", default=None, help="Unix socket 路径（默认读取配置或 ~/.su-cli/mcp-broker.sock）")
+    cli_args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(_main(cli_args.config, cli_args.socket))
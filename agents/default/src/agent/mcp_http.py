@@ -0,0 +1,108 @@
+"""HTTP / SSE MCP 传输的共享连接池
+
+所有基于 URL 的 MCP 服务器（streamable-http / SSE）共用同一个 httpx 连接池：
+长连接复用，安装了 h2 时启用 HTTP/2。mcp 客户端会在会话结束时关闭它创建的
+AsyncClient，因此每个会话拿到的是一个轻量的 AsyncClient，底层传输委托给共享池，
+关闭会话不会关闭池中的连接。
+"""
+
+import logging
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# 与 mcp 默认客户端保持一致的超时设置
+DEFAULT_TIMEOUT = httpx.Timeout(30.0)
+POOL_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=60.0)
+
+_shared_pool: Optional[httpx.AsyncHTTPTransport] = None
+
+
+class _SharedTransport(httpx.AsyncBaseTransport):
+    """把请求委托给共享连接池的传输层，关闭时不释放池"""
+
+    def __init__(self, pool: httpx.AsyncHTTPTransport):
+        self._pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._pool.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        # 连接池的生命周期由 close_shared_pool() 管理
+        pass
+
+
+def get_shared_pool() -> httpx.AsyncHTTPTransport:
+    """获取（必要时创建）共享连接池"""
+    global _shared_pool
+    if _shared_pool is None:
+        _shared_pool = httpx.AsyncHTTPTransport(http2=HTTP2_AVAILABLE, limits=POOL_LIMITS)
+        logger.debug(f"创建 MCP HTTP 连接池 (HTTP/2: {HTTP2_AVAILABLE})")
+    return _shared_pool
+
+
+def pooled_client_factory(
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[httpx.Timeout] = None,
+    auth: Optional[httpx.Auth] = None,
+) -> httpx.AsyncClient:
+    """供 mcp 客户端使用的 httpx_client_factory，返回基于共享连接池的客户端"""
+    return httpx.AsyncClient(
+        transport=_SharedTransport(get_shared_pool()),
+        headers=headers,
+        timeout=timeout or DEFAULT_TIMEOUT,
+        auth=auth,
+        follow_redirects=True,
+    )
+
+
+async def close_shared_pool():
+    """关闭共享连接池"""
+    global _shared_pool
+    if _shared_pool is not None:
+        await _shared_pool.aclose()
+        _shared_pool = None
+
+
+def build_http_connection(server_config: Dict[str, Any]) -> Dict[str, Any]:
+    """把 mcp_config.json 中基于 url 的服务器配置转换为 MultiServerMCPClient 连接
+
+    transport 可以是 streamable_http 或 sse；未指定时以 /sse 结尾的 URL 视为 SSE，
+    其余视为 streamable-http。
+    """
+    url = server_config["url"]
+    transport = server_config.get("transport") or server_config.get("type")
+    if transport in (None, "http", "streamable-http", "streamableHttp"):
+        transport = "sse" if transport is None and url.rstrip("/").endswith("/sse") else "streamable_http"
+
+    connection: Dict[str, Any] = {
+        "transport": transport,
+        "url": url,
+        "headers": server_config.get("headers", {}),
+        "httpx_client_factory": pooled_client_factory,
+    }
+
+    timeout = server_config.get("timeout")
+    sse_read_timeout = server_config.get("sseReadTimeout")
+    if transport == "streamable_http":
+        # streamable-http 连接的超时使用 timedelta
+        if timeout is not None:
+            connection["timeout"] = timedelta(seconds=timeout)
+        if sse_read_timeout is not None:
+            connection["sse_read_timeout"] = timedelta(seconds=sse_read_timeout)
+    else:
+        if timeout is not None:
+            connection["timeout"] = timeout
+        if sse_read_timeout is not None:
+            connection["sse_read_timeout"] = sse_read_timeout
+
+    return connection
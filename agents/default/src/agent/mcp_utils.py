@@ -1,5 +1,7 @@
 """MCP (Model Context Protocol) utilities for loading and managing external tools."""
 
+import asyncio
+import contextlib
 import json
 import logging
 import subprocess
@@ -10,6 +12,9 @@ from typing import Any, Dict, List, Optional
 from langchain_mcp_adapters.client import MultiServerMCPClient
 from langchain_mcp_adapters.sessions import StdioConnection
 
+from .mcp_broker import broker_streams, get_socket_path, is_broker_running
+from .mcp_http import build_http_connection, close_shared_pool
+
 logger = logging.getLogger(__name__)
 
 
@@ -61,6 +66,8 @@ class MCPToolManager:
         self.config = self._load_config()
         self.loaded_tools = []
         self.client = None
+        self._broker_task: Optional[asyncio.Task] = None
+        self._broker_stop: Optional[asyncio.Event] = None
     
     def _load_config(self) -> Dict[str, Any]:
         """加载 MCP 配置文件"""
@@ -109,6 +116,11 @@ class MCPToolManager:
                     env=server_config.get("env", {}),
                 )
                 client_config[server_name] = connection
+            elif "url" in server_config:
+                # 基于 URL 的 streamable-http / SSE 服务器，共用一个 httpx 连接池
+                client_config[server_name] = build_http_connection(server_config)
+            else:
+                logger.warning(f"MCP 服务器 {server_name} 既没有 command 也没有 url，已跳过")
         
         return client_config
     
@@ -161,7 +173,7 @@ class MCPToolManager:
                     
                     try:
                         self.client = MultiServerMCPClient(client_config)
-                        tools = await self.client.get_tools()
+                        tools = await self._load_server_tools(client_config)
                     finally:
                         # 恢复原始的 stdout/stderr
                         os.dup2(old_stdout, 1)
@@ -193,17 +205,108 @@ class MCPToolManager:
             logger.error(f"加载 MCP 工具失败: {e}")
             return []
     
+    async def _load_server_tools(self, client_config: Dict[str, Any]) -> List[Any]:
+        """逐个服务器加载工具，并按配置加上并发限制和调用期限"""
+        from .tool_limits import build_limiter
+        
+        # broker 正在运行时，stdio 服务器通过 broker 共享，不再各自启动进程
+        broker_tools = {}
+        broker_servers = self._get_broker_servers(client_config)
+        if broker_servers:
+            broker_tools = await self._load_broker_tools(broker_servers)
+        
+        tools = []
+        for server_name in client_config:
+            try:
+                if server_name in broker_servers:
+                    if server_name not in broker_tools:
+                        continue
+                    server_tools = broker_tools[server_name]
+                else:
+                    server_tools = await self.client.get_tools(server_name=server_name)
+            except Exception as e:
+                logger.error(f"从 MCP 服务器 {server_name} 获取工具失败: {e}")
+                continue
+            
+            limiter = build_limiter(server_name, self.config)
+            if limiter:
+                server_tools = [limiter.wrap(tool) for tool in server_tools]
+            tools.extend(server_tools)
+        
+        return tools
+    
+    def _get_broker_servers(self, client_config: Dict[str, Any]) -> List[str]:
+        """返回应通过共享 broker 连接的 stdio 服务器；broker 未运行或被禁用时为空"""
+        if not self.config.get("broker", {}).get("enabled", True):
+            return []
+        
+        stdio_servers = [
+            name for name, connection in client_config.items()
+            if connection.get("transport") == "stdio"
+        ]
+        if not stdio_servers or not is_broker_running(get_socket_path(self.config)):
+            return []
+        
+        logger.debug(f"通过 MCP broker 连接服务器: {stdio_servers}")
+        return stdio_servers
+    
+    async def _load_broker_tools(self, server_names: List[str]) -> Dict[str, List[Any]]:
+        """通过 broker 为各服务器建立持久会话并加载工具
+        
+        会话在一个后台任务中打开并保持，直到 close() 被调用；
+        anyio 的取消作用域要求会话在同一个任务中进入和退出。
+        """
+        ready = asyncio.get_running_loop().create_future()
+        self._broker_stop = asyncio.Event()
+        self._broker_task = asyncio.create_task(self._run_broker_sessions(server_names, ready))
+        return await ready
+    
+    async def _run_broker_sessions(self, server_names: List[str], ready: asyncio.Future):
+        from langchain_mcp_adapters.tools import load_mcp_tools
+        from mcp import ClientSession
+        
+        socket_path = get_socket_path(self.config)
+        tools_by_server = {}
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                for server_name in server_names:
+                    try:
+                        read, write = await stack.enter_async_context(broker_streams(socket_path, server_name))
+                        session = await stack.enter_async_context(ClientSession(read, write))
+                        await session.initialize()
+                        tools_by_server[server_name] = await load_mcp_tools(session)
+                    except Exception as e:
+                        logger.error(f"通过 broker 连接 MCP 服务器 {server_name} 失败: {e}")
+                
+                ready.set_result(tools_by_server)
+                await self._broker_stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.error(f"MCP broker 会话异常结束: {e}")
+    
     def get_loaded_tools(self) -> List[Any]:
         """获取已加载的工具"""
         return self.loaded_tools
     
     async def close(self):
         """关闭 MCP 客户端"""
-        if self.client:
+        # MultiServerMCPClient 没有 close()：每次调用工具都会新建会话并在调用结束时关闭，
+        # 进行中的调用随所在任务取消时会终止对应的服务器进程
+        self.client = None
+        
+        # 断开与 broker 的会话（broker 中的服务器进程继续为其他客户端服务）
+        if self._broker_task:
+            self._broker_stop.set()
             try:
-                await self.client.close()
+                await asyncio.wait_for(self._broker_task, timeout=5)
             except Exception as e:
-                logger.error(f"关闭 MCP 客户端失败: {e}")
+                logger.error(f"关闭 MCP broker 会话失败: {e}")
+            self._broker_task = None
+        
+        # 释放 HTTP / SSE 服务器共用的连接池
+        await close_shared_pool()
     
     async def __aenter__(self):
         """异步上下文管理器入口"""
@@ -0,0 +1,188 @@
+"""进程内原生文件系统工具
+
+为最常用的只读文件系统操作（list_directory / read_file / search_files / get_file_info）
+提供 Python 实现，与 @modelcontextprotocol/server-filesystem 同名同参数，
+避免每次调用都经过 Node 子进程的 JSON-RPC 往返。
+"""
+
+import fnmatch
+import logging
+import mmap
+import os
+import stat
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from langchain_core.tools import StructuredTool, ToolException
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+# 默认读取上限：1 MiB
+DEFAULT_MAX_READ_BYTES = 1024 * 1024
+# 默认搜索结果上限
+DEFAULT_MAX_SEARCH_RESULTS = 1000
+
+
+class PathInput(BaseModel):
+    path: str = Field(description="目标路径（绝对路径或相对于允许目录的路径）")
+
+
+class SearchFilesInput(BaseModel):
+    path: str = Field(description="开始搜索的目录")
+    pattern: str = Field(description="文件名中需要包含的关键字（不区分大小写）")
+    excludePatterns: List[str] = Field(default_factory=list, description="需要排除的 glob 模式")
+
+
+class NativeFileSystem:
+    """限定在沙箱根目录内的文件系统访问实现"""
+
+    def __init__(self, root: str, max_read_bytes: int = DEFAULT_MAX_READ_BYTES,
+                 max_search_results: int = DEFAULT_MAX_SEARCH_RESULTS):
+        """
+        Args:
+            root: 允许访问的根目录
+            max_read_bytes: read_file 单次读取的最大字节数
+            max_search_results: search_files 返回的最大结果数
+        """
+        self.root = os.path.realpath(os.path.expanduser(root))
+        self.max_read_bytes = max_read_bytes
+        self.max_search_results = max_search_results
+
+    def resolve(self, path: str) -> str:
+        """解析路径并校验其位于沙箱根目录内"""
+        expanded = os.path.expanduser(path)
+        if not os.path.isabs(expanded):
+            expanded = os.path.join(self.root, expanded)
+        real = os.path.realpath(expanded)
+        if os.path.commonpath([real, self.root]) != self.root:
+            raise ToolException(f"Access denied - path outside allowed directories: {path}")
+        return real
+
+    def list_directory(self, path: str) -> str:
+        target = self.resolve(path)
+        try:
+            with os.scandir(target) as it:
+                entries = sorted(it, key=lambda e: e.name)
+                lines = [
+                    f"{'[DIR]' if entry.is_dir() else '[FILE]'} {entry.name}"
+                    for entry in entries
+                ]
+        except OSError as e:
+            raise ToolException(f"无法列出目录 {path}: {e}")
+        return "\n".join(lines)
+
+    def read_file(self, path: str) -> str:
+        target = self.resolve(path)
+        try:
+            size = os.path.getsize(target)
+            if size == 0:
+                return ""
+            with open(target, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                data = mm[:self.max_read_bytes]
+        except (OSError, ValueError) as e:
+            raise ToolException(f"无法读取文件 {path}: {e}")
+
+        text = data.decode("utf-8", errors="replace")
+        if size > self.max_read_bytes:
+            text += f"\n\n[truncated: showing first {self.max_read_bytes} of {size} bytes]"
+        return text
+
+    def search_files(self, path: str, pattern: str, excludePatterns: Optional[List[str]] = None) -> str:
+        start = self.resolve(path)
+        needle = pattern.lower()
+        excludes = excludePatterns or []
+        results = []
+        stack = [start]
+
+        while stack and len(results) < self.max_search_results:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+
+            for entry in entries:
+                relative = os.path.relpath(entry.path, start)
+                if any(fnmatch.fnmatch(relative, ex) or fnmatch.fnmatch(entry.name, ex) for ex in excludes):
+                    continue
+                if needle in entry.name.lower():
+                    results.append(entry.path)
+                    if len(results) >= self.max_search_results:
+                        break
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+
+        return "\n".join(results) if results else "No matches found"
+
+    def get_file_info(self, path: str) -> str:
+        target = self.resolve(path)
+        try:
+            st = os.stat(target)
+        except OSError as e:
+            raise ToolException(f"无法获取文件信息 {path}: {e}")
+
+        created = getattr(st, "st_birthtime", st.st_ctime)
+        info = {
+            "size": st.st_size,
+            "created": self._format_time(created),
+            "modified": self._format_time(st.st_mtime),
+            "accessed": self._format_time(st.st_atime),
+            "isDirectory": str(stat.S_ISDIR(st.st_mode)).lower(),
+            "isFile": str(stat.S_ISREG(st.st_mode)).lower(),
+            "permissions": oct(st.st_mode)[-3:],
+        }
+        return "\n".join(f"{key}: {value}" for key, value in info.items())
+
+    @staticmethod
+    def _format_time(timestamp: float) -> str:
+        return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def create_native_fs_tools(fs_config: Dict[str, Any]) -> List[StructuredTool]:
+    """根据配置创建原生文件系统工具
+
+    Args:
+        fs_config: mcp_config.json 中 nativeTools.filesystem 的配置
+
+    Returns:
+        工具列表；配置缺少 root 时返回空列表
+    """
+    root = fs_config.get("root")
+    if not root:
+        logger.warning("nativeTools.filesystem 已启用但未配置 root，跳过原生文件系统工具")
+        return []
+
+    fs = NativeFileSystem(
+        root,
+        max_read_bytes=fs_config.get("maxReadBytes", DEFAULT_MAX_READ_BYTES),
+        max_search_results=fs_config.get("maxSearchResults", DEFAULT_MAX_SEARCH_RESULTS),
+    )
+
+    return [
+        StructuredTool.from_function(
+            func=fs.list_directory,
+            name="list_directory",
+            description="列出指定目录下的所有文件和子目录，结果以 [FILE] 和 [DIR] 前缀区分。",
+            args_schema=PathInput,
+        ),
+        StructuredTool.from_function(
+            func=fs.read_file,
+            name="read_file",
+            description="读取文件的完整文本内容（UTF-8），超过大小上限的部分会被截断。",
+            args_schema=PathInput,
+        ),
+        StructuredTool.from_function(
+            func=fs.search_files,
+            name="search_files",
+            description="从指定目录开始递归搜索名称包含关键字的文件和目录（不区分大小写），返回完整路径。",
+            args_schema=SearchFilesInput,
+        ),
+        StructuredTool.from_function(
+            func=fs.get_file_info,
+            name="get_file_info",
+            description="获取文件或目录的元数据，包括大小、创建时间、修改时间、访问时间、类型和权限。",
+            args_schema=PathInput,
+        ),
+    ]
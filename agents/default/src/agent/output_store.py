@@ -0,0 +1,207 @@
+"""大体积工具输出的带外存储
+
+超过阈值的工具输出会写入磁盘上按内容寻址（sha256）的存储，
+消息中只保留开头部分和一个 handle；模型可以通过内置的
+read_tool_output(handle, offset, length) 工具按需分页读取剩余内容。
+
+每个输出旁边有一个字符位置索引（<digest>.idx：总字符数，以及每 INDEX_STRIDE 个字符处的
+字节偏移），分页读取时通过 mmap 只解码所需的一页，不把整个文件读入内存。
+"""
+
+import codecs
+import hashlib
+import logging
+import mmap
+import os
+import re
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from langchain_core.tools import BaseTool, StructuredTool, ToolException
+from pydantic import BaseModel, Field
+
+from .utils import clone_tool, get_state_dir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD_CHARS = 8000
+DEFAULT_HEAD_CHARS = 2000
+DEFAULT_PAGE_CHARS = 4000
+INDEX_STRIDE = 4096  # 索引中相邻两个检查点之间的字符数
+
+_HANDLE_RE = re.compile(r"^sha256:([0-9a-f]{64})$")
+
+
+class ReadToolOutputInput(BaseModel):
+    handle: str = Field(description="工具输出的 handle，形如 sha256:<hex>")
+    offset: int = Field(default=0, description="起始字符位置")
+    length: int = Field(default=DEFAULT_PAGE_CHARS, description="读取的字符数")
+
+
+class ToolOutputStore:
+    """按内容寻址的工具输出存储"""
+
+    def __init__(self, root: Optional[Path] = None, threshold_chars: int = DEFAULT_THRESHOLD_CHARS,
+                 head_chars: int = DEFAULT_HEAD_CHARS):
+        """
+        Args:
+            root: 存储目录，默认位于 su-cli 状态目录下的 tool_outputs
+            threshold_chars: 超过该字符数的输出会被转存
+            head_chars: 转存后在消息中保留的开头字符数
+        """
+        self.root = Path(root).expanduser() if root else get_state_dir("tool_outputs")
+        self.threshold_chars = threshold_chars
+        self.head_chars = head_chars
+
+    def put(self, content: str) -> str:
+        """写入内容并返回 handle，相同内容只存储一次"""
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        path = self._path_for(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(content, encoding="utf-8")
+            os.replace(tmp_path, path)
+            self._write_index(path, _index_of(content))
+        return f"sha256:{digest}"
+
+    def read(self, handle: str, offset: int = 0, length: int = DEFAULT_PAGE_CHARS) -> str:
+        """按字符范围读取已存储的内容"""
+        match = _HANDLE_RE.match(handle.strip())
+        if not match:
+            raise ToolException(f"无效的 handle: {handle}")
+        path = self._path_for(match.group(1))
+        if not path.exists():
+            raise ToolException(f"找不到 handle 对应的输出: {handle}")
+
+        index = self._load_index(path)
+        total = index[0]
+        offset = min(max(0, offset), total)
+        length = max(1, min(length, self.threshold_chars))
+
+        # 从 offset 之前最近的检查点开始解码，UTF-8 每个字符最多 4 字节
+        checkpoint = offset // INDEX_STRIDE
+        skip = offset - checkpoint * INDEX_STRIDE
+        chunk = ""
+        if offset < total:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                start = index[1 + checkpoint]
+                data = mapped[start:start + (skip + length) * 4]
+            chunk = codecs.getincrementaldecoder("utf-8")().decode(data)[skip:skip + length]
+        end = offset + len(chunk)
+        footer = f"\n\n[chars {offset}-{end} of {total}"
+        footer += f"; next offset: {end}]" if end < total else "; end of output]"
+        return chunk + footer
+
+    def _load_index(self, path: Path) -> array:
+        """读取字符位置索引；没有索引的文件（例如 CLI 转存的输出）逐块扫描一次后补上"""
+        index = array("Q")
+        try:
+            index.frombytes(path.with_suffix(".idx").read_bytes())
+        except (OSError, ValueError):
+            index = array("Q")
+        if len(index) >= 2:
+            return index
+
+        index = array("Q", [0, 0])
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        chars = position = 0
+        with open(path, "rb") as f:
+            while block := f.read(1 << 20):
+                # 上一块末尾未解码完的字节属于本块的第一个字符
+                byte_offset = position - len(decoder.getstate()[0])
+                text = decoder.decode(block)
+                last = 0
+                next_checkpoint = (len(index) - 1) * INDEX_STRIDE
+                while next_checkpoint < chars + len(text):
+                    byte_offset += len(text[last:next_checkpoint - chars].encode("utf-8"))
+                    last = next_checkpoint - chars
+                    index.append(byte_offset)
+                    next_checkpoint += INDEX_STRIDE
+                chars += len(text)
+                position += len(block)
+        index[0] = chars
+        self._write_index(path, index)
+        return index
+
+    @staticmethod
+    def _write_index(path: Path, index: array):
+        tmp_path = path.with_suffix(f".idx.{os.getpid()}.tmp")
+        try:
+            tmp_path.write_bytes(index.tobytes())
+            os.replace(tmp_path, path.with_suffix(".idx"))
+        except OSError as e:
+            logger.debug(f"写入工具输出索引失败: {e}")
+
+    def spill(self, content: str) -> str:
+        """内容超过阈值时转存，返回开头部分加 handle 说明"""
+        if len(content) <= self.threshold_chars:
+            return content
+        handle = self.put(content)
+        logger.debug(f"工具输出已转存: {handle} ({len(content)} 字符)")
+        return (
+            f"{content[:self.head_chars]}\n\n"
+            f"[output truncated: {len(content)} chars total, handle={handle}. "
+            f"Use read_tool_output(handle, offset, length) to read more, starting at offset {self.head_chars}]"
+        )
+
+    def wrap(self, tool: BaseTool) -> BaseTool:
+        """包装工具，使其过大的输出被转存"""
+
+        async def _spilling_call(**kwargs):
+            result = await tool.ainvoke(kwargs)
+            if isinstance(result, list) and all(isinstance(item, str) for item in result):
+                result = "\n".join(result)
+            if isinstance(result, str):
+                return self.spill(result)
+            return result
+
+        return clone_tool(tool, _spilling_call)
+
+    def create_read_tool(self) -> StructuredTool:
+        """创建供模型分页读取转存输出的工具"""
+        return StructuredTool.from_function(
+            func=self.read,
+            name="read_tool_output",
+            description=(
+                "读取被截断的工具输出的其余部分。当工具结果末尾出现 "
+                "\"[output truncated: ... handle=sha256:...]\" 时，用该 handle 和 offset 分页读取。"
+            ),
+            args_schema=ReadToolOutputInput,
+        )
+
+    def _path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.txt"
+
+
+def _index_of(content: str) -> array:
+    """生成字符位置索引：[总字符数, 第 0、INDEX_STRIDE、2·INDEX_STRIDE... 个字符的字节偏移]"""
+    index = array("Q", [len(content)])
+    position = 0
+    for start in range(0, max(len(content), 1), INDEX_STRIDE):
+        index.append(position)
+        position += len(content[start:start + INDEX_STRIDE].encode("utf-8"))
+    return index
+
+
+def wrap_large_output_tools(tools: List[BaseTool], store_config: Dict[str, Any]) -> List[BaseTool]:
+    """按配置为所有工具加上大输出转存，并注册 read_tool_output 工具
+
+    Args:
+        tools: 已注册的工具列表
+        store_config: mcp_config.json 中 toolOutputStore 的配置
+
+    Returns:
+        包装后的工具列表
+    """
+    if not store_config.get("enabled"):
+        return tools
+
+    store = ToolOutputStore(
+        root=store_config.get("dir"),
+        threshold_chars=store_config.get("thresholdChars", DEFAULT_THRESHOLD_CHARS),
+        head_chars=store_config.get("headChars", DEFAULT_HEAD_CHARS),
+    )
+    wrapped = [store.wrap(tool) if tool.args_schema is not None else tool for tool in tools]
+    return wrapped + [store.create_read_tool()]
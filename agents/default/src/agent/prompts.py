@@ -31,5 +31,11 @@ system_prompt = """
 - create_directory: 创建目录
 - move_file: 移动/重命名文件
 
+当工具结果末尾出现 "[output truncated: ... handle=sha256:...]" 时，说明输出过长已被截断，
+如需更多内容，请使用 read_tool_output 工具按 offset 分页读取，而不是重复调用原工具。
+
+需要多次相互独立的工具调用时（例如读取多个文件），请在同一条回复中一次性发出所有调用，
+它们会被并发执行。
+
 **请始终积极使用这些工具来完成用户的请求！**
 """
\ No newline at end of file
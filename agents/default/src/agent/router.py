@@ -0,0 +1,163 @@
+"""模型路由
+
+大部分对话是不需要大模型的简短问题。路由器根据最新用户消息的长度、是否包含
+需要调用工具的意图以及对话深度，为每一轮选择快速模型或强模型，并把选择结果和
+本轮耗时记录到状态目录下的 model_routes.jsonl，便于调整阈值。记录在后台线程中写入，
+文件超过 MAX_ROUTE_LOG_BYTES 后轮转为 model_routes.jsonl.1。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from .utils import get_state_dir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_FAST_CHARS = 200
+DEFAULT_MAX_FAST_DEPTH = 6
+MAX_ROUTE_LOG_BYTES = 5 * 1024 * 1024
+
+# 通常需要调用文件系统或网页工具的表述
+DEFAULT_TOOL_INTENT_PATTERN = (
+    r"文件|目录|文件夹|桌面|读取|打开|搜索|查找|网页|网站|链接|爬取|抓取|"
+    r"https?://|www\.|\.(py|md|txt|json|csv|pdf)\b|"
+    r"\b(file|folder|directory|read|open|search|find|browse|crawl|scrape|url)\b"
+)
+
+
+@dataclass
+class RouteDecision:
+    """单轮的路由结果"""
+    route: str
+    model: str
+    reason: str
+    chars: int
+    depth: int
+    tool_intent: bool
+
+
+class ModelRouter:
+    """在快速模型和强模型之间选择"""
+
+    def __init__(self, fast_model: str, strong_model: str, max_fast_chars: int = DEFAULT_MAX_FAST_CHARS,
+                 max_fast_depth: int = DEFAULT_MAX_FAST_DEPTH,
+                 tool_intent_pattern: str = DEFAULT_TOOL_INTENT_PATTERN, log_routes: bool = True):
+        """
+        Args:
+            fast_model: 快速模型名称
+            strong_model: 强模型名称
+            max_fast_chars: 用户消息超过该字符数时使用强模型
+            max_fast_depth: 对话中的用户消息数超过该值时使用强模型
+            tool_intent_pattern: 匹配需要调用工具的表述的正则
+            log_routes: 是否把每轮的路由和耗时写入 model_routes.jsonl
+        """
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.max_fast_chars = max_fast_chars
+        self.max_fast_depth = max_fast_depth
+        self.tool_intent_re = re.compile(tool_intent_pattern, re.IGNORECASE)
+        self.log_path = get_state_dir() / "model_routes.jsonl" if log_routes else None
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def route(self, messages: List[BaseMessage]) -> RouteDecision:
+        """根据对话内容选择本轮使用的模型"""
+        human_messages = [m for m in messages if isinstance(m, HumanMessage)]
+        text = _message_text(human_messages[-1]) if human_messages else ""
+        depth = len(human_messages)
+        tool_intent = bool(self.tool_intent_re.search(text))
+
+        if tool_intent:
+            reason = "tool_intent"
+        elif len(text) > self.max_fast_chars:
+            reason = "long_input"
+        elif depth > self.max_fast_depth:
+            reason = "deep_conversation"
+        else:
+            reason = "simple"
+
+        route = "fast" if reason == "simple" else "strong"
+        model = self.fast_model if route == "fast" else self.strong_model
+        return RouteDecision(route, model, reason, len(text), depth, tool_intent)
+
+    def record(self, decision: RouteDecision, latency: float):
+        """记录一轮的路由结果和耗时"""
+        stats = self._stats.setdefault(decision.route, {"turns": 0, "total_latency": 0.0, "max_latency": 0.0})
+        stats["turns"] += 1
+        stats["total_latency"] += latency
+        stats["max_latency"] = max(stats["max_latency"], latency)
+
+        if self.log_path is None:
+            return
+        record = {"ts": time.time(), **asdict(decision), "latency": round(latency, 3)}
+        line = json.dumps(record, ensure_ascii=False)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            # 磁盘 I/O 不放在事件循环中
+            loop.run_in_executor(None, self._append, line)
+        else:
+            self._append(line)
+
+    def _append(self, line: str):
+        try:
+            if self.log_path.exists() and self.log_path.stat().st_size > MAX_ROUTE_LOG_BYTES:
+                os.replace(self.log_path, self.log_path.with_suffix(".jsonl.1"))
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.debug(f"写入模型路由记录失败: {e}")
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """按路由汇总的轮数、模型和平均 / 最大耗时"""
+        return {
+            route: {
+                "model": self.fast_model if route == "fast" else self.strong_model,
+                "turns": int(stats["turns"]),
+                "avg_latency": stats["total_latency"] / stats["turns"],
+                "max_latency": stats["max_latency"],
+            }
+            for route, stats in self._stats.items()
+        }
+
+
+def _message_text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+
+def build_router(routing_config: Dict[str, Any], default_model: Optional[str]) -> Optional[ModelRouter]:
+    """
+    根据 mcp_config.json 中的 modelRouting 创建路由器
+
+    fastModel 未配置时读取 FAST_MODEL 环境变量，strongModel 未配置时读取 STRONG_MODEL，
+    再退回默认模型。未启用或没有可用的快速模型时返回 None。
+    """
+    if not routing_config.get("enabled"):
+        return None
+
+    fast_model = routing_config.get("fastModel") or os.getenv("FAST_MODEL")
+    strong_model = routing_config.get("strongModel") or os.getenv("STRONG_MODEL") or default_model
+    if not fast_model or not strong_model:
+        logger.warning("模型路由已启用，但没有配置 fastModel / strongModel，已停用")
+        return None
+
+    return ModelRouter(
+        fast_model=fast_model,
+        strong_model=strong_model,
+        max_fast_chars=routing_config.get("maxFastChars", DEFAULT_MAX_FAST_CHARS),
+        max_fast_depth=routing_config.get("maxFastDepth", DEFAULT_MAX_FAST_DEPTH),
+        tool_intent_pattern=routing_config.get("toolIntentPattern", DEFAULT_TOOL_INTENT_PATTERN),
+        log_routes=routing_config.get("logRoutes", True),
+    )
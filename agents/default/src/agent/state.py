@@ -4,4 +4,5 @@ from langgraph.graph.message import add_messages
 class State(TypedDict):
     messages: Annotated[list, add_messages]
     confirmed: Optional[bool]  # 用户确认状态
-    user_input: Optional[str]  # 用户输入的确认信息
\ No newline at end of file
+    user_input: Optional[str]  # 用户输入的确认信息
+    summary: Optional[str]  # 此前对话的摘要（su-cli 的上下文预算生成），合并进系统提示
\ No newline at end of file
@@ -0,0 +1,229 @@
+"""幂等工具调用结果缓存
+
+对配置为幂等的工具（如 list_directory / read_file / get_file_info）按
+「工具名 + 规范化参数」缓存调用结果，采用 LRU 淘汰并限制总字节数。
+参数中包含路径的条目会记录路径的 mtime，文件变化后自动失效；相对路径与原生文件系统
+工具一样相对沙箱根目录解析，无法获取 mtime 的调用不缓存。
+"""
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.tools import BaseTool
+
+from .utils import clone_tool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+# 参数中被视为文件系统路径的字段
+PATH_ARG_NAMES = ("path", "paths", "source", "destination")
+
+
+@dataclass
+class _CacheEntry:
+    value: Any
+    size: int
+    latency: float
+    mtimes: Dict[str, Optional[int]] = field(default_factory=dict)
+
+
+@dataclass
+class ToolCacheStats:
+    """单个工具的缓存统计"""
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    saved_seconds: float = 0.0
+    saved_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def saved_tokens(self) -> int:
+        # 粗略估算：约 4 字节 / token
+        return self.saved_bytes // 4
+
+
+class ToolResultCache:
+    """工具结果 LRU 缓存"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES,
+                 root: Optional[str] = None):
+        """
+        Args:
+            max_entries: 最大缓存条目数
+            max_bytes: 缓存结果的最大总字节数
+            root: 相对路径的解析基准（原生文件系统工具的沙箱根目录），为空时相对当前目录
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.root = os.path.realpath(os.path.expanduser(root)) if root else None
+        self.total_bytes = 0
+        self._entries: "OrderedDict[Tuple[str, str], _CacheEntry]" = OrderedDict()
+        self.stats: Dict[str, ToolCacheStats] = {}
+
+    @staticmethod
+    def make_key(tool_name: str, args: Dict[str, Any]) -> Tuple[str, str]:
+        """根据工具名和规范化后的参数生成缓存键"""
+        normalized = {}
+        for name, value in args.items():
+            if name in PATH_ARG_NAMES:
+                value = _normalize_paths(value)
+            elif isinstance(value, str):
+                value = value.strip()
+            normalized[name] = value
+        return tool_name, json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+
+    def get(self, tool_name: str, args: Dict[str, Any]) -> Tuple[bool, Any]:
+        """查找缓存
+
+        Returns:
+            (是否命中, 缓存值)
+        """
+        stats = self.stats.setdefault(tool_name, ToolCacheStats())
+        key = self.make_key(tool_name, args)
+        entry = self._entries.get(key)
+
+        if entry is not None and entry.mtimes != _snapshot_mtimes(args, self.root):
+            self._remove(key)
+            stats.invalidations += 1
+            entry = None
+
+        if entry is None:
+            stats.misses += 1
+            return False, None
+
+        self._entries.move_to_end(key)
+        stats.hits += 1
+        stats.saved_seconds += entry.latency
+        stats.saved_bytes += entry.size
+        return True, entry.value
+
+    def put(self, tool_name: str, args: Dict[str, Any], value: Any, latency: float):
+        """写入缓存，超过条目数或字节上限时按 LRU 淘汰；参数中的路径无法获取 mtime 时不缓存"""
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return
+
+        mtimes = _snapshot_mtimes(args, self.root)
+        if None in mtimes.values():
+            # 路径不存在或无法访问，之后创建的文件无法通过 mtime 发现
+            return
+
+        key = self.make_key(tool_name, args)
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = _CacheEntry(value, size, latency, mtimes)
+        self.total_bytes += size
+
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def clear(self):
+        """清空缓存（保留统计信息）"""
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取每个工具的命中率和节省的延迟 / token"""
+        return {
+            name: {
+                "hits": s.hits,
+                "misses": s.misses,
+                "invalidations": s.invalidations,
+                "hit_rate": s.hit_rate,
+                "saved_seconds": s.saved_seconds,
+                "saved_tokens": s.saved_tokens,
+            }
+            for name, s in sorted(self.stats.items())
+        }
+
+    def _remove(self, key: Tuple[str, str]):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry.size
+
+    def wrap(self, tool: BaseTool) -> BaseTool:
+        """包装工具，使其调用结果经过缓存"""
+
+        async def _cached_call(**kwargs):
+            hit, value = self.get(tool.name, kwargs)
+            if hit:
+                logger.debug(f"工具缓存命中: {tool.name}")
+                return value
+
+            start = time.perf_counter()
+            value = await tool.ainvoke(kwargs)
+            self.put(tool.name, kwargs, value, time.perf_counter() - start)
+            return value
+
+        return clone_tool(tool, _cached_call)
+
+
+def _normalize_paths(value: Any) -> Any:
+    if isinstance(value, str):
+        return os.path.normpath(os.path.expanduser(value.strip()))
+    if isinstance(value, list):
+        return [_normalize_paths(v) for v in value]
+    return value
+
+
+def _snapshot_mtimes(args: Dict[str, Any], root: Optional[str] = None) -> Dict[str, Optional[int]]:
+    """记录参数中所有路径的 mtime，相对路径相对 root 解析，路径不存在时记为 None"""
+    paths: List[str] = []
+    for name in PATH_ARG_NAMES:
+        value = _normalize_paths(args.get(name))
+        if isinstance(value, str):
+            paths.append(value)
+        elif isinstance(value, list):
+            paths.extend(v for v in value if isinstance(v, str))
+
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(os.path.join(root, path) if root else path).st_mtime_ns
+        except OSError:
+            mtimes[path] = None
+    return mtimes
+
+
+def _size_of(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def wrap_idempotent_tools(tools: List[BaseTool], cache_config: Dict[str, Any],
+                          root: Optional[str] = None) -> Tuple[List[BaseTool], Optional[ToolResultCache]]:
+    """按配置为幂等工具加上结果缓存
+
+    Args:
+        tools: 已注册的工具列表
+        cache_config: mcp_config.json 中 toolCache 的配置
+        root: 原生文件系统工具的沙箱根目录，相对路径按它解析
+
+    Returns:
+        (包装后的工具列表, 缓存实例)；未启用时缓存实例为 None
+    """
+    if not cache_config.get("enabled"):
+        return tools, None
+
+    idempotent = set(cache_config.get("idempotentTools", []))
+    cache = ToolResultCache(
+        max_entries=cache_config.get("maxEntries", DEFAULT_MAX_ENTRIES),
+        max_bytes=cache_config.get("maxBytes", DEFAULT_MAX_BYTES),
+        root=root,
+    )
+    wrapped = [cache.wrap(tool) if tool.name in idempotent else tool for tool in tools]
+    return wrapped, cache
@@ -0,0 +1,86 @@
+"""MCP 工具调用的并发限制与超时
+
+每个 MCP 服务器（以及可选的单个工具）可以在 mcp_config.json 中配置
+最大并发调用数和调用期限。超时后底层请求会被取消，并以工具错误的形式
+返回给模型，让 ReAct 循环可以继续。
+"""
+
+import asyncio
+import contextlib
+import logging
+from typing import Any, Dict, Optional
+
+from langchain_core.tools import BaseTool, ToolException
+
+from .utils import clone_tool
+
+logger = logging.getLogger(__name__)
+
+
+class ToolCallLimiter:
+    """单个 MCP 服务器的调用限制器"""
+
+    def __init__(self, server_name: str, limits: Dict[str, Any]):
+        """
+        Args:
+            server_name: MCP 服务器名称
+            limits: 合并后的限制配置，支持 maxConcurrency、timeout 以及按工具覆盖的 tools
+        """
+        self.server_name = server_name
+        self.timeout: Optional[float] = limits.get("timeout")
+        self.tool_limits: Dict[str, Dict[str, Any]] = limits.get("tools", {})
+
+        max_concurrency = limits.get("maxConcurrency")
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self._tool_semaphores: Dict[str, asyncio.Semaphore] = {
+            name: asyncio.Semaphore(tool_limit["maxConcurrency"])
+            for name, tool_limit in self.tool_limits.items()
+            if tool_limit.get("maxConcurrency")
+        }
+
+    def get_timeout(self, tool_name: str) -> Optional[float]:
+        """获取工具的调用期限（秒），工具级配置优先"""
+        return self.tool_limits.get(tool_name, {}).get("timeout", self.timeout)
+
+    def wrap(self, tool: BaseTool) -> BaseTool:
+        """包装工具，使其调用受并发数和期限约束"""
+        timeout = self.get_timeout(tool.name)
+        tool_semaphore = self._tool_semaphores.get(tool.name)
+
+        async def _limited_call(**kwargs):
+            try:
+                # 期限包含排队等待的时间；超时会取消底层请求。
+                # 先取工具名额再取服务器名额：在工具名额上排队的调用不占用服务器名额，
+                # 不会挡住同一服务器上其他工具的调用
+                async with asyncio.timeout(timeout):
+                    async with _acquire(tool_semaphore), _acquire(self._semaphore):
+                        return await tool.ainvoke(kwargs)
+            except TimeoutError:
+                logger.warning(f"MCP 工具调用超时: {self.server_name}/{tool.name} ({timeout}s)")
+                raise ToolException(
+                    f"工具 {tool.name}（服务器 {self.server_name}）在 {timeout} 秒内没有返回，调用已取消。"
+                    f"请尝试其他方式或缩小请求范围。"
+                )
+
+        return clone_tool(tool, _limited_call)
+
+
+@contextlib.asynccontextmanager
+async def _acquire(semaphore: Optional[asyncio.Semaphore]):
+    if semaphore is None:
+        yield
+        return
+    async with semaphore:
+        yield
+
+
+def build_limiter(server_name: str, config: Dict[str, Any]) -> Optional[ToolCallLimiter]:
+    """根据 mcp_config.json 为指定服务器创建限制器
+
+    服务器的 limits 会覆盖顶层 defaultLimits；两者都未配置时返回 None。
+    """
+    server_limits = config.get("mcpServers", {}).get(server_name, {}).get("limits", {})
+    limits = {**config.get("defaultLimits", {}), **server_limits}
+    if not limits:
+        return None
+    return ToolCallLimiter(server_name, limits)
@@ -0,0 +1,189 @@
+"""按相关性选择工具子集
+
+每次调用都绑定全部工具会让工具定义占据大量输入 token，并且随 MCP 服务器的增加
+不断变大。工具选择器用 BM25 对工具名称和描述打分，只绑定与当前轮次最相关的 top-k
+个工具，再加上配置中固定包含的工具和最近几轮用过的工具。
+
+代价是每轮绑定的工具子集不同：OpenAI 兼容接口中工具定义紧跟在系统提示之后，请求前缀
+在这里就会变化，模型服务的前缀缓存无法命中。因此默认关闭，需要在 toolSelection 中启用。
+"""
+
+import logging
+import math
+import re
+from collections import Counter, deque
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.tools import BaseTool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP_K = 8
+DEFAULT_RECENT_TURNS = 3
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_CJK_RE = re.compile(r"[一-鿿]+")
+
+# 中文请求与英文工具描述之间的常用词映射
+_QUERY_SYNONYMS = {
+    "文件": ["file", "files"],
+    "目录": ["directory", "directories", "folder"],
+    "文件夹": ["directory", "folder"],
+    "桌面": ["directory", "desktop"],
+    "列出": ["list"],
+    "读取": ["read", "contents"],
+    "打开": ["read", "open"],
+    "内容": ["contents", "content"],
+    "写入": ["write"],
+    "创建": ["create"],
+    "新建": ["create"],
+    "移动": ["move"],
+    "重命名": ["rename", "move"],
+    "删除": ["delete", "remove"],
+    "编辑": ["edit"],
+    "修改": ["edit", "modify"],
+    "搜索": ["search"],
+    "查找": ["search", "find"],
+    "网页": ["web", "page", "url", "scrape"],
+    "网站": ["web", "website", "url", "crawl"],
+    "爬取": ["crawl", "scrape"],
+    "抓取": ["scrape", "extract"],
+    "时间": ["time"],
+    "信息": ["info", "information", "metadata"],
+    "大小": ["size", "info"],
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """英文按单词切分（下划线和连字符视为分隔符），中文按字的二元组切分"""
+    text = text.lower().replace("_", " ").replace("-", " ")
+    tokens = _WORD_RE.findall(text)
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def expand_query(text: str) -> List[str]:
+    """切分查询，并补充中文关键词对应的英文词"""
+    tokens = tokenize(text)
+    for keyword, synonyms in _QUERY_SYNONYMS.items():
+        if keyword in text:
+            tokens.extend(synonyms)
+    return tokens
+
+
+class ToolSelector:
+    """基于 BM25 的工具子集选择器"""
+
+    def __init__(self, tools: List[BaseTool], top_k: int = DEFAULT_TOP_K, pins: Iterable[str] = (),
+                 recent_turns: int = DEFAULT_RECENT_TURNS):
+        """
+        Args:
+            tools: 全部可用工具
+            top_k: 按相关性选择的工具数
+            pins: 始终包含的工具名称
+            recent_turns: 最近多少轮中调用过的工具也会被包含
+        """
+        self.tools = tools
+        self.top_k = top_k
+        self.pins: Set[str] = set(pins)
+        self.recent_turns = recent_turns
+        # CLI 每轮只回放历史消息的文本，工具调用记录由选择器自己保存
+        self._recent_usage: deque = deque(maxlen=recent_turns)
+
+        self._doc_tokens = [Counter(tokenize(f"{tool.name} {tool.name} {tool.description or ''}")) for tool in tools]
+        self._doc_lengths = [sum(tokens.values()) for tokens in self._doc_tokens]
+        self._avg_length = sum(self._doc_lengths) / len(tools) if tools else 0.0
+
+        doc_freq: Counter = Counter()
+        for tokens in self._doc_tokens:
+            doc_freq.update(tokens.keys())
+        n = len(tools)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    def score(self, query: str) -> List[float]:
+        """计算每个工具与查询的 BM25 分数"""
+        query_terms = set(expand_query(query))
+        scores = []
+        for tokens, length in zip(self._doc_tokens, self._doc_lengths):
+            score = 0.0
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / self._avg_length) if self._avg_length else BM25_K1
+            for term in query_terms:
+                tf = tokens.get(term)
+                if tf:
+                    score += self._idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+    def select(self, messages: List[BaseMessage]) -> List[BaseTool]:
+        """为当前轮次选择工具，结果保持原有顺序
+
+        没有任何工具与当前轮次相关时返回全部工具，避免模型拿不到需要的工具。
+        """
+        if len(self.tools) <= self.top_k:
+            return self.tools
+
+        query = _latest_human_text(messages)
+        scores = self.score(query)
+        if not any(scores):
+            logger.debug("没有与当前轮次相关的工具，绑定全部工具")
+            return self.tools
+
+        ranked = sorted(range(len(self.tools)), key=lambda i: scores[i], reverse=True)
+        selected = {i for i in ranked[:self.top_k] if scores[i] > 0}
+
+        keep = self.pins | _recent_tool_names(messages, self.recent_turns)
+        keep.update(*self._recent_usage)
+        selected.update(i for i, tool in enumerate(self.tools) if tool.name in keep)
+
+        tools = [tool for i, tool in enumerate(self.tools) if i in selected]
+        logger.debug(f"为当前轮次选择了 {len(tools)}/{len(self.tools)} 个工具: {[t.name for t in tools]}")
+        return tools
+
+    def record_usage(self, messages: List[BaseMessage]):
+        """记录本轮模型调用过的工具"""
+        self._recent_usage.append({
+            call["name"] for message in messages if isinstance(message, AIMessage)
+            for call in message.tool_calls
+        })
+
+
+def _latest_human_text(messages: List[BaseMessage]) -> str:
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            content = message.content
+            return content if isinstance(content, str) else " ".join(
+                part.get("text", "") if isinstance(part, dict) else str(part) for part in content
+            )
+    return ""
+
+
+def _recent_tool_names(messages: List[BaseMessage], turns: int) -> Set[str]:
+    """最近 turns 轮中模型调用过的工具"""
+    names: Set[str] = set()
+    seen_turns = 0
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            seen_turns += 1
+            if seen_turns > turns:
+                break
+        elif isinstance(message, AIMessage):
+            names.update(call["name"] for call in message.tool_calls)
+    return names
+
+
+def build_tool_selector(tools: List[BaseTool], selection_config: Dict[str, Any]) -> Optional[ToolSelector]:
+    """根据 mcp_config.json 中的 toolSelection 创建选择器，未启用时返回 None"""
+    if not selection_config.get("enabled"):
+        return None
+    return ToolSelector(
+        tools,
+        top_k=selection_config.get("topK", DEFAULT_TOP_K),
+        pins=selection_config.get("pins", []),
+        recent_turns=selection_config.get("recentTurns", DEFAULT_RECENT_TURNS),
+    )
@@ -1,11 +1,12 @@
 import asyncio
 import logging
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, List, Optional
 
-from langchain_core.tools import Tool
+from langchain_core.tools import BaseTool, Tool
 
 from .mcp_utils import MCPToolManager
+from .native_fs import create_native_fs_tools
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +21,29 @@ get_current_time = Tool(
     func=_get_current_time_impl
 )
 
+def get_local_tools(config: Optional[Dict[str, Any]] = None) -> List[BaseTool]:
+    """获取本地工具列表
+
+    Args:
+        config: MCP 配置（mcp_config.json 内容），其中 nativeTools 用于启用进程内原生工具
+
+    Returns:
+        本地工具列表
+    """
+    local_tools = [get_current_time]
+
+    native_config = (config or {}).get("nativeTools", {})
+    fs_config = native_config.get("filesystem", {})
+    if fs_config.get("enabled"):
+        local_tools.extend(create_native_fs_tools(fs_config))
+
+    return local_tools
+
+def merge_tools(local_tools: List[BaseTool], mcp_tools: List[BaseTool]) -> List[BaseTool]:
+    """合并本地工具和 MCP 工具，同名时本地工具优先"""
+    local_names = {tool.name for tool in local_tools}
+    return local_tools + [tool for tool in mcp_tools if tool.name not in local_names]
+
 # MCP 工具管理器实例
 mcp_manager = MCPToolManager()
 
@@ -30,13 +54,13 @@ def get_all_tools() -> List[Tool]:
         包含所有工具的列表
     """
     # 本地工具
-    local_tools = [get_current_time]
+    local_tools = get_local_tools(mcp_manager.config)
     
     # 获取已加载的 MCP 工具
     mcp_tools = mcp_manager.get_loaded_tools()
     
     # 合并所有工具
-    all_tools = local_tools + mcp_tools
+    all_tools = merge_tools(local_tools, mcp_tools)
     logger.debug(f"总共提供 {len(all_tools)} 个工具 (本地: {len(local_tools)}, MCP: {len(mcp_tools)})")
     
     return all_tools
@@ -91,15 +115,15 @@ async def get_all_tools_async() -> List[Tool]:
         包含所有工具的列表
     """
     # 本地工具
-    local_tools = [get_current_time]
+    local_tools = get_local_tools(mcp_manager.config)
     
     try:
         # 获取 MCP 管理器并加载工具
-        mcp_manager = await get_mcp_manager()
-        mcp_tools = mcp_manager.get_loaded_tools()
+        manager = await get_mcp_manager()
+        mcp_tools = manager.get_loaded_tools()
         
         # 合并所有工具
-        all_tools = local_tools + mcp_tools
+        all_tools = merge_tools(local_tools, mcp_tools)
         logger.debug(f"总共提供 {len(all_tools)} 个工具 (本地: {len(local_tools)}, MCP: {len(mcp_tools)})")
         
         return all_tools
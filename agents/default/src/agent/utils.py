@@ -1,6 +1,22 @@
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+from uuid import UUID
+
 from langgraph.prebuilt import create_react_agent
+from langchain_core.callbacks import BaseCallbackHandler, BaseCallbackManager
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import BaseTool, StructuredTool
 from langchain_openai import ChatOpenAI
 
+try:
+    # 在 su-cli 中运行时 core 目录已在 sys.path 中
+    from paths import get_state_dir
+except ImportError:
+    # 单独运行 agent（langgraph dev、mcp_broker）时使用仓库 core 目录中的同一实现
+    sys.path.append(str(Path(__file__).resolve().parents[4] / "core"))
+    from paths import get_state_dir
 
 
 # Create agents using configured LLM types
@@ -9,6 +25,65 @@ def create_agent(agent_name: str, llm: ChatOpenAI, tools: list, prompt_template:
     return create_react_agent(
         name=agent_name,
         model=llm,
-        tools=tools,
+        tools=with_tool_timer(tools),
         prompt=prompt_template,
-    )
\ No newline at end of file
+    )
+
+
+class ToolTimer(BaseCallbackHandler):
+    """通过 on_tool_start / on_tool_end 回调记录每次工具调用的耗时
+
+    耗时写入工具消息的 response_metadata["duration_ms"]。ToolNode 并发执行同一条 AI 消息中的
+    工具调用，按 run_id 区分各次调用。"""
+
+    # 在事件循环中直接执行，on_tool_end 返回前 ToolMessage 已经带上耗时
+    run_inline = True
+
+    def __init__(self):
+        self._started: Dict[UUID, float] = {}
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs):
+        start = self._started.pop(run_id, None)
+        # 带 tool_call_id 调用时 output 就是 ToolNode 返回的 ToolMessage
+        if start is not None and isinstance(output, ToolMessage):
+            output.response_metadata = {
+                **output.response_metadata,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            }
+
+    def on_tool_error(self, error, *, run_id: UUID, **kwargs):
+        self._started.pop(run_id, None)
+
+
+def with_tool_timer(tools: list) -> list:
+    """返回挂上 ToolTimer 回调的工具副本（不修改传入的工具）"""
+    timer = ToolTimer()
+    timed = []
+    for tool in tools:
+        if not isinstance(tool, BaseTool):
+            timed.append(tool)
+            continue
+        callbacks = tool.callbacks
+        if isinstance(callbacks, BaseCallbackManager):
+            callbacks = callbacks.copy()
+            callbacks.add_handler(timer, inherit=False)
+        else:
+            callbacks = [*(callbacks or []), timer]
+        timed.append(tool.model_copy(update={"callbacks": callbacks}))
+    return timed
+
+
+def clone_tool(tool: BaseTool, coroutine) -> StructuredTool:
+    """创建与 tool 名称、描述和参数 schema 相同、改由 coroutine(**kwargs) 执行的工具
+
+    用于在已注册的工具上叠加缓存、并发上限等包装层。"""
+    return StructuredTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        coroutine=coroutine,
+        metadata=tool.metadata,
+    )
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+共享 MCP broker 测试脚本
+
+用一个替身 stdio 服务器验证：客户端取消请求或断开连接后，broker 立即释放在途名额；
+服务器进程退出后，已连接客户端的在途和排队请求立即得到错误响应，之后的请求会重启服务器。
+替身服务器与 MCP TypeScript SDK 的行为一致，收到 notifications/cancelled 后不再响应被取消的请求。
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# 添加项目路径到 sys.path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+
+def run_stand_in_server():
+    """运行替身 stdio 服务器：block 工具从不返回，crash 工具使进程退出，echo 工具返回已收到的取消通知"""
+    cancelled = []
+    for line in sys.stdin:
+        message = json.loads(line)
+        method = message.get("method")
+        if method == "initialize":
+            result = {"protocolVersion": "2025-03-26", "capabilities": {"tools": {}},
+                      "serverInfo": {"name": "stand-in", "version": "0.1.0"}}
+        elif method == "notifications/cancelled":
+            cancelled.append(message["params"]["requestId"])
+            continue
+        elif method == "tools/call" and message["params"]["name"] == "crash":
+            sys.exit(1)
+        elif method == "tools/call" and message["params"]["name"] == "echo":
+            result = {"content": [{"type": "text", "text": json.dumps(cancelled)}]}
+        else:
+            continue
+        print(json.dumps({"jsonrpc": "2.0", "id": message["id"], "result": result}), flush=True)
+
+
+class FakeClient:
+    """记录 broker 发给客户端的消息"""
+
+    _ids = iter(range(1, 1000))
+
+    def __init__(self):
+        self.id = next(self._ids)
+        self.inbox: asyncio.Queue = asyncio.Queue()
+
+    def send(self, message):
+        self.inbox.put_nowait(message)
+
+
+def call(request_id, name):
+    return {"jsonrpc": "2.0", "id": request_id, "method": "tools/call", "params": {"name": name, "arguments": {}}}
+
+
+async def check_released(server, client, label: str) -> bool:
+    """名额释放后 echo 请求应能立即得到响应，且服务器已收到取消通知"""
+    server.handle_client_message(client, call("echo", "echo"))
+    try:
+        response = await asyncio.wait_for(client.inbox.get(), 5.0)
+    except asyncio.TimeoutError:
+        print(f"❌ [{label}] echo 请求没有得到响应，在途名额未释放")
+        return False
+
+    cancelled = json.loads(response["result"]["content"][0]["text"])
+    ok = response["id"] == "echo" and len(cancelled) >= 1 and server._in_flight == 0 and not server._pending
+    print(f"{'✅' if ok else '❌'} [{label}] 服务器收到的取消通知: {cancelled}, 在途请求: {server._in_flight}")
+    return ok
+
+
+async def wait_in_flight(server, count: int):
+    for _ in range(100):
+        if server._in_flight == count:
+            return
+        await asyncio.sleep(0.01)
+
+
+async def check_cancel() -> bool:
+    """客户端取消已发出的请求"""
+    from src.agent.mcp_broker import UpstreamServer
+
+    server = UpstreamServer("stand-in", sys.executable, [__file__, "--serve"], {}, max_in_flight=1)
+    await server.ensure_started()
+    try:
+        client = FakeClient()
+        server.attach(client)
+        server.handle_client_message(client, call(1, "block"))
+        await wait_in_flight(server, 1)
+        server.handle_client_message(client, {
+            "jsonrpc": "2.0", "method": "notifications/cancelled", "params": {"requestId": 1},
+        })
+        return await check_released(server, client, "cancel")
+    finally:
+        await server.close()
+
+
+async def check_disconnect() -> bool:
+    """客户端在请求进行中断开连接"""
+    from src.agent.mcp_broker import UpstreamServer
+
+    server = UpstreamServer("stand-in", sys.executable, [__file__, "--serve"], {}, max_in_flight=1)
+    await server.ensure_started()
+    try:
+        leaving, staying = FakeClient(), FakeClient()
+        server.attach(leaving)
+        server.attach(staying)
+        server.handle_client_message(leaving, call(1, "block"))
+        await wait_in_flight(server, 1)
+        server.detach(leaving)
+        return await check_released(server, staying, "disconnect")
+    finally:
+        await server.close()
+
+
+async def check_upstream_exit() -> bool:
+    """服务器进程在请求进行中退出"""
+    from src.agent.mcp_broker import UpstreamServer
+
+    server = UpstreamServer("stand-in", sys.executable, [__file__, "--serve"], {}, max_in_flight=2)
+    await server.ensure_started()
+    try:
+        client = FakeClient()
+        server.attach(client)
+        old_tasks = list(server._tasks)
+        server.handle_client_message(client, call(1, "block"))
+        server.handle_client_message(client, call(2, "crash"))
+        server.handle_client_message(client, call(3, "echo"))  # 在途名额已满，仍在排队
+
+        failed = set()
+        try:
+            for _ in range(3):
+                response = await asyncio.wait_for(client.inbox.get(), 5.0)
+                if "error" in response:
+                    failed.add(response["id"])
+        except asyncio.TimeoutError:
+            pass
+        if failed != {1, 2, 3}:
+            print(f"❌ [upstream exit] 得到错误响应的请求: {sorted(failed)}，应为 [1, 2, 3]")
+            return False
+
+        # 之后的请求触发重启，旧的读取和分发任务已经结束
+        server.handle_client_message(client, call(4, "echo"))
+        try:
+            response = await asyncio.wait_for(client.inbox.get(), 10.0)
+        except asyncio.TimeoutError:
+            print("❌ [upstream exit] 重启后的请求没有得到响应")
+            return False
+        ok = (response["id"] == 4 and "result" in response and server.running
+              and all(task.done() for task in old_tasks) and not server._background)
+        print(f"{'✅' if ok else '❌'} [upstream exit] 在途和排队请求返回错误，重启后请求正常响应")
+        return ok
+    finally:
+        await server.close()
+
+
+async def main():
+    print("🧪 MCP broker 测试开始\n")
+    print("=" * 50)
+
+    results = {
+        "cancel": await check_cancel(),
+        "disconnect": await check_disconnect(),
+        "upstream exit": await check_upstream_exit(),
+    }
+
+    print("\n" + "=" * 50)
+    print("📊 测试总结:")
+    for name, ok in results.items():
+        print(f"  - {name}: {'✅ 通过' if ok else '❌ 失败'}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "--serve":
+        run_stand_in_server()
+    else:
+        asyncio.run(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+HTTP / SSE MCP 传输测试脚本
+
+在本地启动一个 FastMCP 替身服务器，验证基于 url 的 MCP 服务器配置
+能够被 MCPToolManager 加载和调用，并且所有会话共用同一个 httpx 连接池。
+"""
+
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加项目路径到 sys.path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+
+def run_stand_in_server(port: int, transport: str):
+    """运行替身 MCP 服务器（在子进程中执行）"""
+    from mcp.server.fastmcp import FastMCP
+
+    server = FastMCP("stand-in", host="127.0.0.1", port=port)
+
+    @server.tool()
+    def echo(text: str) -> str:
+        """原样返回输入文本"""
+        return text
+
+    @server.tool()
+    async def slow_echo(text: str, delay: float = 0.5) -> str:
+        """等待 delay 秒后返回输入文本"""
+        await asyncio.sleep(delay)
+        return text
+
+    server.run(transport=transport)
+
+
+def find_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 15.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return True
+        time.sleep(0.1)
+    return False
+
+
+async def check_transport(transport: str, path: str) -> bool:
+    """启动替身服务器并通过 MCPToolManager 调用其工具"""
+    from src.agent.mcp_http import get_shared_pool
+    from src.agent.mcp_utils import MCPToolManager
+
+    port = find_free_port()
+    server = subprocess.Popen(
+        [sys.executable, __file__, "--serve", str(port), transport],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    try:
+        if not wait_for_port(port):
+            print(f"❌ [{transport}] 替身服务器启动超时")
+            return False
+
+        config = {"mcpServers": {"stand-in": {"url": f"http://127.0.0.1:{port}{path}"}}}
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump(config, f)
+
+        manager = MCPToolManager(config_path=f.name)
+        tools = {tool.name: tool for tool in await manager.load_tools()}
+        print(f"🔧 [{transport}] 加载到工具: {sorted(tools)}")
+        if not {"echo", "slow_echo"} <= set(tools):
+            print(f"❌ [{transport}] 工具加载不完整")
+            return False
+
+        pool = get_shared_pool()
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            tools["slow_echo"].ainvoke({"text": f"hello-{i}", "delay": 0.5}) for i in range(4)
+        ))
+        elapsed = time.perf_counter() - start
+        print(f"📋 [{transport}] 并发调用结果: {results} ({elapsed:.2f}s)")
+
+        ok = results == [f"hello-{i}" for i in range(4)] and get_shared_pool() is pool
+        await manager.close()
+        print(f"{'✅' if ok else '❌'} [{transport}] 测试{'通过' if ok else '失败'}")
+        return ok
+
+    finally:
+        server.terminate()
+        server.wait(timeout=5)
+
+
+async def main():
+    print("🧪 HTTP / SSE MCP 传输测试开始\n")
+    print("=" * 50)
+
+    results = {
+        "streamable-http": await check_transport("streamable-http", "/mcp"),
+        "sse": await check_transport("sse", "/sse"),
+    }
+
+    print("\n" + "=" * 50)
+    print("📊 测试总结:")
+    for transport, ok in results.items():
+        print(f"  - {transport}: {'✅ 通过' if ok else '❌ 失败'}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--serve":
+        run_stand_in_server(int(sys.argv[2]), sys.argv[3])
+    else:
+        asyncio.run(main())
@@ -6,12 +6,17 @@ Su-Cli 自动补全系统
 提供命令、Agent 名称、文件路径等的智能补全功能
 """
 
-from typing import List, Dict, Optional, Tuple, Set
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable, List, Dict, NamedTuple, Optional, Tuple, Set
+import heapq
 import re
 from pathlib import Path
 
+from commands import COMMAND_TABLE
+
 try:
-    from prompt_toolkit.completion import Completer, Completion
+    from prompt_toolkit.completion import Completer, Completion, CompleteEvent
     from prompt_toolkit.document import Document
     from prompt_toolkit.auto_suggest import AutoSuggest, Suggestion
     from prompt_toolkit.key_binding import KeyBindings
@@ -35,6 +40,11 @@ except ImportError:
     class Completer:
         def get_completions(self, document: Document, complete_event=None):
             return []
+
+    class CompleteEvent:
+        def __init__(self, text_inserted: bool = False, completion_requested: bool = False):
+            self.text_inserted = text_inserted
+            self.completion_requested = completion_requested
     
     class Suggestion:
         def __init__(self, text: str):
@@ -50,6 +60,202 @@ except ImportError:
     
     class Keys:
         Tab = 'tab'
+        BracketedPaste = '<bracketed-paste>'
+
+
+# 命令语法：补全器和自动建议器共用，由 main.py 同样使用的命令表生成
+# 命令 -> (说明, 补全优先级)，优先级越小越靠前
+COMMANDS: Dict[str, Tuple[str, int]] = {
+    alias: (command.description, command.priority)
+    for command in COMMAND_TABLE.values()
+    for alias in command.aliases
+}
+
+# 按优先级排好序的命令，每次按键不再重新排序
+COMMANDS_BY_PRIORITY = sorted(COMMANDS, key=lambda cmd: COMMANDS[cmd][1])
+
+# 带参数的命令 -> 参数类型
+COMMAND_ARGUMENTS = {
+    command.aliases[0]: command.argument
+    for command in COMMAND_TABLE.values()
+    if command.argument
+}
+
+# 风格选项（按使用频率排序）
+STYLE_OPTIONS = ['modern', 'minimal', 'classic', 'colorful']
+
+# /trace 命令的参数
+TRACE_ACTIONS = {'export': '导出 Chrome trace'}
+
+# 语言选项（中文优先）
+LANGUAGE_OPTIONS = {'zh': '中文', 'en': 'English'}
+
+# Agent 优先级
+AGENT_PRIORITY = {'default': 1, 'deer-flow': 2}
+
+# show 命令最多补全的序号
+MAX_NUMBER_OPTIONS = 10
+
+# 模糊补全最多返回的候选项数
+MAX_FUZZY_RESULTS = 20
+
+# 记住的最近文件路径数
+MAX_RECENT_PATHS = 1000
+
+# 文件路径补全的触发前缀（@path）
+PATH_PREFIX = '@'
+
+
+class ParsedInput(NamedTuple):
+    """输入框内容的解析结果"""
+    type: str         # 补全类型：command / agent_name / style_name / language / number / trace_action / path / none
+    command: str      # 第一个词（小写）
+    word: str         # 光标所在的词在光标之前的部分
+    word_start: int   # 该词的起始位置
+
+
+@lru_cache(maxsize=256)
+def parse_input(text: str, cursor_position: int) -> ParsedInput:
+    """
+    按命令语法解析输入框内容，确定光标处的补全类型
+    
+    结果按 (text, cursor_position) 缓存，同一次按键中补全器和自动建议器只解析一次。
+    """
+    # 获取光标前的文本（不去除空格，保持原始格式）
+    before_cursor = text[:cursor_position]
+    
+    # 向前查找当前词的开始
+    word_start = cursor_position
+    while word_start > 0 and before_cursor[word_start - 1] not in ' \t\n':
+        word_start -= 1
+    word = before_cursor[word_start:]
+    
+    words = before_cursor.split()
+    if not words:
+        return ParsedInput('command', '', word, word_start)
+    
+    command = words[0].lower()
+    
+    # 检查是否在命令后面有空格（表示要输入参数）
+    has_trailing_space = before_cursor.endswith(' ')
+    
+    # 以 @ 开头的词补全最近的文件路径
+    if word.startswith(PATH_PREFIX):
+        return ParsedInput('path', command, word, word_start)
+
+    # 命令之后补全参数（Agent 名称、风格、语言或序号）
+    if command in COMMAND_ARGUMENTS and (len(words) > 1 or has_trailing_space):
+        return ParsedInput(COMMAND_ARGUMENTS[command], command, word, word_start)
+    
+    # 如果是以 / 开头，或者是单个命令词（没有空格），进行命令补全
+    if before_cursor.strip().startswith('/') or (len(words) == 1 and not has_trailing_space):
+        return ParsedInput('command', command, word, word_start)
+    
+    # 其他情况不进行补全
+    return ParsedInput('none', command, word, word_start)
+
+
+def _prefix_matches(candidates: List[str], word: str) -> List[str]:
+    """按原有顺序返回以 word 开头（不区分大小写）的候选项"""
+    word_lower = word.lower()
+    return [candidate for candidate in candidates if candidate.lower().startswith(word_lower)]
+
+
+# 模糊匹配中视为词边界的字符
+_WORD_SEPARATORS = frozenset('_-/.: ')
+
+
+def _char_mask(text: str) -> int:
+    """字符集合的 64 位位图（按字符码取模），用于快速排除不可能匹配的候选项"""
+    mask = 0
+    for char in text:
+        mask |= 1 << (ord(char) & 63)
+    return mask
+
+
+def _subsequence_score(query: str, text: str) -> Optional[float]:
+    """
+    query 作为子序列在 text 中的匹配分数，不匹配时返回 None
+
+    落在词首（开头或分隔符之后）和连续匹配的字符得分更高，前缀匹配额外加分，
+    同等匹配下较短的候选项排在前面。
+    """
+    score = 0.0
+    position = 0
+    previous = -2
+    for char in query:
+        index = text.find(char, position)
+        if index < 0:
+            return None
+        if index == 0 or text[index - 1] in _WORD_SEPARATORS:
+            score += 8
+        elif index == previous + 1:
+            score += 5
+        score += 1
+        previous = index
+        position = index + 1
+    if text.startswith(query):
+        score += 10
+    return score - 0.05 * (len(text) - len(query))
+
+
+def _typo_score(query: str, text: str) -> Optional[float]:
+    """去掉查询中任意一个字符后的最佳匹配分数"""
+    best = None
+    for i in range(len(query)):
+        score = _subsequence_score(query[:i] + query[i + 1:], text)
+        if score is not None and (best is None or score > best):
+            best = score
+    return best
+
+
+class FuzzyIndex:
+    """
+    模糊匹配索引
+
+    候选项在构建时预先计算小写形式和字符位图，每次按键只做查询：先用位图排除缺少查询字符的
+    候选项，再对剩下的按子序列打分，只保留分数最高的 limit 个，几千个候选项时也不影响输入。
+
+    容忍一个错字：查询去掉任意一个字符后能匹配的候选项也会返回（例如 reda_file 匹配 read_file），
+    分数低于直接匹配的候选项。
+    """
+
+    TYPO_PENALTY = 10
+
+    def __init__(self, candidates: Iterable[str] = ()):
+        self._entries: List[Tuple[str, str, int]] = []
+        self.build(candidates)
+
+    def build(self, candidates: Iterable[str]):
+        """重建索引，候选项的顺序作为同分时的排序依据"""
+        entries = []
+        for candidate in dict.fromkeys(candidates):
+            lower = candidate.lower()
+            entries.append((candidate, lower, _char_mask(lower)))
+        self._entries = entries
+
+    def search(self, query: str, limit: int = MAX_FUZZY_RESULTS) -> List[str]:
+        """返回与 query 模糊匹配、按分数排序的前 limit 个候选项"""
+        query = query.lower()
+        if not query:
+            return [candidate for candidate, _, _ in self._entries[:limit]]
+
+        query_mask = _char_mask(query)
+        allow_typo = len(query) >= 3
+        scored = []
+        for rank, (candidate, lower, mask) in enumerate(self._entries):
+            missing = (query_mask & ~mask).bit_count()
+            score = _subsequence_score(query, lower) if missing == 0 else None
+            if score is None and allow_typo and missing <= 1:
+                score = _typo_score(query, lower)
+                if score is not None:
+                    score -= self.TYPO_PENALTY
+            if score is not None:
+                scored.append((-score, rank, candidate))
+        return [candidate for _, _, candidate in heapq.nsmallest(limit, scored)]
+
+    def __len__(self) -> int:
+        return len(self._entries)
 
 
 class SuCliAutoSuggest(AutoSuggest):
@@ -59,55 +265,27 @@ class SuCliAutoSuggest(AutoSuggest):
     
     def __init__(self):
         """初始化自动建议器"""
-        # 基础命令列表
-        self.base_commands = {
-            # 帮助和退出命令
-            '/help': '显示帮助信息',
-            '/h': '显示帮助信息（简写）',
-            '/exit': '退出程序',
-            '/quit': '退出程序',
-            '/q': '退出程序（简写）',
-            
-            # 系统命令
-            '/clear': '清屏',
-            '/agents': '显示可用的 Agent',
-            '/use': '切换到指定的 Agent',
-            
-            # 历史和重置
-            '/history': '显示对话历史',
-            '/reset': '清空对话历史并重置线程',
-            
-            # 界面风格命令
-            '/style': '显示或设置界面风格',
-            
-            # 语言设置命令
-            '/lang': '显示当前语言设置',
-            '/set_lang': '设置语言',
-            
-            # 工具命令
-            'show': '显示工具调用结果',
-        }
-        
-        # 风格选项
-        self.style_options = ['modern', 'minimal', 'classic', 'colorful']
-        
-        # 语言选项
-        self.language_options = ['en', 'zh']
-        
-        # 可用的 Agents（将在运行时更新）
+        # 可用的 Agents（将在运行时更新，按优先级排序）
         self.available_agents = []
         
         # 最近的工具消息数量
         self.recent_tool_count = 0
+        
+        # 历史输入的前缀索引（启动后由主程序设置）
+        self.history_index = None
     
     def update_agents(self, agents: List[str]):
         """更新可用的 Agent 列表"""
-        self.available_agents = agents.copy()
+        self.available_agents = sorted(agents, key=lambda agent: AGENT_PRIORITY.get(agent, 999))
     
     def update_tool_count(self, count: int):
         """更新最近工具消息数量"""
         self.recent_tool_count = count
     
+    def set_history_index(self, history_index):
+        """设置历史输入的前缀索引"""
+        self.history_index = history_index
+    
     def get_suggestion(self, buffer, document):
         """
         获取自动建议
@@ -126,268 +304,102 @@ class SuCliAutoSuggest(AutoSuggest):
         if cursor_position != len(text):
             return None
         
-        # 分析上下文
-        context = self._analyze_context(text, cursor_position)
-        
-        # 获取当前输入的词
-        words = text.split()
-        if not words:
-            current_word = ""
-        else:
-            # 检查是否以空格结尾
-            if text.endswith(' '):
-                current_word = ""
-            else:
-                current_word = words[-1]
+        # 优先按使用频率和最近使用时间补全整行历史输入（fish 风格）
+        if self.history_index is not None:
+            history_text = self.history_index.suggest(text)
+            if history_text:
+                return Suggestion(history_text[len(text):])
         
         # 根据上下文获取最佳建议
-        suggestion_text = self._get_best_suggestion(context, current_word, text)
+        suggestion_text = self._get_best_suggestion(parse_input(text, cursor_position))
         
         if suggestion_text:
             return Suggestion(suggestion_text)
         
         return None
     
-    def _get_best_suggestion(self, context: Dict[str, str], current_word: str, full_text: str) -> Optional[str]:
-        """获取最佳建议文本"""
-        context_type = context['type']
-        
-        if context_type == 'command':
-            return self._get_best_command_suggestion(current_word)
-        elif context_type == 'agent_name':
-            return self._get_best_agent_suggestion(current_word)
-        elif context_type == 'style_name':
-            return self._get_best_style_suggestion(current_word)
-        elif context_type == 'language':
-            return self._get_best_language_suggestion(current_word)
-        elif context_type == 'number':
-            return self._get_best_number_suggestion(current_word)
-        
-        return None
-    
-    def _get_best_command_suggestion(self, current_word: str) -> Optional[str]:
-        """获取最佳命令建议"""
-        current_lower = current_word.lower()
-        
-        # 定义命令优先级（越小优先级越高）
-        command_priority = {
-            '/help': 1, '/h': 1,
-            '/exit': 2, '/quit': 2, '/q': 2,
-            '/clear': 3,
-            '/agents': 4,
-            '/use': 5,
-            '/history': 6,
-            '/reset': 7,
-            '/style': 8,
-            '/lang': 9,
-            '/set_lang': 10,
-            'show': 11,
-        }
-        
-        # 收集所有匹配的命令
-        matches = []
-        for cmd in self.base_commands.keys():
-            if cmd.lower().startswith(current_lower):
-                priority = command_priority.get(cmd, 999)
-                matches.append((priority, cmd))
-        
-        # 按优先级排序，取第一个
-        if matches:
-            matches.sort(key=lambda x: x[0])
-            best_cmd = matches[0][1]
-            return best_cmd[len(current_word):]
-        
-        return None
-    
-    def _get_best_agent_suggestion(self, current_word: str) -> Optional[str]:
-        """获取最佳 Agent 建议"""
-        current_lower = current_word.lower()
-        
-        # 定义 Agent 优先级
-        agent_priority = {
-            'default': 1,
-            'deer-flow': 2,
-        }
-        
-        # 收集所有匹配的 Agent
-        matches = []
-        for agent in self.available_agents:
-            if agent.lower().startswith(current_lower):
-                priority = agent_priority.get(agent, 999)
-                matches.append((priority, agent))
-        
-        # 按优先级排序，取第一个
-        if matches:
-            matches.sort(key=lambda x: x[0])
-            best_agent = matches[0][1]
-            return best_agent[len(current_word):]
-        
-        return None
-    
-    def _get_best_style_suggestion(self, current_word: str) -> Optional[str]:
-        """获取最佳风格建议"""
-        current_lower = current_word.lower()
-        
-        # 定义风格优先级（按使用频率）
-        style_priority = {
-            'modern': 1,
-            'minimal': 2,
-            'classic': 3,
-            'colorful': 4,
-        }
-        
-        # 收集所有匹配的风格
-        matches = []
-        for style in self.style_options:
-            if style.lower().startswith(current_lower):
-                priority = style_priority.get(style, 999)
-                matches.append((priority, style))
-        
-        # 按优先级排序，取第一个
-        if matches:
-            matches.sort(key=lambda x: x[0])
-            best_style = matches[0][1]
-            return best_style[len(current_word):]
-        
-        return None
-    
-    def _get_best_language_suggestion(self, current_word: str) -> Optional[str]:
-        """获取最佳语言建议"""
-        current_lower = current_word.lower()
-        
-        # 定义语言优先级（中文优先）
-        language_priority = {
-            'zh': 1,
-            'en': 2,
-        }
-        
-        # 收集所有匹配的语言
-        matches = []
-        for lang in self.language_options:
-            if lang.lower().startswith(current_lower):
-                priority = language_priority.get(lang, 999)
-                matches.append((priority, lang))
-        
-        # 按优先级排序，取第一个
-        if matches:
-            matches.sort(key=lambda x: x[0])
-            best_lang = matches[0][1]
-            return best_lang[len(current_word):]
-        
-        return None
-    
-    def _get_best_number_suggestion(self, current_word: str) -> Optional[str]:
-        """获取最佳数字建议"""
-        # 如果当前词为空，建议 "1"
-        if current_word == "":
-            return "1"
-        
-        # 如果当前词是数字开头，寻找匹配的数字
-        if current_word.isdigit():
-            for i in range(1, min(self.recent_tool_count + 1, 11)):
-                if str(i).startswith(current_word):
-                    return str(i)[len(current_word):]
-        
-        return None
-    
-    def _analyze_context(self, text: str, cursor_position: int) -> Dict[str, str]:
-        """
-        分析当前输入的上下文，确定补全类型
-        
-        Returns:
-            Dict: 包含上下文信息的字典
-        """
-        # 获取光标前的文本（不去除空格，保持原始格式）
-        before_cursor = text[:cursor_position]
-        
-        # 分析具体命令的参数
-        words = before_cursor.split()
-        if not words:
-            return {'type': 'command'}
-        
-        first_word = words[0].lower()
-        
-        # 检查是否在命令后面有空格（表示要输入参数）
-        has_trailing_space = before_cursor.endswith(' ')
-        
-        # /use 命令后补全 Agent 名称
-        if first_word == '/use' and (len(words) > 1 or has_trailing_space):
-            return {'type': 'agent_name'}
-        
-        # /style 命令后补全风格名称
-        if first_word == '/style' and (len(words) > 1 or has_trailing_space):
-            return {'type': 'style_name'}
-        
-        # /set_lang 命令后补全语言
-        if first_word == '/set_lang' and (len(words) > 1 or has_trailing_space):
-            return {'type': 'language'}
-        
-        # show 命令后补全数字
-        if first_word == 'show' and (len(words) > 1 or has_trailing_space):
-            return {'type': 'number'}
-        
-        # 如果是以 / 开头，或者是空输入，或者是单个命令词（没有空格），进行命令补全
-        if before_cursor.strip().startswith('/') or before_cursor.strip() == '' or (len(words) == 1 and not has_trailing_space):
-            return {'type': 'command'}
+    def _get_best_suggestion(self, parsed: ParsedInput) -> Optional[str]:
+        """获取最佳建议文本（当前词之后需要补全的部分）"""
+        word = parsed.word
+        
+        if parsed.type == 'command':
+            candidates = COMMANDS_BY_PRIORITY
+        elif parsed.type == 'agent_name':
+            candidates = self.available_agents
+        elif parsed.type == 'style_name':
+            candidates = STYLE_OPTIONS
+        elif parsed.type == 'language':
+            candidates = list(LANGUAGE_OPTIONS)
+        elif parsed.type == 'trace_action':
+            candidates = list(TRACE_ACTIONS)
+        elif parsed.type == 'number':
+            # 如果当前词为空，建议 "1"
+            if word == "":
+                return "1"
+            if not word.isdigit():
+                return None
+            candidates = [str(i) for i in range(1, min(self.recent_tool_count, MAX_NUMBER_OPTIONS) + 1)]
+        else:
+            return None
         
-        # 其他情况不进行补全
-        return {'type': 'none'}
+        matches = _prefix_matches(candidates, word)
+        return matches[0][len(word):] if matches else None
 
 
 class SuCliCompleter(Completer):
-    """Su-Cli 的自动补全器"""
-    
+    """
+    Su-Cli 的自动补全器
+
+    命令、风格和语言按前缀补全；Agent 名称、已加载的工具名称和文件工具访问过的最近路径
+    按模糊匹配补全，各自有预先构建的索引，只在列表变化时重建。
+    """
+
     def __init__(self):
         """初始化补全器"""
-        # 基本命令列表
-        self.base_commands = {
-            # 系统命令
-            '/help': '显示帮助信息',
-            '/h': '显示帮助信息（简写）',
-            '/exit': '退出程序',
-            '/quit': '退出程序',
-            '/q': '退出程序（简写）',
-            '/clear': '清屏',
-            
-            # Agent 管理命令
-            '/agents': '显示可用的 Agent',
-            '/use': '切换到指定的 Agent',
-            
-            # 历史管理命令
-            '/history': '显示对话历史',
-            '/reset': '清空对话历史并重置线程',
-            
-            # 界面风格命令
-            '/style': '显示或设置界面风格',
-            
-            # 语言设置命令
-            '/lang': '显示当前语言设置',
-            '/set_lang': '设置语言',
-            
-            # 工具命令
-            'show': '显示工具调用结果',
-        }
-        
-        # 风格选项
-        self.style_options = ['modern', 'minimal', 'classic', 'colorful']
-        
-        # 语言选项
-        self.language_options = ['en', 'zh']
-        
-        # 可用的 Agents（将在运行时更新）
+        # 可用的 Agents（将在运行时更新，按优先级排序）
         self.available_agents: List[str] = []
-        
+        self._agent_index = FuzzyIndex()
+
+        # 当前 Agent 加载的工具名称
+        self.tool_names: List[str] = []
+        self._tool_index = FuzzyIndex()
+
+        # 文件工具最近访问过的路径（最近的在前）
+        self.recent_paths: "OrderedDict[str, None]" = OrderedDict()
+        self._path_index = FuzzyIndex()
+
         # 最近的工具消息数量（用于 show 命令补全）
         self.recent_tool_count = 0
-    
+
     def update_agents(self, agents: List[str]):
         """更新可用的 Agent 列表"""
-        self.available_agents = agents.copy()
-    
+        self.available_agents = sorted(agents, key=lambda agent: AGENT_PRIORITY.get(agent, 999))
+        self._agent_index.build(self.available_agents)
+
+    def update_tools(self, tool_names: List[str]):
+        """更新已加载的工具名称，列表没有变化时不重建索引"""
+        tool_names = sorted(tool_names)
+        if tool_names != self.tool_names:
+            self.tool_names = tool_names
+            self._tool_index.build(tool_names)
+
+    def add_recent_paths(self, paths: Iterable[str]):
+        """记录文件工具访问过的路径"""
+        changed = False
+        for path in paths:
+            self.recent_paths[path] = None
+            self.recent_paths.move_to_end(path, last=False)
+            changed = True
+        if not changed:
+            return
+        while len(self.recent_paths) > MAX_RECENT_PATHS:
+            self.recent_paths.popitem()
+        self._path_index.build(self.recent_paths)
+
     def update_tool_count(self, count: int):
         """更新最近工具消息数量"""
         self.recent_tool_count = count
-    
+
     def get_completions(self, document: Document, complete_event=None):
         """
         获取补全建议
@@ -399,195 +411,44 @@ class SuCliCompleter(Completer):
         Yields:
             Completion: 补全建议对象
         """
-        text = document.text
-        cursor_position = document.cursor_position
-        
-        # 获取当前词的开始和结束位置
-        word_start, word_end = self._get_current_word_bounds(text, cursor_position)
-        current_word = text[word_start:cursor_position]
-        
-        # 分析当前输入的上下文
-        context = self._analyze_context(text, cursor_position)
+        parsed = parse_input(document.text, document.cursor_position)
+        word = parsed.word
         
         # 根据上下文生成补全建议
-        completions = []
-        
-        if context['type'] == 'command':
-            completions = self._get_command_completions(current_word, word_start, cursor_position)
-        elif context['type'] == 'agent_name':
-            completions = self._get_agent_completions(current_word, word_start, cursor_position)
-        elif context['type'] == 'style_name':
-            completions = self._get_style_completions(current_word, word_start, cursor_position)
-        elif context['type'] == 'language':
-            completions = self._get_language_completions(current_word, word_start, cursor_position)
-        elif context['type'] == 'number':
-            completions = self._get_number_completions(current_word, word_start, cursor_position)
-        
-        return completions
-    
-    def _get_current_word_bounds(self, text: str, cursor_position: int) -> Tuple[int, int]:
-        """
-        获取当前词的边界位置
-        
-        Returns:
-            Tuple[int, int]: (开始位置, 结束位置)
-        """
-        # 向前查找词的开始
-        start = cursor_position
-        while start > 0 and text[start - 1] not in ' \t\n':
-            start -= 1
-        
-        # 向后查找词的结束
-        end = cursor_position
-        while end < len(text) and text[end] not in ' \t\n':
-            end += 1
-        
-        return start, end
-    
-    def _analyze_context(self, text: str, cursor_position: int) -> Dict[str, str]:
-        """
-        分析当前输入的上下文，确定补全类型
-        
-        Returns:
-            Dict: 包含上下文信息的字典
-        """
-        # 获取光标前的文本（不去除空格，保持原始格式）
-        before_cursor = text[:cursor_position]
-        
-        # 分析具体命令的参数
-        words = before_cursor.split()
-        if not words:
-            return {'type': 'command'}
-        
-        first_word = words[0].lower()
-        
-        # 检查是否在命令后面有空格（表示要输入参数）
-        has_trailing_space = before_cursor.endswith(' ')
-        
-        # /use 命令后补全 Agent 名称
-        if first_word == '/use' and (len(words) > 1 or has_trailing_space):
-            return {'type': 'agent_name'}
-        
-        # /style 命令后补全风格名称
-        if first_word == '/style' and (len(words) > 1 or has_trailing_space):
-            return {'type': 'style_name'}
-        
-        # /set_lang 命令后补全语言
-        if first_word == '/set_lang' and (len(words) > 1 or has_trailing_space):
-            return {'type': 'language'}
-        
-        # show 命令后补全数字
-        if first_word == 'show' and (len(words) > 1 or has_trailing_space):
-            return {'type': 'number'}
-        
-        # 如果是以 / 开头，或者是空输入，或者是单个命令词（没有空格），进行命令补全
-        if before_cursor.strip().startswith('/') or before_cursor.strip() == '' or (len(words) == 1 and not has_trailing_space):
-            return {'type': 'command'}
-        
-        # 其他情况不进行补全
-        return {'type': 'none'}
-    
-    def _get_command_completions(self, current_word: str, word_start: int, cursor_position: int) -> List[Completion]:
-        """获取命令补全建议"""
-        completions = []
-        
-        # 过滤匹配的命令
-        current_lower = current_word.lower()
-        
-        for cmd, description in self.base_commands.items():
-            if cmd.lower().startswith(current_lower):
-                # 计算需要补全的部分
-                completion_text = cmd[len(current_word):]
-                
-                # 创建补全对象
-                completion = Completion(
-                    text=completion_text,
-                    start_position=0,
-                    display=f"{cmd} - {description}",
-                    style="class:completion.command"
-                )
-                completions.append(completion)
-        
-        return completions
-    
-    def _get_agent_completions(self, current_word: str, word_start: int, cursor_position: int) -> List[Completion]:
-        """获取 Agent 名称补全建议"""
-        completions = []
-        current_lower = current_word.lower()
-        
-        for agent in self.available_agents:
-            if agent.lower().startswith(current_lower):
-                completion_text = agent[len(current_word):]
-                completion = Completion(
-                    text=completion_text,
-                    start_position=0,
-                    display=f"{agent} - Agent",
-                    style="class:completion.agent"
-                )
-                completions.append(completion)
-        
-        return completions
-    
-    def _get_style_completions(self, current_word: str, word_start: int, cursor_position: int) -> List[Completion]:
-        """获取风格名称补全建议"""
-        completions = []
-        current_lower = current_word.lower()
-        
-        for style in self.style_options:
-            if style.lower().startswith(current_lower):
-                completion_text = style[len(current_word):]
-                completion = Completion(
-                    text=completion_text,
-                    start_position=0,
-                    display=f"{style} - 界面风格",
-                    style="class:completion.style"
-                )
-                completions.append(completion)
-        
-        return completions
-    
-    def _get_language_completions(self, current_word: str, word_start: int, cursor_position: int) -> List[Completion]:
-        """获取语言补全建议"""
-        completions = []
-        current_lower = current_word.lower()
-        
-        language_names = {
-            'en': 'English',
-            'zh': '中文'
-        }
-        
-        for lang, name in language_names.items():
-            # 只有当前词为空或者语言代码以当前词开头时才显示
-            if current_word == '' or lang.lower().startswith(current_lower):
-                completion_text = lang[len(current_word):]
-                completion = Completion(
-                    text=completion_text,
-                    start_position=0,
-                    display=f"{lang} - {name}",
-                    style="class:completion.language"
-                )
-                completions.append(completion)
-        
-        return completions
-    
-    def _get_number_completions(self, current_word: str, word_start: int, cursor_position: int) -> List[Completion]:
-        """获取数字补全建议（用于 show 命令）"""
-        completions = []
-        
-        # 只有当前词是数字开头或为空时才提供数字补全
-        if current_word == '' or current_word.isdigit():
-            for i in range(1, min(self.recent_tool_count + 1, 11)):  # 最多显示10个选项
-                if str(i).startswith(current_word):
-                    completion_text = str(i)[len(current_word):]
-                    completion = Completion(
-                        text=completion_text,
-                        start_position=0,
-                        display=f"{i} - 查看第{i}个工具调用结果",
-                        style="class:completion.number"
-                    )
-                    completions.append(completion)
-        
-        return completions
+        if parsed.type == 'command':
+            items = [(cmd, f"{cmd} - {COMMANDS[cmd][0]}", "class:completion.command")
+                     for cmd in _prefix_matches(list(COMMANDS), word)]
+        elif parsed.type == 'agent_name':
+            items = [(agent, f"{agent} - Agent", "class:completion.agent")
+                     for agent in self._agent_index.search(word)]
+        elif parsed.type == 'style_name':
+            items = [(style, f"{style} - 界面风格", "class:completion.style")
+                     for style in _prefix_matches(STYLE_OPTIONS, word)]
+        elif parsed.type == 'language':
+            items = [(lang, f"{lang} - {LANGUAGE_OPTIONS[lang]}", "class:completion.language")
+                     for lang in _prefix_matches(list(LANGUAGE_OPTIONS), word)]
+        elif parsed.type == 'trace_action':
+            items = [(action, f"{action} - {TRACE_ACTIONS[action]}", "class:completion.command")
+                     for action in _prefix_matches(list(TRACE_ACTIONS), word)]
+        elif parsed.type == 'number' and (word == '' or word.isdigit()):
+            numbers = [str(i) for i in range(1, min(self.recent_tool_count, MAX_NUMBER_OPTIONS) + 1)]
+            items = [(number, f"{number} - 查看第{number}个工具调用结果", "class:completion.number")
+                     for number in _prefix_matches(numbers, word)]
+        elif parsed.type == 'path':
+            items = [(PATH_PREFIX + path, path, "class:completion.path")
+                     for path in self._path_index.search(word[len(PATH_PREFIX):])]
+        elif parsed.type == 'none' and len(word) >= 2:
+            # 普通文本中的词补全为工具名称
+            items = [(name, f"{name} - Tool", "class:completion.tool")
+                     for name in self._tool_index.search(word)]
+        else:
+            items = []
+
+        # 模糊匹配的结果不一定以当前词开头，补全时替换整个词
+        return [
+            Completion(text=text, start_position=-len(word), display=display, style=style)
+            for text, display, style in items
+        ]
 
 
 # 全局实例
@@ -596,7 +457,7 @@ _auto_suggest_instance: Optional[SuCliAutoSuggest] = None
 
 
 def get_completer() -> SuCliCompleter:
-    """获取全局补全器实例（保留旧版本兼容性）"""
+    """获取全局补全器实例"""
     global _completer_instance
     if _completer_instance is None:
         _completer_instance = SuCliCompleter()
@@ -612,15 +473,41 @@ def get_auto_suggest() -> SuCliAutoSuggest:
 
 
 def update_completer_agents(agents: List[str]):
-    """更新自动建议器的 Agent 列表"""
-    auto_suggest = get_auto_suggest()
-    auto_suggest.update_agents(agents)
+    """更新补全器和自动建议器的 Agent 列表"""
+    get_completer().update_agents(agents)
+    get_auto_suggest().update_agents(agents)
 
 
 def update_completer_tool_count(count: int):
-    """更新自动建议器的工具消息数量"""
+    """更新补全器和自动建议器的工具消息数量"""
+    get_completer().update_tool_count(count)
+    get_auto_suggest().update_tool_count(count)
+
+
+def update_completer_tools(tool_names: List[str]):
+    """更新补全器的工具名称索引"""
+    get_completer().update_tools(tool_names)
+
+
+def add_completer_paths(paths: Iterable[str]):
+    """记录文件工具访问过的路径，供 @path 补全"""
+    get_completer().add_recent_paths(paths)
+
+
+def set_completer_history_index(history_index):
+    """设置自动建议器使用的历史输入前缀索引"""
     auto_suggest = get_auto_suggest()
-    auto_suggest.update_tool_count(count)
+    auto_suggest.set_history_index(history_index)
+
+
+# 处理粘贴内容的函数（由主程序设置）：接收粘贴的文本，返回要插入输入框的文本
+_paste_handler = None
+
+
+def set_paste_handler(handler):
+    """设置粘贴处理函数（例如把大段粘贴替换为占位符）"""
+    global _paste_handler
+    _paste_handler = handler
 
 
 # 内联补全样式定义
@@ -640,13 +527,19 @@ def create_key_bindings():
     
     @bindings.add(Keys.Tab)
     def _(event):
-        """Tab 键接受自动建议"""
+        """Tab 键接受自动建议，没有建议时打开或切换补全菜单"""
         buffer = event.app.current_buffer
         suggestion = buffer.suggestion
-        
+
         if suggestion:
             # 接受建议文本
             buffer.insert_text(suggestion.text)
+        elif buffer.complete_state:
+            # 补全菜单已打开，切换到下一项
+            buffer.complete_next()
+        elif _has_completions(buffer):
+            # 模糊补全的候选项通过菜单选择
+            buffer.start_completion(select_first=False)
         else:
             # 如果没有建议，插入制表符（默认行为）
             buffer.insert_text('    ')  # 4个空格作为制表符
@@ -660,23 +553,41 @@ def create_key_bindings():
         if suggestion:
             buffer.insert_text(suggestion.text)
     
-    return bindings 
+    @bindings.add(Keys.BracketedPaste)
+    def _(event):
+        """终端的 bracketed paste：整段粘贴一次处理，大段内容不进入输入缓冲区"""
+        data = event.data.replace('\r\n', '\n').replace('\r', '\n')
+        if _paste_handler is not None:
+            data = _paste_handler(data)
+        event.current_buffer.insert_text(data)
+    
+    return bindings
+
+
+def _has_completions(buffer) -> bool:
+    """光标处是否有补全项（决定 Tab 打开补全菜单还是插入缩进）"""
+    if buffer.completer is None:
+        return False
+    completions = buffer.completer.get_completions(buffer.document, CompleteEvent(completion_requested=True))
+    return next(iter(completions), None) is not None
 
 
 def get_prompt_config():
     """
-    获取完整的 prompt 配置，包括自动建议和按键绑定
-    
+    获取完整的 prompt 配置，包括补全器、自动建议和按键绑定
+
     Returns:
-        dict: 包含 auto_suggest 和 key_bindings 的配置字典
+        dict: 包含 completer、auto_suggest 和 key_bindings 的配置字典
     """
     if not PROMPT_TOOLKIT_AVAILABLE:
         return {
+            'completer': None,
             'auto_suggest': None,
             'key_bindings': None
         }
-    
+
     return {
+        'completer': get_completer(),
         'auto_suggest': get_auto_suggest(),
         'key_bindings': create_key_bindings()
     }
\ No newline at end of file
@@ -0,0 +1,47 @@
+"""
+命令表
+
+main.py 的命令分发（CONFIG 中的 *_COMMANDS）和 autocomplete.py 的补全、自动建议都从这里
+生成，新增或修改命令只需要改这一处。
+"""
+
+from typing import Dict, NamedTuple, Optional, Tuple
+
+
+class Command(NamedTuple):
+    """一条命令及其所有别名"""
+    aliases: Tuple[str, ...]  # 第一个为主名称
+    description: str
+    priority: int  # 补全优先级，越小越靠前
+    argument: Optional[str] = None  # 主名称后面可以跟的参数类型（用于补全）
+
+
+COMMAND_TABLE: Dict[str, Command] = {
+    # 帮助和退出命令
+    "help": Command(('/help', '/h', 'help'), '显示帮助信息', 1),
+    "exit": Command(('/exit', '/quit', '/q', 'exit', 'quit'), '退出程序', 2),
+
+    # 系统命令
+    "clear": Command(('/clear', 'clear'), '清屏', 3),
+    "agents": Command(('/agents', 'agents'), '显示可用的 Agent', 4),
+    "use": Command(('/use',), '切换到指定的 Agent', 5, 'agent_name'),
+
+    # 历史和重置
+    "history": Command(('/history', 'history'), '显示对话历史', 6),
+    "reset": Command(('/reset', 'reset'), '清空对话历史并重置线程', 7),
+
+    # 界面风格命令
+    "style": Command(('/style', 'style'), '显示或设置界面风格', 8, 'style_name'),
+
+    # 语言设置命令
+    "lang": Command(('/lang', 'lang'), '显示当前语言设置', 9),
+    "set_lang": Command(('/set_lang',), '设置语言', 10, 'language'),
+
+    # 工具命令
+    "show": Command(('show',), '显示工具调用结果', 11, 'number'),
+    "tool_display": Command(('/tool_display', '/tool'), '切换工具调用结果显示', 12),
+
+    # 统计命令
+    "stats": Command(('/stats', 'stats'), '显示性能统计', 13),
+    "trace": Command(('/trace', 'trace'), '显示上一轮的耗时瀑布图', 14, 'trace_action'),
+}
@@ -0,0 +1,255 @@
+"""大段粘贴和 @path 附件
+
+粘贴到输入框的大段文本（终端的 bracketed paste）不进入输入缓冲区，而是保存在 PasteStore 中，
+输入框里只留下 [paste #3f9a-1: 1,234 lines, 56.7 KB] 这样的占位符；输入中的 @path 引用一个文件。
+占位符中带有每个会话随机生成的标识，从输入历史中找回的旧占位符不会误用本次会话的粘贴。
+
+发送时占位符和 @path 展开为附件。附件不整体放进消息：文件通过 mmap 映射后按块读取开头和结尾，
+并在中间部分查找用户问题中的关键词，只把 token 预算内的开头、结尾和匹配片段放进消息，
+粘贴几 MB 的日志也不会卡住终端或撑爆上下文。
+"""
+
+import logging
+import mmap
+import os
+import re
+import secrets
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INLINE_MAX_CHARS = 2000
+DEFAULT_BUDGET_TOKENS = 6000
+
+# UTF-8 中日韩字符约 3 字节/token，其余约 4 字节/token，按 3 字节/token 换算不会超出预算
+BYTES_PER_TOKEN = 3
+
+# 预算在开头、匹配片段和结尾之间的分配比例
+HEAD_RATIO = 0.4
+TAIL_RATIO = 0.2
+
+MAX_TERMS = 8
+MAX_MATCHES_PER_TERM = 20
+CONTEXT_LINES = 2
+LINE_SLACK = 512  # 按行对齐时最多多取的字节数，超长的行直接在字节位置截断
+BINARY_SNIFF_BYTES = 8192
+
+PASTE_RE = re.compile(r"\[paste #([0-9a-f]+)-(\d+)[^\]]*\]")
+# @path 前面是空白或左括号、引号（邮箱地址不匹配），在空白或中文标点处结束，例如 "看看 @a.py，为什么报错"
+PATH_RE = re.compile(r"(?<![^\s(\[{'\"（【「『])@([^\s，。；：！？、）】」』]+)")
+# 末尾紧跟的英文标点不属于路径，例如 "check @a.py?" 或 "(see @a.py)"
+PATH_TRAILING_PUNCTUATION = ".,;:!?)]}'\""
+_TERM_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_.\-]{2,}|[一-鿿]{2,}")
+
+
+class Attachment(NamedTuple):
+    """展开后的附件"""
+    name: str       # 文件路径或粘贴编号
+    size: int       # 原始大小（字节）
+    excerpt: str    # 放进消息的内容
+    complete: bool  # 是否完整包含（未截取）
+
+
+class PasteStore:
+    """会话中粘贴的大段文本，输入框里只保留占位符"""
+
+    def __init__(self, inline_max_chars: int = DEFAULT_INLINE_MAX_CHARS):
+        self.inline_max_chars = inline_max_chars
+        # 占位符会随输入历史保存下来，编号每个会话都从 1 开始，用会话标识区分不同会话的粘贴
+        self.session = secrets.token_hex(2)
+        self._pastes: Dict[int, str] = {}
+
+    def handle_paste(self, text: str) -> str:
+        """
+        处理一次粘贴，返回要插入输入框的文本
+
+        不超过 inline_max_chars 的粘贴原样插入，更大的粘贴保存起来，返回占位符。
+        """
+        if len(text) <= self.inline_max_chars:
+            return text
+        paste_id = len(self._pastes) + 1
+        self._pastes[paste_id] = text
+        lines = text.count("\n") + 1
+        return f"[paste #{self.session}-{paste_id}: {lines:,} lines, {_format_size(len(text.encode('utf-8')))}]"
+
+    def get(self, session: str, paste_id: int) -> Optional[str]:
+        """获取本次会话的粘贴内容，其他会话的占位符返回 None"""
+        if session != self.session:
+            return None
+        return self._pastes.get(paste_id)
+
+    def clear(self):
+        self._pastes.clear()
+
+
+def expand_attachments(text: str, paste_store: Optional[PasteStore] = None,
+                       budget_tokens: int = DEFAULT_BUDGET_TOKENS) -> Tuple[str, List[Attachment], List[str]]:
+    """
+    把输入中的粘贴占位符和 @path 引用展开为附件摘录，追加在消息末尾
+
+    @path 末尾的标点不算作路径；@ 之后不是已存在的普通文件时保持原样不作为附件，
+    并在返回值中列出，由调用方提示用户。
+
+    Args:
+        text: 用户输入
+        paste_store: 本次会话的粘贴存储
+        budget_tokens: 所有附件合计的 token 预算
+
+    Returns:
+        Tuple[str, List[Attachment], List[str]]: (发送给模型的消息, 附件列表, 未找到的 @path)，
+        没有附件时消息即原输入
+    """
+    sources: List[Tuple[str, object]] = []
+    if paste_store is not None:
+        for match in PASTE_RE.finditer(text):
+            content = paste_store.get(match.group(1), int(match.group(2)))
+            if content is not None:
+                sources.append((match.group(0), content))
+    unresolved = []
+    for match in PATH_RE.finditer(text):
+        name = match.group(1).rstrip(PATH_TRAILING_PUNCTUATION)
+        if not name:
+            continue
+        path = Path(os.path.expanduser(name))
+        if path.is_file():
+            sources.append((name, path))
+        else:
+            unresolved.append(name)
+
+    if not sources:
+        return text, [], unresolved
+
+    # 用户问题中的关键词（去掉占位符和路径本身）用于在附件中定位相关片段
+    query = PATH_RE.sub(" ", PASTE_RE.sub(" ", text))
+    terms = list(dict.fromkeys(_TERM_RE.findall(query)))[:MAX_TERMS]
+
+    max_bytes = budget_tokens * BYTES_PER_TOKEN // len(sources)
+    attachments = []
+    for name, source in sources:
+        try:
+            if isinstance(source, Path):
+                attachment = _read_file(name, source, terms, max_bytes)
+            else:
+                data = source.encode("utf-8")
+                attachment = Attachment(name, len(data), excerpt(data, terms, max_bytes), len(data) <= max_bytes)
+        except (OSError, ValueError) as e:
+            logger.debug(f"读取附件 {name} 失败: {e}")
+            if isinstance(source, Path):
+                unresolved.append(name)
+            continue
+        attachments.append(attachment)
+
+    if not attachments:
+        return text, [], unresolved
+
+    parts = [text]
+    for attachment in attachments:
+        note = "" if attachment.complete else ' excerpt="head, tail and matched sections"'
+        parts.append(f'<attachment name="{attachment.name}" size="{attachment.size}"{note}>\n'
+                     f"{attachment.excerpt}\n</attachment>")
+    return "\n\n".join(parts), attachments, unresolved
+
+
+def _read_file(name: str, path: Path, terms: List[str], max_bytes: int) -> Attachment:
+    """通过 mmap 读取文件的摘录，不把整个文件读入内存"""
+    size = path.stat().st_size
+    if size == 0:
+        return Attachment(name, 0, "", True)
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if b"\0" in mapped[:BINARY_SNIFF_BYTES]:
+            return Attachment(name, size, "[binary file omitted]", False)
+        return Attachment(name, size, excerpt(mapped, terms, max_bytes), size <= max_bytes)
+
+
+def excerpt(data, terms: List[str], max_bytes: int) -> str:
+    """
+    从 bytes 或 mmap 中截取不超过 max_bytes 的摘录：开头、包含关键词的片段和结尾
+
+    只访问被截取的区域；关键词查找由 find 在映射的内存上完成，不会把文件复制到 Python 对象中。
+    片段按行对齐，被省略的部分用 [... N bytes omitted ...] 标出。
+    """
+    size = len(data)
+    if size <= max_bytes:
+        return _decode(data[:])
+
+    head_end = _line_end(data, int(max_bytes * HEAD_RATIO), size)
+    tail_start = max(_line_start(data, size - int(max_bytes * TAIL_RATIO), head_end), head_end)
+    match_budget = max_bytes - head_end - (size - tail_start)
+
+    sections = _match_sections(data, terms, head_end, tail_start, match_budget)
+
+    parts = [_decode(data[:head_end])]
+    position = head_end
+    for start, end in sections + [(tail_start, size)]:
+        if start > position:
+            parts.append(f"[... {start - position:,} bytes omitted ...]")
+        parts.append(_decode(data[start:end]))
+        position = end
+    return "\n".join(part.strip("\n") for part in parts)
+
+
+def _match_sections(data, terms: List[str], lo: int, hi: int, budget: int) -> List[Tuple[int, int]]:
+    """查找 [lo, hi) 中包含关键词的行（前后各带几行上下文），按位置排序并合并重叠的片段"""
+    if budget <= 0 or lo >= hi:
+        return []
+
+    hits = []
+    for term in terms:
+        for needle in dict.fromkeys([term.encode("utf-8"), term.lower().encode("utf-8")]):
+            position = lo
+            for _ in range(MAX_MATCHES_PER_TERM):
+                index = data.find(needle, position, hi)
+                if index < 0:
+                    break
+                hits.append(index)
+                position = index + len(needle)
+
+    sections: List[Tuple[int, int]] = []
+    used = 0
+    # 靠前的匹配优先，直到用完预算
+    for index in sorted(set(hits)):
+        start, end = _line_start(data, index, lo), _line_end(data, index, hi)
+        for _ in range(CONTEXT_LINES):
+            start = _line_start(data, start - 1, lo) if start > lo else lo
+            end = _line_end(data, end, hi)
+        if sections and start <= sections[-1][1]:
+            previous_start, previous_end = sections[-1]
+            if end <= previous_end:
+                continue
+            if used + end - previous_end > budget:
+                break
+            used += end - previous_end
+            sections[-1] = (previous_start, end)
+            continue
+        if used + end - start > budget:
+            break
+        used += end - start
+        sections.append((start, end))
+    return sections
+
+
+def _line_start(data, position: int, lo: int) -> int:
+    """position 所在行的起始位置（不早于 lo），附近没有换行符时返回 position"""
+    position = max(position, lo)
+    index = data.rfind(b"\n", max(lo, position - LINE_SLACK), position)
+    return position if index < 0 else index + 1
+
+
+def _line_end(data, position: int, hi: int) -> int:
+    """position 所在行的结束位置（包括换行符，不晚于 hi），附近没有换行符时返回 position"""
+    position = min(position, hi)
+    index = data.find(b"\n", position, min(hi, position + LINE_SLACK))
+    return position if index < 0 else index + 1
+
+
+def _decode(data: bytes) -> str:
+    return data.decode("utf-8", errors="replace")
+
+
+def _format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024 or unit == "MB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
@@ -0,0 +1,144 @@
+"""对话上下文预算
+
+每轮都会把全部历史对话重新发给模型，长会话的请求会越来越大，直到超出模型的上下文
+长度。预算器估算每条历史消息的 token 数（估算结果缓存在消息上），只保留预算内最近的
+几轮对话；更早的对话由后台任务合并进一份滚动摘要，不占用当前请求的时间。摘要完成前，
+移出窗口的消息仍然照常发送，摘要写好后再一次性替换掉，不会有对话既不在窗口里也不在摘要里。
+摘要由 agent 合并进自己的系统提示，而不是作为第二条系统消息。
+
+为了让模型服务的前缀缓存尽量命中，保留窗口不是每轮滑动：只有超出预算时才一次性
+把窗口起点前移到预算的一半以内，其间各轮请求的前缀保持不变。
+"""
+
+import asyncio
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET_TOKENS = 24000
+DEFAULT_LOW_WATER_RATIO = 0.5
+SUMMARY_MAX_CHARS = 2000
+
+_CJK_RE = re.compile(r"[　-〿一-鿿＀-￯]")
+
+SUMMARY_PROMPT = """请把下面的对话内容合并进已有的对话摘要，保留用户的目标、已确认的事实、
+做出的决定和未完成的事项，省略寒暄和重复内容。只输出新的摘要，不超过 {max_chars} 字。
+
+已有摘要：
+{summary}
+
+新的对话：
+{transcript}"""
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数：中日韩字符约 1 token/字，其余约 4 字符/token"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4 + 4
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """获取历史消息的 token 估算值，结果缓存在消息的 tokens 字段中"""
+    tokens = message.get("tokens")
+    if tokens is None:
+        tokens = estimate_tokens(message.get("content", ""))
+        message["tokens"] = tokens
+    return tokens
+
+
+class ContextBudgeter:
+    """为对话历史分配上下文预算，并在后台维护较早对话的滚动摘要"""
+
+    def __init__(self, budget_tokens: int = DEFAULT_BUDGET_TOKENS,
+                 low_water_ratio: float = DEFAULT_LOW_WATER_RATIO):
+        """
+        Args:
+            budget_tokens: 历史消息（包括摘要和当前输入）的 token 预算
+            low_water_ratio: 超出预算时，窗口前移到预算的该比例以内
+        """
+        self.budget_tokens = budget_tokens
+        self.low_water_ratio = low_water_ratio
+        self.summary = ""
+        self.window_start = 0
+        self.summarized_upto = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def reset(self):
+        """清空摘要和窗口（对话重置时调用）"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+        self.summary = ""
+        self.window_start = 0
+        self.summarized_upto = 0
+
+    def select(self, history: List[Dict[str, Any]], user_input: str) -> List[Dict[str, Any]]:
+        """
+        返回本轮要发送的历史消息，必要时前移窗口并安排后台摘要
+
+        Args:
+            history: 完整的对话历史
+            user_input: 当前用户输入
+
+        Returns:
+            List[Dict]: 窗口内的历史消息
+        """
+        if self.window_start > len(history):
+            self.reset()
+
+        fixed = estimate_tokens(user_input) + estimate_tokens(self.summary)
+        total = fixed + sum(message_tokens(m) for m in history[self.window_start:])
+
+        if total > self.budget_tokens:
+            low_water = self.budget_tokens * self.low_water_ratio
+            start = self.window_start
+            # 以一问一答为单位前移，避免窗口从助手回复开始
+            while start < len(history) and total > low_water:
+                for message in history[start:start + 2]:
+                    total -= message_tokens(message)
+                start += 2
+            self.window_start = min(start, len(history))
+            logger.debug(f"上下文超出预算，窗口前移到第 {self.window_start} 条消息（约 {total} tokens）")
+
+        if self.window_start > self.summarized_upto:
+            self._schedule_summary(history)
+
+        # 摘要只覆盖前 summarized_upto 条消息，其后的消息即使已移出窗口也继续发送
+        return history[min(self.window_start, self.summarized_upto):]
+
+    def _schedule_summary(self, history: List[Dict[str, Any]]):
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        upto = self.window_start
+        messages = history[self.summarized_upto:upto]
+        self._task = loop.create_task(self._summarize(messages, upto))
+
+    async def _summarize(self, messages: List[Dict[str, Any]], upto: int):
+        """把窗口外的对话合并进滚动摘要"""
+        from llm_factory import get_chat_model
+
+        transcript = "\n".join(
+            f"{'用户' if m.get('role') == 'user' else '助手'}: {m.get('content', '')}" for m in messages
+        )
+        prompt = SUMMARY_PROMPT.format(
+            max_chars=SUMMARY_MAX_CHARS,
+            summary=self.summary or "（无）",
+            transcript=transcript,
+        )
+        try:
+            response = await get_chat_model().ainvoke(prompt)
+        except Exception as e:
+            logger.warning(f"生成对话摘要失败: {e}")
+            return
+
+        content = response.content if isinstance(response.content, str) else str(response.content)
+        self.summary = content.strip()[:SUMMARY_MAX_CHARS * 2]
+        self.summarized_upto = upto
+        logger.debug(f"对话摘要已更新（覆盖前 {upto} 条消息）")
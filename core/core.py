@@ -5,8 +5,6 @@ from typing import List, Dict, Optional, Any
 import importlib.util
 import logging
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
@@ -69,7 +67,7 @@ class AgentScanner:
             Dict: agent 信息，如果无效则返回 None
         """
         agent_name = agent_path.name
-        logger.info(f"扫描 agent: {agent_name}")
+        logger.debug(f"扫描 agent: {agent_name}")
         
         agent_info = {
             "name": agent_name,
@@ -89,7 +87,7 @@ class AgentScanner:
                 agent_info["entry_point"] = self._find_entry_point(agent_path)
                 agent_info["dependencies"] = self._scan_dependencies(agent_path)
                 
-                logger.info(f"✓ Agent {agent_name} 验证通过")
+                logger.debug(f"✓ Agent {agent_name} 验证通过")
             else:
                 logger.warning(f"✗ Agent {agent_name} 不符合 Langgraph 结构要求")
                 
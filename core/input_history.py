@@ -0,0 +1,237 @@
+"""跨会话保存的输入历史
+
+用户的每条输入追加到状态目录下的 input_history.jsonl（每行一条 {"ts", "text"}），
+启动时读取最近的条目供上下键浏览。文件超过条目上限时在加载时压缩，只保留最近的条目。
+
+加载的同时建立前缀索引，为内联建议提供 fish 风格的历史补全：以当前输入为前缀、
+按使用次数和最近使用时间排序最靠前的历史输入。
+"""
+
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from paths import get_state_dir
+
+try:
+    from prompt_toolkit.history import History
+except ImportError:
+    History = object
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 100000
+DEFAULT_HALF_LIFE = 7 * 24 * 3600  # 最近使用时间的权重每 7 天减半
+
+
+def load_entries(path: Path, max_entries: int = DEFAULT_MAX_ENTRIES) -> List[Tuple[float, str]]:
+    """
+    读取历史文件中最近的 max_entries 条记录（按时间从旧到新）
+
+    文件中的条目超过上限或包含损坏的行时，用保留下来的条目重写文件。
+    """
+    if not path.exists():
+        return []
+
+    entries: List[Tuple[float, str]] = []
+    corrupted = 0
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    entries.append((float(record["ts"]), record["text"]))
+                except (ValueError, KeyError, TypeError):
+                    corrupted += 1
+    except OSError as e:
+        logger.debug(f"读取输入历史失败: {e}")
+        return []
+
+    if len(entries) > max_entries or corrupted:
+        entries = entries[-max_entries:]
+        _rewrite(path, entries)
+    return entries
+
+
+def _rewrite(path: Path, entries: Iterable[Tuple[float, str]]):
+    """原子地重写历史文件"""
+    tmp_path = path.with_suffix(".tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for ts, text in entries:
+                f.write(json.dumps({"ts": ts, "text": text}, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.debug(f"压缩输入历史失败: {e}")
+
+
+class HistoryIndex:
+    """
+    历史输入的前缀索引
+
+    去重后的输入按字典序排成数组，以某个前缀开头的输入是数组中连续的一段，用二分查找定位；
+    每条输入的分数为 使用次数 × 2^(-距上次使用的时间 / 半衰期)，线段树在 O(log n) 内
+    找出段内分数最高的输入，10 万条历史时每次按键的查询也远低于 1 毫秒。
+
+    本次会话中新出现的输入先放在一个小的待合并表中，积累到一定数量后再重建数组。
+    """
+
+    REBUILD_THRESHOLD = 256
+
+    def __init__(self, half_life: float = DEFAULT_HALF_LIFE):
+        self.half_life = half_life
+        self._stats: Dict[str, List[float]] = {}  # 输入 -> [使用次数, 最近使用时间]
+        self._pending: Dict[str, float] = {}  # 尚未并入数组的新输入 -> 分数
+        self._reference_time = time.time()
+        # (有序输入数组, 分数, 线段树, 叶子数, 输入 -> 下标)，整体替换以便在后台线程中重建
+        self._state: Tuple[List[str], List[float], List[int], int, Dict[str, int]] = ([], [], [], 0, {})
+
+    def build(self, entries: Iterable[Tuple[float, str]]):
+        """用 (时间, 输入) 记录重建索引"""
+        stats: Dict[str, List[float]] = {}
+        for ts, text in entries:
+            stat = stats.get(text)
+            if stat is None:
+                stats[text] = [1, ts]
+            else:
+                stat[0] += 1
+                stat[1] = max(stat[1], ts)
+        self._stats = stats
+        self._reference_time = time.time()
+        self._rebuild()
+
+    def add(self, text: str, ts: Optional[float] = None):
+        """记录一次新的输入"""
+        ts = ts or time.time()
+        stat = self._stats.setdefault(text, [0, ts])
+        stat[0] += 1
+        stat[1] = max(stat[1], ts)
+        score = self._score(stat)
+
+        texts, scores, tree, size, positions = self._state
+        position = positions.get(text)
+        if position is not None:
+            scores[position] = score
+            _update(tree, size, scores, position)
+            return
+
+        self._pending[text] = score
+        if len(self._pending) > self.REBUILD_THRESHOLD:
+            self._rebuild()
+
+    def suggest(self, prefix: str) -> Optional[str]:
+        """
+        返回以 prefix 开头、分数最高的历史输入（不包括与 prefix 完全相同的输入）
+
+        Returns:
+            Optional[str]: 完整的历史输入，没有匹配时返回 None
+        """
+        if not prefix:
+            return None
+
+        texts, scores, tree, size, _ = self._state
+        lo = bisect_left(texts, prefix)
+        hi = bisect_left(texts, prefix + "\U0010ffff", lo)
+        if lo < hi and texts[lo] == prefix:
+            lo += 1
+
+        best, best_score = None, -1.0
+        if lo < hi:
+            index = _query(tree, size, scores, lo, hi)
+            best, best_score = texts[index], scores[index]
+
+        for text, score in list(self._pending.items()):
+            if score > best_score and text != prefix and text.startswith(prefix):
+                best, best_score = text, score
+        return best
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def _score(self, stat: List[float]) -> float:
+        return stat[0] * 2 ** ((stat[1] - self._reference_time) / self.half_life)
+
+    def _rebuild(self):
+        texts = sorted(self._stats)
+        scores = [self._score(self._stats[text]) for text in texts]
+        size = 1
+        while size < len(texts):
+            size *= 2
+        tree = [-1] * (2 * size)
+        tree[size:size + len(texts)] = range(len(texts))
+        for node in range(size - 1, 0, -1):
+            tree[node] = _better(scores, tree[2 * node], tree[2 * node + 1])
+        self._state = (texts, scores, tree, size, {text: i for i, text in enumerate(texts)})
+        self._pending = {}
+
+
+def _better(scores: List[float], a: int, b: int) -> int:
+    """线段树节点合并：返回分数较高的下标（-1 表示空）"""
+    if a < 0:
+        return b
+    if b < 0:
+        return a
+    return a if scores[a] >= scores[b] else b
+
+
+def _query(tree: List[int], size: int, scores: List[float], lo: int, hi: int) -> int:
+    """查询 [lo, hi) 中分数最高的下标"""
+    best = -1
+    lo += size
+    hi += size
+    while lo < hi:
+        if lo & 1:
+            best = _better(scores, best, tree[lo])
+            lo += 1
+        if hi & 1:
+            hi -= 1
+            best = _better(scores, best, tree[hi])
+        lo >>= 1
+        hi >>= 1
+    return best
+
+
+def _update(tree: List[int], size: int, scores: List[float], position: int):
+    """某个叶子的分数变化后更新到根的路径"""
+    node = (position + size) >> 1
+    while node:
+        tree[node] = _better(scores, tree[2 * node], tree[2 * node + 1])
+        node >>= 1
+
+
+class InputHistory(History):
+    """
+    prompt_toolkit 的历史实现：条目数有上限，文件在加载时压缩
+
+    多个 PromptSession 可以共用同一个实例，切换提示符风格后上下键历史保持不变。
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        super().__init__()
+        self.path = Path(path) if path else get_state_dir() / "input_history.jsonl"
+        self.max_entries = max_entries
+        self.entries: List[Tuple[float, str]] = []
+        self.index = HistoryIndex()
+
+    def load_history_strings(self) -> Iterable[str]:
+        """按从新到旧的顺序返回历史（prompt_toolkit 在后台线程中调用）"""
+        self.entries = load_entries(self.path, self.max_entries)
+        self.index.build(self.entries)
+        return [text for _, text in reversed(self.entries)]
+
+    def store_string(self, string: str) -> None:
+        """追加一条输入，与上一条相同的输入不重复记录"""
+        if self.entries and self.entries[-1][1] == string:
+            return
+        entry = (time.time(), string)
+        self.entries.append(entry)
+        self.index.add(string, entry[0])
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"ts": entry[0], "text": string}, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.debug(f"保存输入历史失败: {e}")
@@ -0,0 +1,207 @@
+"""LLM 响应的精确匹配磁盘缓存
+
+默认 agent 使用 temperature=0，批量重跑和回归检查会反复发送完全相同的请求。
+启用缓存后，相同的 (模型、API 地址、规范化后的消息列表、工具定义) 直接从
+SQLite 中重放上一次的响应（包括工具调用消息），不再请求 LLM。
+
+缓存通过 langchain 的全局 LLM 缓存接入，对所有未单独指定 cache 的聊天模型生效。
+条目超过 TTL 后失效，超过条目数或总字节数上限时按最近访问时间淘汰。
+"""
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.globals import set_llm_cache
+from langchain_core.load import dumps, loads
+
+from paths import get_state_dir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# 序列化后的模型参数中可能包含不可序列化对象的 repr（如 http 客户端），去掉其中的内存地址
+_ADDRESS_RE = re.compile(r" at 0x[0-9a-fA-F]+")
+# 每次运行都会变化、与响应内容无关的消息字段
+_VOLATILE_FIELDS = ("id", "tool_call_id", "response_metadata", "usage_metadata")
+
+_active_cache: Optional["SQLiteLLMCache"] = None
+
+
+def _normalize_message(message: Any) -> Any:
+    """去掉消息中的 id、元数据等易变字段"""
+    if not isinstance(message, dict) or not isinstance(message.get("kwargs"), dict):
+        return message
+
+    kwargs = {k: v for k, v in message["kwargs"].items() if k not in _VOLATILE_FIELDS}
+    if kwargs.get("tool_calls"):
+        kwargs["tool_calls"] = [
+            {k: v for k, v in call.items() if k != "id"} for call in kwargs["tool_calls"]
+        ]
+    if kwargs.get("additional_kwargs"):
+        # additional_kwargs 中的 tool_calls 与 tool_calls 字段重复，且带有每次不同的调用 id
+        kwargs["additional_kwargs"] = {
+            k: v for k, v in kwargs["additional_kwargs"].items() if k not in ("tool_calls", "refusal")
+        }
+    return {**message, "kwargs": kwargs}
+
+
+def normalize_prompt(prompt: str) -> str:
+    """规范化序列化后的消息列表"""
+    try:
+        messages = json.loads(prompt)
+    except json.JSONDecodeError:
+        return prompt
+    if isinstance(messages, list):
+        messages = [_normalize_message(message) for message in messages]
+    return json.dumps(messages, sort_keys=True, ensure_ascii=False)
+
+
+def make_cache_key(prompt: str, llm_string: str) -> str:
+    """根据消息列表和模型参数（包含模型、API 地址和绑定的工具）生成缓存键"""
+    payload = _ADDRESS_RE.sub("", llm_string) + "\n" + normalize_prompt(prompt)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SQLiteLLMCache(BaseCache):
+    """基于 SQLite 的 LLM 响应缓存，支持 TTL 和 LRU 淘汰"""
+
+    def __init__(self, path: Optional[Path] = None, ttl: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            path: 数据库文件路径，默认为状态目录下的 llm_cache.sqlite
+            ttl: 条目有效期（秒）
+            max_entries: 最大条目数
+            max_bytes: 所有条目的最大总字节数
+        """
+        self.path = Path(path).expanduser() if path else get_state_dir() / "llm_cache.sqlite"
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = make_cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+
+        try:
+            return loads(row[0])
+        except Exception as e:
+            logger.warning(f"LLM 缓存条目反序列化失败，已忽略: {e}")
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = make_cache_key(prompt, llm_string)
+        value = dumps(return_val)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+            self._evict()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def _evict(self):
+        """淘汰过期条目，以及超出条目数或字节数上限时最久未访问的条目"""
+        self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,))
+        count, total_bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+        ).fetchone()
+        if count <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+
+        rows = self._conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at").fetchall()
+        stale = []
+        for key, size in rows:
+            if count <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            stale.append((key,))
+            count -= 1
+            total_bytes -= size
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", stale)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取本次运行的命中统计"""
+        total = self.hits + self.misses
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+        }
+
+
+def configure_llm_cache(enabled: bool, options: Optional[Dict[str, Any]] = None) -> Optional[SQLiteLLMCache]:
+    """
+    启用或关闭全局 LLM 响应缓存
+
+    同一个数据库文件只打开一次，在 agent 之间切换时复用。
+
+    Args:
+        enabled: 是否启用
+        options: 缓存配置，支持 path、ttl、maxEntries、maxBytes
+
+    Returns:
+        Optional[SQLiteLLMCache]: 启用时返回生效的缓存
+    """
+    global _active_cache
+    if not enabled:
+        set_llm_cache(None)
+        return None
+
+    options = options or {}
+    path = Path(options["path"]).expanduser() if options.get("path") else get_state_dir() / "llm_cache.sqlite"
+    if _active_cache is None or _active_cache.path != path:
+        _active_cache = SQLiteLLMCache(path)
+    _active_cache.ttl = options.get("ttl", DEFAULT_TTL_SECONDS)
+    _active_cache.max_entries = options.get("maxEntries", DEFAULT_MAX_ENTRIES)
+    _active_cache.max_bytes = options.get("maxBytes", DEFAULT_MAX_BYTES)
+
+    set_llm_cache(_active_cache)
+    return _active_cache
+
+
+def get_llm_cache_stats() -> Optional[Dict[str, Any]]:
+    """获取 LLM 缓存统计，从未启用时返回 None"""
+    return _active_cache.get_stats() if _active_cache is not None else None
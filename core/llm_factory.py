@@ -0,0 +1,233 @@
+"""LLM 客户端工厂
+
+由 CLI 持有的共享 httpx 连接池：所有 agent 创建的 ChatOpenAI 共用同一组长连接，
+安装了 h2 时启用 HTTP/2。客户端和模型都在第一次使用时才创建，导入 agent 不再产生
+客户端初始化的开销。
+
+在用户输入时可以调用 start_warm_up() 提前与 DEEPSEEK_BASE_URL 建立连接，
+这样第一次请求不必再等待 DNS 解析和 TLS 握手。
+
+通过 configure_hedging() 可以为之后创建的模型启用请求对冲（见 llm_hedging.py）。
+
+超时可以通过环境变量配置：
+    SU_CLI_LLM_CONNECT_TIMEOUT  建立连接的超时（秒），默认 10
+    SU_CLI_LLM_READ_TIMEOUT     读取响应的超时（秒），默认 120
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 120.0
+KEEPALIVE_EXPIRY = 120.0
+POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=KEEPALIVE_EXPIRY)
+
+_async_client: Optional[httpx.AsyncClient] = None
+_sync_client: Optional[httpx.Client] = None
+_models: Dict[Tuple, Any] = {}
+_warm_up_task: Optional[asyncio.Task] = None
+_hedging_options: Dict[str, Any] = {}
+_hedging_policies: list = []
+_last_warm_up = 0.0
+
+
+def _get_timeout() -> httpx.Timeout:
+    """根据环境变量构造超时设置"""
+    connect = float(os.getenv("SU_CLI_LLM_CONNECT_TIMEOUT") or DEFAULT_CONNECT_TIMEOUT)
+    read = float(os.getenv("SU_CLI_LLM_READ_TIMEOUT") or DEFAULT_READ_TIMEOUT)
+    return httpx.Timeout(read, connect=connect)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取（必要时创建）共享的异步 HTTP 客户端"""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=POOL_LIMITS,
+            timeout=_get_timeout(),
+        )
+        logger.debug(f"创建 LLM HTTP 连接池 (HTTP/2: {HTTP2_AVAILABLE})")
+    return _async_client
+
+
+def get_sync_http_client() -> httpx.Client:
+    """获取（必要时创建）共享的同步 HTTP 客户端，供 invoke/stream 等同步调用使用"""
+    global _sync_client
+    if _sync_client is None or _sync_client.is_closed:
+        _sync_client = httpx.Client(
+            http2=HTTP2_AVAILABLE,
+            limits=POOL_LIMITS,
+            timeout=_get_timeout(),
+        )
+    return _sync_client
+
+
+def get_chat_model(
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    temperature: float = 0,
+    **kwargs: Any,
+):
+    """
+    获取使用共享连接池的 ChatOpenAI 实例
+
+    参数相同的调用返回同一个实例。未指定的参数从 DEEPSEEK_MODEL（或 MODEL_NAME）、
+    DEEPSEEK_BASE_URL、DEEPSEEK_API_KEY 环境变量读取。
+
+    Args:
+        model: 模型名称
+        base_url: API 地址
+        api_key: API 密钥
+        temperature: 采样温度
+        **kwargs: 传给 ChatOpenAI 的其他参数
+
+    Returns:
+        BaseChatModel: 聊天模型，启用对冲时为包装了 ChatOpenAI 的 HedgedChatModel
+    """
+    model = model or os.getenv("DEEPSEEK_MODEL") or os.getenv("MODEL_NAME")
+    base_url = base_url or os.getenv("DEEPSEEK_BASE_URL")
+    api_key = api_key or os.getenv("DEEPSEEK_API_KEY")
+
+    hedging = json.dumps(_hedging_options, sort_keys=True) if _hedging_options.get("enabled") else None
+    key = (model, base_url, api_key, temperature, tuple(sorted(kwargs.items())), hedging)
+    chat_model = _models.get(key)
+    if chat_model is None:
+        chat_model = _build_chat_model(model, base_url, api_key, temperature, **kwargs)
+        if hedging:
+            chat_model = _build_hedged_model(chat_model, temperature, **kwargs)
+        _models[key] = chat_model
+    return chat_model
+
+
+def _build_chat_model(model, base_url, api_key, temperature, **kwargs):
+    from langchain_openai import ChatOpenAI
+
+    # 流式调用（例如对冲）也返回用量，便于统计前缀缓存命中
+    kwargs.setdefault("stream_usage", True)
+    return ChatOpenAI(
+        model=model,
+        base_url=base_url,
+        api_key=api_key,
+        temperature=temperature,
+        http_client=get_sync_http_client(),
+        http_async_client=get_http_client(),
+        **kwargs,
+    )
+
+
+def _build_hedged_model(primary, temperature, **kwargs):
+    """用对冲策略包装模型；配置了 fallbackModel / fallbackBaseUrl 时对冲请求发往备用模型"""
+    from llm_hedging import HedgedChatModel, HedgingPolicy
+
+    hedge = None
+    if _hedging_options.get("fallbackModel") or _hedging_options.get("fallbackBaseUrl"):
+        api_key_env = _hedging_options.get("fallbackApiKeyEnv")
+        hedge = _build_chat_model(
+            _hedging_options.get("fallbackModel") or primary.model_name,
+            _hedging_options.get("fallbackBaseUrl") or primary.openai_api_base,
+            os.getenv(api_key_env) if api_key_env else primary.openai_api_key,
+            temperature,
+            **kwargs,
+        )
+
+    policy = HedgingPolicy.from_config(_hedging_options)
+    _hedging_policies.append(policy)
+    return HedgedChatModel(primary=primary, hedge=hedge, policy=policy)
+
+
+def configure_hedging(options: Optional[Dict[str, Any]]):
+    """
+    设置之后创建的模型所使用的请求对冲配置
+
+    Args:
+        options: 对冲配置，enabled 为 false 或为空时不启用对冲
+    """
+    global _hedging_options
+    _hedging_options = dict(options or {})
+
+
+def get_hedging_stats() -> Optional[Dict[str, Any]]:
+    """获取所有对冲模型的汇总统计，未创建对冲模型时返回 None"""
+    if not _hedging_policies:
+        return None
+    from llm_hedging import get_policy_stats
+    return get_policy_stats(_hedging_policies)
+
+
+async def warm_up(base_url: Optional[str] = None) -> bool:
+    """
+    与 LLM 服务建立一条连接并放回连接池
+
+    只关心连接是否建立，不关心响应状态码。
+
+    Returns:
+        bool: 是否成功建立连接
+    """
+    global _last_warm_up
+    base_url = base_url or os.getenv("DEEPSEEK_BASE_URL")
+    if not base_url:
+        return False
+
+    start = time.perf_counter()
+    try:
+        response = await get_http_client().head(base_url, timeout=_get_timeout().connect)
+        await response.aclose()
+    except httpx.HTTPError as e:
+        logger.debug(f"LLM 连接预热失败: {e}")
+        return False
+
+    _last_warm_up = time.monotonic()
+    logger.debug(f"LLM 连接预热完成: {base_url} ({time.perf_counter() - start:.2f}s)")
+    return True
+
+
+def start_warm_up(base_url: Optional[str] = None) -> Optional[asyncio.Task]:
+    """
+    在后台预热 LLM 连接
+
+    最近一次预热的连接仍在保活期内、或已有预热任务在进行时不会重复发起。
+
+    Returns:
+        Optional[asyncio.Task]: 预热任务，未发起时返回 None
+    """
+    global _warm_up_task
+    if not (base_url or os.getenv("DEEPSEEK_BASE_URL")):
+        return None
+    if _warm_up_task is not None and not _warm_up_task.done():
+        return None
+    if time.monotonic() - _last_warm_up < KEEPALIVE_EXPIRY / 2:
+        return None
+
+    try:
+        _warm_up_task = asyncio.get_running_loop().create_task(warm_up(base_url))
+    except RuntimeError:
+        return None
+    return _warm_up_task
+
+
+async def close_clients():
+    """关闭共享的 HTTP 客户端"""
+    global _async_client, _sync_client
+    _models.clear()
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client = None
@@ -0,0 +1,242 @@
+"""LLM 请求对冲（hedged requests）
+
+少数响应特别慢的请求决定了整轮对话的 p99 延迟。启用对冲后，如果首个 token
+在最近首 token 延迟（TTFT）的指定分位数内仍未到达，就再发出一个相同的请求
+（可以发往备用模型 / API 地址），先返回首个 token 的请求胜出，另一个被取消。
+
+对冲请求受预算限制：对冲次数不超过总请求数的 budget 比例。
+"""
+
+import asyncio
+import contextlib
+import logging
+import math
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PERCENTILE = 95
+DEFAULT_MIN_SAMPLES = 20
+DEFAULT_DELAY = 5.0
+DEFAULT_MIN_DELAY = 0.5
+DEFAULT_BUDGET = 0.1
+DEFAULT_WINDOW = 200
+
+
+@dataclass
+class HedgingStats:
+    """对冲统计"""
+    requests: int = 0
+    hedged: int = 0          # 发出了对冲请求的次数
+    hedge_wins: int = 0      # 对冲请求先返回首个 token 的次数
+    budget_exhausted: int = 0  # 达到对冲条件但预算不足的次数
+
+
+class HedgingPolicy:
+    """根据最近的 TTFT 分布决定何时发出对冲请求"""
+
+    def __init__(self, percentile: float = DEFAULT_PERCENTILE, min_samples: int = DEFAULT_MIN_SAMPLES,
+                 default_delay: float = DEFAULT_DELAY, min_delay: float = DEFAULT_MIN_DELAY,
+                 budget: float = DEFAULT_BUDGET, window: int = DEFAULT_WINDOW):
+        """
+        Args:
+            percentile: 对冲延迟取最近 TTFT 的该分位数
+            min_samples: 样本不足时使用 default_delay
+            default_delay: 默认对冲延迟（秒）
+            min_delay: 对冲延迟的下限（秒）
+            budget: 对冲请求占总请求数的最大比例
+            window: 用于计算分位数的最近样本数
+        """
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.budget = budget
+        self.stats = HedgingStats()
+        self._samples: deque = deque(maxlen=window)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "HedgingPolicy":
+        return cls(
+            percentile=config.get("percentile", DEFAULT_PERCENTILE),
+            min_samples=config.get("minSamples", DEFAULT_MIN_SAMPLES),
+            default_delay=config.get("defaultDelay", DEFAULT_DELAY),
+            min_delay=config.get("minDelay", DEFAULT_MIN_DELAY),
+            budget=config.get("budget", DEFAULT_BUDGET),
+            window=config.get("window", DEFAULT_WINDOW),
+        )
+
+    def record_ttft(self, seconds: float):
+        self._samples.append(seconds)
+
+    def get_delay(self) -> float:
+        """当前的对冲延迟（秒）"""
+        if len(self._samples) < self.min_samples:
+            return self.default_delay
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, math.ceil(self.percentile / 100 * len(ordered)) - 1)
+        return max(self.min_delay, ordered[index])
+
+    def try_acquire(self) -> bool:
+        """预算允许时占用一次对冲"""
+        if self.stats.hedged + 1 > self.budget * self.stats.requests:
+            self.stats.budget_exhausted += 1
+            return False
+        self.stats.hedged += 1
+        return True
+
+
+class HedgedChatModel(BaseChatModel):
+    """对首个 token 进行对冲的聊天模型包装"""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    primary: BaseChatModel
+    hedge: Optional[BaseChatModel] = None
+    policy: HedgingPolicy
+
+    @property
+    def _llm_type(self) -> str:
+        return f"hedged-{self.primary._llm_type}"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        params = {
+            **self.primary._identifying_params,
+            "base_url": getattr(self.primary, "openai_api_base", None),
+        }
+        if self.hedge is not None:
+            params["hedge_model"] = getattr(self.hedge, "model_name", None)
+        return params
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        """
+        由主模型的 bind_tools 生成请求参数（工具格式、strict、parallel_tool_calls、
+        字典形式的 tool_choice 等与主模型一致），再绑定到对冲包装上
+        """
+        bound = self.primary.bind_tools(tools, **kwargs)
+        return self.bind(**bound.kwargs)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        # 同步调用不做对冲
+        return self.primary._generate(messages, stop=stop, **kwargs)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop=stop, **kwargs))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        self.policy.stats.requests += 1
+        start = time.monotonic()
+
+        primary = self.primary._astream(messages, stop=stop, **kwargs)
+        primary_first = asyncio.ensure_future(primary.__anext__())
+        # 所有已打开的响应流及其首个 chunk 的任务；无论正常结束、出错还是被取消（Ctrl+C），
+        # 都在 finally 中取消并关闭，不留下未完成的任务和 HTTP 连接
+        streams = [(primary, primary_first)]
+        try:
+            done, _ = await asyncio.wait({primary_first}, timeout=self.policy.get_delay())
+
+            if done or not self.policy.try_acquire():
+                winner, first = primary, primary_first
+            else:
+                hedge_model = self.hedge or self.primary
+                hedge = hedge_model._astream(messages, stop=stop, **kwargs)
+                hedge_first = asyncio.ensure_future(hedge.__anext__())
+                streams.append((hedge, hedge_first))
+                logger.debug(f"首个 token 超过 {self.policy.get_delay():.2f}s 未到达，发出对冲请求")
+
+                first = await _first_successful(primary_first, hedge_first)
+                if first is hedge_first:
+                    self.policy.stats.hedge_wins += 1
+                    winner, loser, loser_first = hedge, primary, primary_first
+                    # 主请求被取消，它的 TTFT 至少是当前耗时：作为删失的下界记录，
+                    # 否则样本只包含快的请求，分位数会越来越低，对冲越发越早
+                    primary_failed = primary_first.done() and (
+                        primary_first.cancelled() or primary_first.exception() is not None)
+                    if not primary_failed:
+                        self.policy.record_ttft(time.monotonic() - start)
+                else:
+                    winner, loser, loser_first = primary, hedge, hedge_first
+                streams.remove((loser, loser_first))
+                await _cancel_stream(loser, loser_first)
+
+            try:
+                chunk = await first
+            except StopAsyncIteration:
+                return
+            if winner is primary:
+                self.policy.record_ttft(time.monotonic() - start)
+
+            yield chunk
+            async for chunk in winner:
+                yield chunk
+        finally:
+            await _close_streams(streams)
+
+
+async def _first_successful(*tasks: asyncio.Future) -> asyncio.Future:
+    """返回最先成功完成的任务；全部失败时返回最后一个失败的任务"""
+    pending = set(tasks)
+    while True:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            failed = task.cancelled() or task.exception() is not None
+            if not failed or not pending:
+                return task
+
+
+async def _cancel_stream(stream, first_task: asyncio.Future):
+    """
+    取消请求并关闭其响应流
+
+    等待 first_task 结束时只忽略它自身的结果和异常；如果是外层任务被取消（Ctrl+C），
+    关闭响应流后重新抛出 CancelledError。
+    """
+    cancelled = False
+    if first_task.done():
+        if not first_task.cancelled():
+            first_task.exception()  # 取出异常，避免 "Task exception was never retrieved"
+    else:
+        first_task.cancel()
+        try:
+            await first_task
+        except asyncio.CancelledError:
+            cancelled = asyncio.current_task().cancelling() > 0
+        except Exception:
+            pass
+    with contextlib.suppress(Exception):
+        await stream.aclose()
+    if cancelled:
+        raise asyncio.CancelledError()
+
+
+async def _close_streams(streams: List[tuple]):
+    """依次取消并关闭所有响应流，全部关闭后再抛出期间收到的取消"""
+    cancelled = None
+    for stream, first_task in streams:
+        try:
+            await _cancel_stream(stream, first_task)
+        except asyncio.CancelledError as e:
+            cancelled = e
+    if cancelled is not None:
+        raise cancelled
+
+
+def get_policy_stats(policies: Sequence[HedgingPolicy]) -> Dict[str, Any]:
+    """汇总多个对冲策略的统计"""
+    totals = HedgingStats()
+    for policy in policies:
+        for key, value in asdict(policy.stats).items():
+            setattr(totals, key, getattr(totals, key) + value)
+    return asdict(totals)
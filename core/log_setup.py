@@ -0,0 +1,123 @@
+"""日志配置
+
+所有日志记录经 QueueHandler 放入内存队列，由 QueueListener 的后台线程写入状态目录下
+按大小轮转的 JSON lines 文件（logs/su-cli.jsonl）。记录日志的代码只做一次入队，
+磁盘 I/O 不会发生在事件循环中；日志也不输出到控制台，不会打乱 Rich 的渲染和输入框。
+解释器正常退出时（包括没有经过优雅退出的路径）通过 atexit 写出队列中剩余的日志。
+"""
+
+import atexit
+import copy
+import json
+import logging
+import queue
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Optional, Union
+
+from paths import get_state_dir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEVEL = "INFO"
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """每条日志格式化为一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _QueueHandler(QueueHandler):
+    """在调用线程中完成消息格式化，异常栈单独保存，交给后台线程按 JSON 写出"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(level: Union[str, int] = DEFAULT_LEVEL, path: Optional[Path] = None,
+                      max_bytes: int = DEFAULT_MAX_BYTES, backup_count: int = DEFAULT_BACKUP_COUNT) -> Path:
+    """
+    把根 logger 的输出改为经队列异步写入轮转的 JSONL 文件
+
+    会移除根 logger 上已有的 handler（包括控制台输出），重复调用时先停止之前的后台线程。
+
+    Args:
+        level: 日志级别（名称或数值）
+        path: 日志文件路径，默认为状态目录下的 logs/su-cli.jsonl
+        max_bytes: 单个日志文件的大小上限，超过后轮转
+        backup_count: 保留的历史日志文件数
+
+    Returns:
+        Path: 日志文件路径
+    """
+    global _listener
+    stop_logging()
+
+    path = Path(path) if path else get_state_dir("logs") / "su-cli.jsonl"
+    file_handler = RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+    )
+    file_handler.setFormatter(JsonLinesFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(_QueueHandler(log_queue))
+    set_log_level(level)
+
+    _listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    return path
+
+
+def set_log_level(level: Union[str, int]):
+    """设置根 logger 的级别；无法识别的级别名（例如拼错的 SU_CLI_LOG_LEVEL）回退到 INFO 并记录警告"""
+    if isinstance(level, str):
+        name = level.strip().upper()
+        levels = logging.getLevelNamesMapping()
+        if name not in levels:
+            logging.getLogger().setLevel(DEFAULT_LEVEL)
+            logger.warning(f"未知的日志级别 {level!r}，使用 {DEFAULT_LEVEL}（可选: {', '.join(levels)}）")
+            return
+        level = levels[name]
+    logging.getLogger().setLevel(level)
+
+
+def stop_logging():
+    """写出队列中剩余的日志并停止后台线程（退出前调用）"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+# 先于 logging 自身的 atexit 钩子执行（atexit 按注册的相反顺序调用）
+atexit.register(stop_logging)
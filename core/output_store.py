@@ -0,0 +1,55 @@
+"""工具输出的磁盘存储
+
+CLI 只在内存中保留工具输出的开头部分，完整内容按 sha256 寻址写入
+状态目录下的 tool_outputs（与 agent 侧的转存目录布局一致），需要时再读回。
+"""
+
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import Optional, Tuple
+
+from paths import get_state_dir
+
+_HANDLE_RE = re.compile(r"^sha256:([0-9a-f]{64})$")
+
+
+def _path_for(digest: str) -> Path:
+    return get_state_dir("tool_outputs", digest[:2]) / f"{digest}.txt"
+
+
+def spill_text(content: str, max_chars: int, head_chars: int) -> Tuple[str, Optional[str]]:
+    """
+    内容超过 max_chars 时写入磁盘
+    
+    Args:
+        content: 完整内容
+        max_chars: 允许保留在内存中的最大字符数
+        head_chars: 转存后保留的开头字符数
+        
+    Returns:
+        Tuple[str, Optional[str]]: (保留在内存中的内容, handle)，未转存时 handle 为 None
+    """
+    if len(content) <= max_chars:
+        return content, None
+    
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    path = _path_for(digest)
+    if not path.exists():
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(content, encoding="utf-8")
+        os.replace(tmp_path, path)
+    return content[:head_chars], f"sha256:{digest}"
+
+
+def load_text(handle: str) -> Optional[str]:
+    """根据 handle 读取完整内容，找不到时返回 None"""
+    match = _HANDLE_RE.match(handle)
+    if not match:
+        return None
+    path = _path_for(match.group(1))
+    try:
+        return path.read_text(encoding="utf-8")
+    except OSError:
+        return None
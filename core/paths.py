@@ -0,0 +1,22 @@
+"""Su-Cli 状态目录"""
+
+import os
+from pathlib import Path
+
+
+def get_state_dir(*parts: str) -> Path:
+    """
+    获取（并创建）Su-Cli 状态目录下的子目录
+    
+    状态目录默认为 ~/.su-cli，可通过 SU_CLI_STATE_DIR 环境变量修改
+    
+    Args:
+        *parts: 子目录路径
+        
+    Returns:
+        Path: 目录路径
+    """
+    base = Path(os.getenv("SU_CLI_STATE_DIR") or Path.home() / ".su-cli")
+    path = base.joinpath(*parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
@@ -0,0 +1,61 @@
+"""模型服务前缀缓存的命中统计
+
+DeepSeek 等 OpenAI 兼容服务会对与近期请求前缀相同的部分计为缓存命中，
+价格更低、速度更快。CLI 保证请求前缀字节稳定（固定的系统提示、按名称排序的工具、
+只追加的历史），这里从每条 AI 消息的用量字段中读取缓存命中的 token 数，
+统计本次会话的前缀缓存命中率。
+"""
+
+from typing import Any, Dict, Optional, Tuple
+
+
+def extract_prompt_usage(message: Any) -> Optional[Tuple[int, int]]:
+    """
+    从 AI 消息中读取 (输入 token 数, 缓存命中的输入 token 数)
+
+    依次尝试 langchain 的 usage_metadata（cache_read）、DeepSeek 的
+    prompt_cache_hit_tokens 和 OpenAI 的 prompt_tokens_details.cached_tokens。
+
+    Returns:
+        Optional[Tuple[int, int]]: 没有用量信息时返回 None
+    """
+    usage = getattr(message, "usage_metadata", None) or {}
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+
+    prompt_tokens = usage.get("input_tokens") or token_usage.get("prompt_tokens")
+    if not prompt_tokens:
+        return None
+
+    cached_tokens = (usage.get("input_token_details") or {}).get("cache_read")
+    if not cached_tokens:
+        cached_tokens = token_usage.get("prompt_cache_hit_tokens")
+    if not cached_tokens:
+        cached_tokens = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    return prompt_tokens, cached_tokens or 0
+
+
+class PromptCacheStats:
+    """会话级的前缀缓存命中统计"""
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def record(self, message: Any) -> bool:
+        """记录一条 AI 消息的用量，没有用量信息时返回 False"""
+        usage = extract_prompt_usage(message)
+        if usage is None:
+            return False
+        self.requests += 1
+        self.prompt_tokens += usage[0]
+        self.cached_tokens += usage[1]
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "hit_ratio": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+        }
@@ -0,0 +1,475 @@
+"""近似（语义）响应缓存
+
+很多问题只是换了一种说法（"桌面上有哪些文件" / "列出桌面文件"）。语义缓存去掉问题中
+"有哪些"、"列出"这类提问用语后，把问题向量化为哈希字符 n-gram 的词频向量（L2 归一化），
+新问题与已缓存问题的余弦相似度超过阈值时直接返回之前的回答。
+
+字面相似不代表意思相同（"删除桌面上所有文件"、"德国的首都" 和 "法国的首都"），所以命中还要求
+签名相同：查询意图、是否否定以及实词集合都必须一致；删除、移动、写入等有副作用的请求从不
+读写缓存。
+
+- 缓存按 agent 隔离，存放在状态目录下的 semantic_cache/<agent>/entries.jsonl
+- 只缓存没有调用工具、或只调用了配置中声明为无副作用工具的轮次
+- 向量按列（特征）压缩存储为稀疏矩阵：按特征排序的 (特征, 条目, 权重) 三元组，新条目先
+  放进一个小的增量缓冲区，攒满后再合并。查询只读取查询中较少见特征对应的列，用一次
+  bincount 完成批量点积，再精确计算少量候选，10 万条缓存下的查询在 1 毫秒左右
+"""
+
+import hashlib
+import json
+import logging
+import re
+import time
+import unicodedata
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from paths import get_state_dir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIM = 1 << 20
+DEFAULT_THRESHOLD = 0.85
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_ENTRIES = 100000
+NGRAM_RANGE = (1, 2)
+PENDING_CAPACITY = 8192  # 增量缓冲区的容量（非零特征数），攒满后合并进主索引
+SUFFIX_RATIO = 0.5  # 前缀过滤中后缀范数占阈值的比例，越大读取的列越少、候选越多
+RESCORE_BATCH = 256
+
+# 不影响问题含义的礼貌用语
+FILLER_PHRASES = ("请问", "帮我", "给我", "告诉我", "一下", "please", "tell me", "can you", "could you")
+
+# 查询类意图的不同说法：从文本中去掉，但作为意图记入签名，只有意图相同的问题才能互相命中。
+# 方位词紧跟"有哪些"时一起去掉（"桌面上有哪些文件" -> "桌面文件"）
+READ_INTENTS = {
+    "list": ("[上里中内]?有哪些", "[上里中内]?有什么", "列出", "列举", "显示", "查看", "看看", "哪些",
+             "list", "show", "what are"),
+}
+
+# 有副作用的意图：这类请求每次都要真正执行，从不读写语义缓存
+WRITE_INTENTS = (
+    "删除", "删掉", "清空", "清理", "移动", "移到", "挪到", "重命名", "改名", "创建", "新建", "写入",
+    "修改", "编辑", "复制", "拷贝", "保存", "发送", "安装", "卸载", "运行", "执行", "下载", "上传",
+    "替换", "覆盖", "停止", "启动", "关闭", "打开",
+    "delete", "remove", "erase", "clear", "move", "rename", "create", "make", "write", "edit", "modify",
+    "copy", "save", "send", "install", "uninstall", "run", "execute", "download", "upload", "replace",
+    "kill", "stop", "start", "open", "close", "rm", "mv", "cp", "mkdir",
+)
+
+NEGATIONS = ("没", "不", "未", "别", "非", "无", "not", "no", "never")
+
+# 签名中忽略的虚词
+PARTICLES = frozenset("的地得了吗呢吧啊呀么")
+STOPWORDS = frozenset((
+    "a", "an", "the", "is", "are", "was", "be", "of", "in", "on", "at", "to", "for", "from", "with",
+    "my", "me", "i", "you", "your", "what", "which", "how", "do", "does", "there", "all", "and", "s",
+))
+
+
+def _phrase_pattern(phrases: Iterable[str]) -> str:
+    """英文短语按整词匹配（避免误删单词的一部分），中文短语可以是正则片段"""
+    return "|".join(rf"\b{re.escape(phrase)}\b" if phrase.isascii() else phrase for phrase in phrases)
+
+
+_FILLER_RE = re.compile(_phrase_pattern(FILLER_PHRASES))
+_INTENT_RES = {intent: re.compile(_phrase_pattern(phrases)) for intent, phrases in READ_INTENTS.items()}
+_WRITE_RE = re.compile(_phrase_pattern(WRITE_INTENTS))
+_NEGATION_RE = re.compile(_phrase_pattern(NEGATIONS))
+_PUNCT_RE = re.compile(r"[\s\W_]+", re.UNICODE)
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[^\W\d_a-z]", re.UNICODE)
+
+
+def has_side_effect_intent(text: str) -> bool:
+    """请求是否包含删除、移动、写入等有副作用的意图"""
+    return _WRITE_RE.search(unicodedata.normalize("NFKC", text).lower()) is not None
+
+
+@dataclass
+class SemanticHit:
+    """语义缓存命中结果"""
+    prompt: str
+    answer: str
+    similarity: float
+
+
+class HashedNgramVectorizer:
+    """哈希字符 n-gram 词频向量化"""
+
+    def __init__(self, dim: int = DEFAULT_DIM, ngram_range: Tuple[int, int] = NGRAM_RANGE):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    @staticmethod
+    def analyze(text: str) -> Tuple[str, int]:
+        """
+        规范化文本并计算签名
+
+        统一全角半角和大小写，去掉礼貌用语和查询类意图的说法。签名由意图、是否否定以及
+        实词集合（中文字符、英文单词和数字，去掉虚词）决定：只有签名相同的问题才能互相命中，
+        "德国的首都" 不会命中 "法国的首都"，"没有" 不会命中 "有"。
+
+        Returns:
+            (用于提取 n-gram 的文本, 64 位签名)
+        """
+        text = unicodedata.normalize("NFKC", text).lower().replace("n't", " not")
+        text = _FILLER_RE.sub(" ", text)
+        negated = _NEGATION_RE.search(text) is not None
+        intents = []
+        for intent, pattern in _INTENT_RES.items():
+            text, count = pattern.subn(" ", text)
+            if count:
+                intents.append(intent)
+
+        terms = sorted({token for token in _TOKEN_RE.findall(text)
+                        if token not in PARTICLES and token not in STOPWORDS})
+        key = "\x1f".join([",".join(intents), str(negated), *terms]).encode("utf-8")
+        signature = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little", signed=True)
+        return _PUNCT_RE.sub("", text), signature
+
+    @classmethod
+    def normalize(cls, text: str) -> str:
+        """统一全角半角和大小写，去掉礼貌用语、查询类意图的说法、标点和空白"""
+        return cls.analyze(text)[0]
+
+    def features(self, text: str) -> Counter:
+        """提取规范化文本中哈希后的 n-gram 特征及其词频"""
+        counts: Counter = Counter()
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            for i in range(len(text) - n + 1):
+                # crc32 在不同进程间稳定，内置 hash() 会随机化
+                counts[zlib.crc32(text[i:i + n].encode("utf-8")) % self.dim] += 1
+        return counts
+
+    def transform(self, text: str) -> Tuple[np.ndarray, np.ndarray, int]:
+        """把文本转换为 L2 归一化的稀疏词频向量
+
+        Returns:
+            (按升序排列的特征下标, 权重, 签名)，特征为空时两个数组都为空
+        """
+        normalized, signature = self.analyze(text)
+        features = self.features(normalized)
+        if not features:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), signature
+
+        indices = np.fromiter(features.keys(), dtype=np.int64, count=len(features))
+        weights = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+        weights /= np.linalg.norm(weights)
+        order = np.argsort(indices)
+        return indices[order], weights[order], signature
+
+
+class SemanticCache:
+    """单个 agent 的语义缓存"""
+
+    def __init__(self, path: Path, threshold: float = DEFAULT_THRESHOLD, ttl: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, dim: int = DEFAULT_DIM):
+        """
+        Args:
+            path: 缓存条目文件（JSONL）
+            threshold: 命中所需的最小余弦相似度
+            ttl: 条目有效期（秒）
+            max_entries: 最大条目数，超出时丢弃最旧的条目
+            dim: 特征哈希空间的大小
+        """
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.vectorizer = HashedNgramVectorizer(dim)
+        self.hits = 0
+        self.misses = 0
+
+        self._prompts: List[str] = []
+        self._answers: List[str] = []
+        self._created_at = np.zeros(0, dtype=np.float64)
+        # 问题的签名（查询意图、否定和内容词），只有签名相同的条目才能命中
+        self._signatures = np.zeros(0, dtype=np.int64)
+        self._size = 0
+        # 条目用递增的序号标识，第一个未丢弃条目的序号为 _base，序号 - _base 即列表中的位置
+        self._base = 0
+        # 主索引（按列压缩的稀疏矩阵）：按特征排序的 (特征, 条目序号, 权重)
+        self._features = np.empty(0, dtype=np.int64)
+        self._entries = np.empty(0, dtype=np.int64)
+        self._weights = np.empty(0, dtype=np.float32)
+        # 增量缓冲区：尚未合并进主索引的新条目
+        self._pending_features = np.empty(PENDING_CAPACITY, dtype=np.int64)
+        self._pending_entries = np.empty(PENDING_CAPACITY, dtype=np.int64)
+        self._pending_weights = np.empty(PENDING_CAPACITY, dtype=np.float32)
+        self._pending = 0
+        self._load()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _load(self):
+        """从磁盘读取条目并重建索引"""
+        if not self.path.exists():
+            return
+        entries = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+
+        cutoff = time.time() - self.ttl
+        entries = [e for e in entries if e.get("created_at", 0) >= cutoff][-self.max_entries:]
+        # 旧版本可能缓存过有副作用的问题，加载时一并清理
+        entries = [e for e in entries if not has_side_effect_intent(e["prompt"])]
+        vectors = []
+        for entry in entries:
+            indices, weights, signature = self.vectorizer.transform(entry["prompt"])
+            self._append_entry(entry["prompt"], entry["answer"], entry["created_at"], signature)
+            vectors.append((indices, weights))
+        if vectors:
+            counts = [indices.size for indices, _ in vectors]
+            features = np.concatenate([indices for indices, _ in vectors])
+            order = np.argsort(features, kind="stable")
+            self._features = features[order]
+            self._entries = np.repeat(np.arange(self._size, dtype=np.int64), counts)[order]
+            self._weights = np.concatenate([weights for _, weights in vectors])[order]
+
+        # 过期或超出上限的条目在下次写入前从文件中清理掉
+        self._rewrite()
+        logger.debug(f"已加载语义缓存: {self.path} ({self._size} 条)")
+
+    def _rewrite(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for prompt, answer, created_at in zip(self._prompts, self._answers, self._created_at):
+                f.write(json.dumps({"prompt": prompt, "answer": answer, "created_at": float(created_at)},
+                                   ensure_ascii=False) + "\n")
+        tmp_path.replace(self.path)
+
+    def _append_entry(self, prompt: str, answer: str, created_at: float, signature: int) -> int:
+        """追加条目（不更新索引），返回条目序号"""
+        capacity = self._created_at.shape[0]
+        if self._size + 1 > capacity:
+            created_at_array = np.zeros(max(capacity * 2, 64), dtype=np.float64)
+            created_at_array[:self._size] = self._created_at[:self._size]
+            self._created_at = created_at_array
+            signatures = np.zeros(max(capacity * 2, 64), dtype=np.int64)
+            signatures[:self._size] = self._signatures[:self._size]
+            self._signatures = signatures
+        self._created_at[self._size] = created_at
+        self._signatures[self._size] = signature
+        self._prompts.append(prompt)
+        self._answers.append(answer)
+        self._size += 1
+        return self._base + self._size - 1
+
+    def _append(self, prompt: str, answer: str, created_at: float):
+        indices, weights, signature = self.vectorizer.transform(prompt)
+        entry = self._append_entry(prompt, answer, created_at, signature)
+        if self._pending + indices.size > PENDING_CAPACITY:
+            self._merge_pending()
+        if indices.size > PENDING_CAPACITY:
+            # 超长的问题直接合并进主索引
+            self._insert(indices, np.full(indices.size, entry, dtype=np.int64), weights)
+            return
+        end = self._pending + indices.size
+        self._pending_features[self._pending:end] = indices
+        self._pending_entries[self._pending:end] = entry
+        self._pending_weights[self._pending:end] = weights
+        self._pending = end
+
+    def _merge_pending(self):
+        """把增量缓冲区合并进主索引"""
+        self._insert(self._pending_features[:self._pending], self._pending_entries[:self._pending],
+                     self._pending_weights[:self._pending])
+        self._pending = 0
+
+    def _insert(self, features: np.ndarray, entries: np.ndarray, weights: np.ndarray):
+        """把新条目的特征插入主索引，同时清理已丢弃条目的特征；每列内保持按条目序号排序"""
+        live = self._entries >= self._base
+        order = np.argsort(features, kind="stable")
+        positions = np.searchsorted(self._features[live], features[order], side="right")
+        self._features = np.insert(self._features[live], positions, features[order])
+        self._entries = np.insert(self._entries[live], positions, entries[order])
+        self._weights = np.insert(self._weights[live], positions, weights[order])
+
+    def lookup(self, prompt: str) -> Optional[SemanticHit]:
+        """
+        查找与 prompt 最相似的未过期条目
+
+        只考虑签名相同（查询意图、否定和内容词都一致）的条目；有写入、删除、移动等副作用的问题
+        从不命中。相似度不足阈值时返回 None
+        """
+        if self._size == 0 or has_side_effect_intent(prompt):
+            self.misses += 1
+            return None
+
+        indices, weights, signature = self.vectorizer.transform(prompt)
+        if indices.size == 0:
+            self.misses += 1
+            return None
+
+        scores = self._score(indices, weights, signature)
+        if scores:
+            expired = time.time() - self.ttl
+            positions = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))
+            values = np.fromiter(scores.values(), dtype=np.float64, count=len(scores))
+            values[self._created_at[positions] < expired] = -1.0
+            best = int(np.argmax(values))
+            position, similarity = int(positions[best]), float(values[best])
+            if similarity >= self.threshold:
+                self.hits += 1
+                return SemanticHit(self._prompts[position], self._answers[position], similarity)
+
+        self.misses += 1
+        return None
+
+    def _score(self, indices: np.ndarray, weights: np.ndarray, signature: int) -> Dict[int, float]:
+        """
+        计算可能达到阈值的条目与查询向量的余弦相似度
+
+        前缀过滤：把查询特征按所在列的长度从长到短排列，取平方和不超过 (SUFFIX_RATIO·threshold)²
+        的最常见特征为后缀 S。条目向量是单位向量，S 上的点积不超过 ‖q_S‖，所以相似度达到阈值的
+        条目在其余（较少见的）特征上的部分点积至少为 threshold - ‖q_S‖。只读取这些短列得到
+        候选条目，再按上界从高到低分批补上 S 上的点积（列内按条目序号有序，二分查找即可）。
+
+        Returns:
+            Dict[int, float]: 条目位置 -> 相似度，只包含签名为 signature 且可能达到阈值的条目
+        """
+        scores: Dict[int, float] = {}
+        threshold = self.threshold
+        starts = np.searchsorted(self._features, indices, side="left")
+        ends = np.searchsorted(self._features, indices, side="right")
+        common_first = np.argsort(starts - ends, kind="stable")  # 列越长越靠前
+        cumulative = np.cumsum(weights[common_first].astype(np.float64) ** 2)
+        suffix_size = int(np.searchsorted(cumulative, (SUFFIX_RATIO * threshold) ** 2, side="right"))
+        suffix_norm = float(np.sqrt(cumulative[suffix_size - 1])) if suffix_size else 0.0
+        suffix, prefix = common_first[:suffix_size].tolist(), common_first[suffix_size:].tolist()
+
+        entry_parts, weight_parts = [], []
+        for i in prefix:
+            start, end = int(starts[i]), int(ends[i])
+            if start < end:
+                entry_parts.append(self._entries[start:end])
+                weight_parts.append(self._weights[start:end] * weights[i])
+
+        if entry_parts:
+            sequences = np.concatenate(entry_parts)
+            products = np.concatenate(weight_parts)
+            live = sequences >= self._base
+            partial = np.bincount(sequences[live] - self._base, weights=products[live], minlength=self._size)
+            candidates = np.flatnonzero(partial >= threshold - suffix_norm)
+            candidates = candidates[self._signatures[candidates] == signature]
+            candidates = candidates[np.argsort(-partial[candidates], kind="stable")]
+            best = threshold
+            for batch_start in range(0, candidates.size, RESCORE_BATCH):
+                batch = candidates[batch_start:batch_start + RESCORE_BATCH]
+                if partial[batch[0]] + suffix_norm < best:
+                    break
+                similarities = partial[batch]
+                batch_sequences = batch + self._base
+                for i in suffix:
+                    column = self._entries[starts[i]:ends[i]]
+                    found = np.searchsorted(column, batch_sequences)
+                    found[found == column.size] = 0
+                    matched = column[found] == batch_sequences
+                    similarities[matched] += self._weights[starts[i] + found[matched]] * weights[i]
+                scores.update(zip(batch.tolist(), similarities.tolist()))
+                best = max(best, float(similarities.max()))
+
+        # 增量缓冲区中的条目直接精确计算（缓冲区很小）
+        if self._pending:
+            pending_features = self._pending_features[:self._pending]
+            matched = np.isin(pending_features, indices)
+            if matched.any():
+                query_positions = np.searchsorted(indices, pending_features[matched])
+                positions = self._pending_entries[:self._pending][matched] - self._base
+                products = self._pending_weights[:self._pending][matched] * weights[query_positions]
+                live = positions >= 0
+                live[live] = self._signatures[positions[live]] == signature
+                scores.update(zip(*_group_sum(positions[live], products[live])))
+        return scores
+
+    def add(self, prompt: str, answer: str):
+        """记录一轮问答，有副作用的问题不缓存"""
+        if has_side_effect_intent(prompt):
+            return
+        created_at = time.time()
+        self._append(prompt, answer, created_at)
+
+        if self._size > self.max_entries:
+            self._drop_oldest(self._size - self.max_entries)
+            self._rewrite()
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"prompt": prompt, "answer": answer, "created_at": created_at},
+                               ensure_ascii=False) + "\n")
+
+    def _drop_oldest(self, count: int):
+        # 只前移 _base，被丢弃条目的特征在下次合并时清理，查询时忽略
+        self._base += count
+        self._size -= count
+        self._created_at[:self._size] = self._created_at[count:self._size + count]
+        self._signatures[:self._size] = self._signatures[count:self._size + count]
+        del self._prompts[:count]
+        del self._answers[:count]
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": self._size,
+        }
+
+
+def _group_sum(keys: np.ndarray, values: np.ndarray) -> Tuple[List[int], List[float]]:
+    """按 key 对 values 求和"""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    sums = np.bincount(inverse, weights=values, minlength=unique.size)
+    return unique.tolist(), sums.tolist()
+
+
+_caches: Dict[str, SemanticCache] = {}
+
+
+def get_semantic_cache(agent_name: str, options: Dict[str, Any]) -> SemanticCache:
+    """
+    获取（必要时加载）指定 agent 的语义缓存
+
+    Args:
+        agent_name: agent 名称
+        options: agent 配置中的 semanticCache，支持 threshold、ttl、maxEntries、dim
+
+    Returns:
+        SemanticCache: 语义缓存
+    """
+    cache = _caches.get(agent_name)
+    if cache is None:
+        cache = SemanticCache(
+            get_state_dir("semantic_cache", agent_name) / "entries.jsonl",
+            ttl=options.get("ttl", DEFAULT_TTL_SECONDS),
+            max_entries=options.get("maxEntries", DEFAULT_MAX_ENTRIES),
+            dim=options.get("dim", DEFAULT_DIM),
+        )
+        _caches[agent_name] = cache
+    cache.threshold = options.get("threshold", DEFAULT_THRESHOLD)
+    return cache
+
+
+def is_cacheable_turn(tool_names: Iterable[Optional[str]], safe_tools: Iterable[str]) -> bool:
+    """只有没有调用工具、或调用的工具都没有副作用的轮次可以缓存"""
+    safe = set(safe_tools)
+    return all(name in safe for name in tool_names)
+
+
+def get_semantic_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """获取所有已加载 agent 的语义缓存统计"""
+    return {agent_name: cache.get_stats() for agent_name, cache in _caches.items()}
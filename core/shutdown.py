@@ -0,0 +1,166 @@
+"""退出协调器
+
+需要在退出时释放的资源（MCP 会话、HTTP 连接池等）在这里注册。退出时所有
+资源在一个硬性时限内并行关闭，超时未完成的直接放弃，最后强制结束仍然存活的子进程
+（例如 stdio MCP 服务器的 node 进程），不会留下孤儿进程，也不会让用户等待。
+"""
+
+import asyncio
+import inspect
+import logging
+import os
+import signal
+import subprocess
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEADLINE = 0.3
+
+_resources: List[Tuple[str, Callable[[], Any]]] = []
+_shutdown_done = False
+
+
+def register(name: str, callback: Callable[[], Any]):
+    """
+    注册退出时需要释放的资源
+
+    Args:
+        name: 资源名称（用于日志）
+        callback: 无参数的关闭函数，可以是同步函数，也可以返回 awaitable
+    """
+    _resources.append((name, callback))
+
+
+def shutdown(deadline: float = DEFAULT_DEADLINE) -> bool:
+    """
+    在没有运行中事件循环的地方（例如启动失败后）同步执行 shutdown_async()
+
+    已经在事件循环中时请 await shutdown_async()；重复调用时直接返回。
+
+    Args:
+        deadline: 关闭资源的时限（秒）
+
+    Returns:
+        bool: 所有资源是否都在时限内关闭
+    """
+    return asyncio.run(shutdown_async(deadline))
+
+
+async def shutdown_async(deadline: float = DEFAULT_DEADLINE) -> bool:
+    """
+    在时限内并行关闭所有已注册的资源，然后强制结束残留的子进程
+
+    关闭操作作为运行中事件循环上的一个任务执行，超过时限后取消；无论是否超时，
+    最后都会结束残留的子进程。重复调用时直接返回。
+
+    Args:
+        deadline: 关闭资源的时限（秒）
+
+    Returns:
+        bool: 所有资源是否都在时限内关闭
+    """
+    global _shutdown_done
+    if _shutdown_done:
+        return True
+    _shutdown_done = True
+
+    try:
+        completed = await asyncio.wait_for(_close_all(), deadline)
+    except asyncio.TimeoutError:
+        logger.debug(f"关闭资源超过 {deadline} 秒，已放弃")
+        completed = False
+    except Exception as e:
+        logger.debug(f"关闭资源时发生错误: {e}")
+        completed = False
+
+    killed = kill_child_processes()
+    if killed:
+        logger.debug(f"强制结束了 {len(killed)} 个子进程: {killed}")
+    return completed
+
+
+async def _close_all() -> bool:
+    tasks: Dict[asyncio.Future, str] = {}
+    for name, callback in _resources:
+        try:
+            result = callback()
+        except Exception as e:
+            logger.debug(f"关闭 {name} 失败: {e}")
+            continue
+        if inspect.isawaitable(result):
+            tasks[asyncio.ensure_future(result)] = name
+
+    if not tasks:
+        return True
+
+    try:
+        await asyncio.wait(tasks)
+    finally:
+        # 超时被取消时，仍在进行的关闭操作一并取消
+        for task, name in tasks.items():
+            if not task.done():
+                task.cancel()
+                logger.debug(f"关闭 {name} 超时，已放弃")
+    ok = True
+    for task, name in tasks.items():
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"关闭 {name} 失败: {task.exception()}")
+            ok = False
+    return ok
+
+
+def kill_child_processes(sig: int = getattr(signal, "SIGKILL", signal.SIGTERM)) -> List[int]:
+    """
+    向当前进程的所有后代进程发送信号
+
+    Returns:
+        List[int]: 收到信号的进程 ID
+    """
+    killed = []
+    # 先一次性收集全部后代再发送信号：子进程退出后孙进程会被重新挂到 init 下，按 ppid 就找不到了
+    for pid in _descendant_pids(os.getpid()):
+        try:
+            os.kill(pid, sig)
+            killed.append(pid)
+        except (ProcessLookupError, PermissionError):
+            pass
+    return killed
+
+
+def _descendant_pids(root: int) -> List[int]:
+    """按层级顺序返回 root 的后代进程（Linux 读取 /proc，其他系统使用 pgrep）"""
+    if Path("/proc/self/stat").exists():
+        children: Dict[int, List[int]] = {}
+        for stat_path in Path("/proc").glob("[0-9]*/stat"):
+            try:
+                stat = stat_path.read_text()
+            except OSError:
+                continue
+            # comm 字段可能包含空格，从最后一个右括号之后开始解析
+            fields = stat[stat.rfind(")") + 2:].split()
+            children.setdefault(int(fields[1]), []).append(int(stat_path.parent.name))
+    elif os.name == "posix":
+        children = None
+    else:
+        return []
+
+    result = []
+    queue = [root]
+    while queue:
+        pid = queue.pop(0)
+        for child in children.get(pid, []) if children is not None else _pgrep_children(pid):
+            result.append(child)
+            queue.append(child)
+    return result
+
+
+def _pgrep_children(pid: int) -> List[int]:
+    try:
+        output = subprocess.run(
+            ["pgrep", "-P", str(pid)], capture_output=True, text=True, timeout=0.1
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return []
+    return [int(line) for line in output.split()]
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+语义缓存测试
+测试换说法的问题能否命中、意思不同的问题不会误命中、索引合并和丢弃旧条目后的结果，
+以及 10 万条缓存下的查询耗时
+"""
+
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 添加 core 模块到路径
+sys.path.insert(0, str(Path(__file__).parent))
+from semantic_cache import SemanticCache
+
+
+def _brute_force(cache: SemanticCache, prompt: str) -> float:
+    """逐条计算签名相同的条目中余弦相似度的最大值"""
+    query_indices, query_weights, query_signature = cache.vectorizer.transform(prompt)
+    best = 0.0
+    for entry_prompt in cache._prompts:
+        indices, weights, signature = cache.vectorizer.transform(entry_prompt)
+        if signature != query_signature:
+            continue
+        _, a, b = np.intersect1d(query_indices, indices, assume_unique=True, return_indices=True)
+        best = max(best, float(np.dot(query_weights[a], weights[b])))
+    return best
+
+
+def test_paraphrase_hits_default_threshold():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SemanticCache(Path(tmp) / "entries.jsonl")
+        cache.add("桌面上有哪些文件", "桌面上有 a.txt 和 b.txt")
+
+        hit = cache.lookup("列出桌面文件")
+        assert hit is not None
+        assert hit.prompt == "桌面上有哪些文件"
+        assert hit.answer == "桌面上有 a.txt 和 b.txt"
+
+        assert cache.lookup("删除桌面文件") is None
+        assert cache.lookup("今天天气怎么样") is None
+
+        # 重新加载后从主索引中命中
+        reloaded = SemanticCache(Path(tmp) / "entries.jsonl")
+        assert reloaded.lookup("列出桌面文件") is not None
+
+
+def test_different_meaning_misses():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SemanticCache(Path(tmp) / "entries.jsonl")
+        cache.add("桌面上有哪些文件", "桌面上有 a.txt 和 b.txt")
+        cache.add("what is the capital of France", "Paris")
+
+        # 有副作用的请求从不命中
+        for prompt in ("删除桌面上所有文件", "清空桌面上文件", "移动桌面上所有文件", "delete all files on my desktop"):
+            assert cache.lookup(prompt) is None, prompt
+        # 否定和实体不同
+        assert cache.lookup("桌面上没有哪些文件") is None
+        assert cache.lookup("what is the capital of Germany") is None
+        assert cache.lookup("what isn't the capital of France") is None
+        # 礼貌用语不影响命中
+        hit = cache.lookup("please tell me the capital of France")
+        assert hit is not None and hit.answer == "Paris"
+
+
+def test_side_effect_prompts_are_not_cached():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SemanticCache(Path(tmp) / "entries.jsonl")
+        cache.add("删除桌面上所有文件", "已删除 2 个文件")
+        assert len(cache) == 0
+        assert cache.lookup("删除桌面上所有文件") is None
+
+
+def test_lookup_matches_brute_force():
+    rng = np.random.default_rng(0)
+    chars = [chr(0x4E00 + i) for i in range(300)]
+    probabilities = 1 / np.arange(1, len(chars) + 1)
+    probabilities /= probabilities.sum()
+
+    def random_prompt(length: int) -> str:
+        return "".join(rng.choice(chars, size=length, p=probabilities))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SemanticCache(Path(tmp) / "entries.jsonl", threshold=0.5, max_entries=1500)
+        prompts = [random_prompt(int(rng.integers(4, 16))) for _ in range(2000)]
+        for prompt in prompts:
+            cache.add(prompt, prompt)
+        # 超出上限时丢弃了最旧的条目，增量缓冲区也多次合并过
+        assert len(cache) == 1500
+
+        queries = [random_prompt(8) for _ in range(100)]
+        # 实词集合不变（虚词、重排）的问题签名相同，相似度随字序变化
+        queries += [prompt + "的" for prompt in prompts[-200::10]]
+        queries += ["".join(rng.permutation(list(prompt))) for prompt in prompts[-400::10]]
+        queries += [prompt[:-1] for prompt in prompts[:20]]
+        hits = 0
+        for query in queries:
+            expected = _brute_force(cache, query)
+            hit = cache.lookup(query)
+            if expected < cache.threshold:
+                assert hit is None, query
+            else:
+                assert hit is not None, query
+                assert abs(hit.similarity - expected) < 1e-5, query
+                hits += 1
+        assert hits >= 20
+
+
+def benchmark_lookup(entries: int = 100000, queries: int = 200):
+    """10 万条缓存下的平均查询耗时"""
+    rng = np.random.default_rng(1)
+    chars = [chr(0x4E00 + i) for i in range(3500)]
+    probabilities = 1 / np.arange(1, len(chars) + 1)
+    probabilities /= probabilities.sum()
+    codes = rng.choice(len(chars), size=(entries + queries, 24), p=probabilities)
+    lengths = rng.integers(6, 25, size=entries)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "entries.jsonl"
+        now = time.time()
+        with open(path, "w", encoding="utf-8") as f:
+            for row, length in zip(codes[:entries], lengths):
+                prompt = "".join(chars[code] for code in row[:length])
+                f.write(json.dumps({"prompt": prompt, "answer": "", "created_at": now}, ensure_ascii=False) + "\n")
+        cache = SemanticCache(path)
+
+        prompts = ["".join(chars[code] for code in row[:15]) for row in codes[entries:]]
+        start = time.perf_counter()
+        for prompt in prompts:
+            cache.lookup(prompt)
+        elapsed = (time.perf_counter() - start) / len(prompts)
+        print(f"{entries} 条缓存，15 字查询平均耗时 {elapsed * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    test_paraphrase_hits_default_threshold()
+    test_different_meaning_misses()
+    test_side_effect_prompts_are_not_cached()
+    test_lookup_matches_brute_force()
+    print("✅ 语义缓存测试通过")
+    benchmark_lookup()
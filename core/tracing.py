@@ -0,0 +1,343 @@
+"""每轮对话的耗时追踪
+
+一轮对话记录为一组嵌套的 span：agent 扫描、graph 加载和编译、输入状态构造、LangGraph 的
+每个节点、每次 LLM 调用（包括首个 token 的延迟 TTFT）、每次工具调用和结果渲染。
+CLI 自己的步骤用 Tracer.span() 包裹；节点、LLM 和工具的 span 由 TracingCallbackHandler
+从 LangChain 回调中生成，通过运行配置的 callbacks 传给 graph。
+
+每轮结束后 span 以 JSON lines 追加到状态目录下的 traces/trace.jsonl（在后台线程中写入），
+也可以导出为 Chrome trace-event 格式，在 chrome://tracing 或 Perfetto 中查看。
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from paths import get_state_dir
+
+try:
+    from langchain_core.callbacks import BaseCallbackHandler
+except ImportError:
+    BaseCallbackHandler = object
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_TURNS = 50
+MAX_TRACE_FILE_BYTES = 20 * 1024 * 1024
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("su_cli_current_span", default=None)
+
+
+def _now_us() -> int:
+    return time.perf_counter_ns() // 1000
+
+
+class Span:
+    """一段计时区间"""
+
+    __slots__ = ("span_id", "parent_id", "name", "category", "start_us", "end_us", "attrs")
+
+    def __init__(self, span_id: int, parent_id: Optional[int], name: str, category: str,
+                 attrs: Optional[Dict[str, Any]] = None):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.category = category
+        self.start_us = _now_us()
+        self.end_us: Optional[int] = None
+        self.attrs = attrs or {}
+
+    @property
+    def duration_ms(self) -> float:
+        end_us = self.end_us if self.end_us is not None else _now_us()
+        return (end_us - self.start_us) / 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.span_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "cat": self.category,
+            "start_us": self.start_us,
+            "dur_us": (self.end_us or self.start_us) - self.start_us,
+            "attrs": self.attrs,
+        }
+
+
+class Turn:
+    """一轮对话（或启动过程）的全部 span，第一个 span 是覆盖整轮的根 span"""
+
+    def __init__(self, label: str):
+        self.turn_id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.wall_time = time.time()
+        self.spans: List[Span] = []
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+
+class Tracer:
+    """记录每轮对话的 span，保留最近的若干轮，并写入 JSONL 追踪文件"""
+
+    def __init__(self, path: Optional[Path] = None, max_turns: int = DEFAULT_MAX_TURNS):
+        self.path = Path(path) if path else get_state_dir("traces") / "trace.jsonl"
+        self.turns: Deque[Turn] = deque(maxlen=max_turns)
+        self._turn: Optional[Turn] = None
+        self._turn_token = None
+        self._ids = itertools.count(1)
+
+    def start_turn(self, label: str):
+        """开始记录新的一轮，之前未结束的一轮会先结束"""
+        if self._turn is not None:
+            self.end_turn()
+        self._turn = Turn(label)
+        root = self._new_span(label, "turn", None, {})
+        self._turn_token = _current_span.set(root)
+
+    def end_turn(self) -> Optional[Turn]:
+        """结束当前这一轮：关闭未结束的 span 并写入追踪文件"""
+        turn = self._turn
+        if turn is None:
+            return None
+        self._turn = None
+        try:
+            _current_span.reset(self._turn_token)
+        except ValueError:
+            # 在另一个上下文中结束（例如取消后的清理），当前上下文中没有需要恢复的值
+            pass
+        self._turn_token = None
+
+        end_us = _now_us()
+        for span in turn.spans:
+            if span.end_us is None:
+                span.end_us = end_us
+                if span is not turn.root:
+                    span.attrs["unfinished"] = True
+        self.turns.append(turn)
+        self._persist(turn)
+        return turn
+
+    @property
+    def last_turn(self) -> Optional[Turn]:
+        return self.turns[-1] if self.turns else None
+
+    @contextmanager
+    def span(self, name: str, category: str = "cli", **attrs):
+        """
+        记录一段代码的耗时，嵌套的 span 自动成为子 span
+
+        不在任何一轮中时不记录，直接执行。
+        """
+        span = self.begin(name, category, **attrs)
+        if span is None:
+            yield None
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            self.finish(span)
+
+    def begin(self, name: str, category: str, parent: Optional[Span] = None, **attrs) -> Optional[Span]:
+        """开始一个 span（用于开始和结束不在同一段代码中的情况），未指定 parent 时挂在当前 span 下"""
+        if self._turn is None:
+            return None
+        parent = parent or _current_span.get()
+        return self._new_span(name, category, parent.span_id if parent else None, attrs)
+
+    def finish(self, span: Optional[Span], **attrs):
+        if span is None or span.end_us is not None:
+            return
+        span.end_us = _now_us()
+        span.attrs.update(attrs)
+
+    def _new_span(self, name: str, category: str, parent_id: Optional[int], attrs: Dict[str, Any]) -> Span:
+        span = Span(next(self._ids), parent_id, name, category, attrs)
+        self._turn.spans.append(span)
+        return span
+
+    def _persist(self, turn: Turn):
+        lines = [
+            json.dumps({"turn": turn.turn_id, "label": turn.label, "wall_time": turn.wall_time, **span.to_dict()},
+                       ensure_ascii=False, default=str)
+            for span in turn.spans
+        ]
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            loop.run_in_executor(None, self._append, lines)
+        else:
+            self._append(lines)
+
+    def _append(self, lines: List[str]):
+        try:
+            if self.path.exists() and self.path.stat().st_size > MAX_TRACE_FILE_BYTES:
+                os.replace(self.path, self.path.with_suffix(".jsonl.1"))
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            logger.debug(f"写入追踪文件失败: {e}")
+
+    def export_chrome_trace(self, path: Optional[Path] = None, turns: Optional[Iterable[Turn]] = None) -> Path:
+        """
+        把最近的若干轮导出为 Chrome trace-event 格式的 JSON 文件
+
+        Args:
+            path: 输出文件路径，默认为状态目录下 traces/ 中带时间戳的文件
+            turns: 要导出的轮次，默认为内存中保留的全部轮次
+
+        Returns:
+            Path: 输出文件路径
+        """
+        path = Path(path) if path else self.path.parent / f"chrome-trace-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        events = []
+        for pid, turn in enumerate(turns if turns is not None else self.turns, start=1):
+            events.append({"name": "process_name", "ph": "M", "pid": pid,
+                           "args": {"name": f"{turn.label} ({turn.turn_id})"}})
+            for span, lane in zip(turn.spans, _assign_lanes(turn.spans)):
+                events.append({
+                    "name": span.name,
+                    "cat": span.category,
+                    "ph": "X",
+                    "ts": span.start_us,
+                    "dur": (span.end_us or span.start_us) - span.start_us,
+                    "pid": pid,
+                    "tid": lane,
+                    "args": span.attrs,
+                })
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False, default=str)
+        return path
+
+
+def _assign_lanes(spans: List[Span]) -> List[int]:
+    """
+    为 span 分配 Chrome trace 中的线程（lane）
+
+    同一线程上的 X 事件必须严格嵌套，并行的工具调用等相互重叠但不嵌套的 span 放到新的线程。
+    """
+    lanes: List[List[Span]] = []  # 每个线程上当前打开的 span 栈
+    result: Dict[int, int] = {}
+    for span in sorted(spans, key=lambda s: (s.start_us, -(s.end_us or s.start_us))):
+        end_us = span.end_us or span.start_us
+        for lane_id, stack in enumerate(lanes):
+            while stack and (stack[-1].end_us or stack[-1].start_us) <= span.start_us:
+                stack.pop()
+            if not stack or end_us <= (stack[-1].end_us or stack[-1].start_us):
+                stack.append(span)
+                result[span.span_id] = lane_id + 1
+                break
+        else:
+            lanes.append([span])
+            result[span.span_id] = len(lanes)
+    return [result[span.span_id] for span in spans]
+
+
+def span_depths(spans: List[Span]) -> Dict[int, int]:
+    """计算每个 span 的嵌套深度（根 span 为 0）"""
+    parents = {span.span_id: span.parent_id for span in spans}
+    depths: Dict[int, int] = {}
+    for span in spans:
+        depth, parent = 0, span.parent_id
+        while parent is not None and parent in parents:
+            depth += 1
+            parent = parents[parent]
+        depths[span.span_id] = depth
+    return depths
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    把 LangChain 回调转换为 span：LangGraph 节点、LLM 调用（记录 TTFT）和工具调用
+
+    其他链（prompt、解析器等）不单独记录，它们的子 span 挂到最近的被记录的上级 span 下。
+    """
+
+    # 在事件循环线程中直接调用，保证计时准确且能读取当前的 span 上下文
+    run_inline = True
+
+    def __init__(self, tracer: Tracer):
+        super().__init__()
+        self.tracer = tracer
+        self._spans: Dict[Any, Span] = {}  # 被记录的运行 -> span
+        self._scopes: Dict[Any, Optional[Span]] = {}  # 运行 -> 其子运行挂靠的 span
+
+    def _parent(self, parent_run_id) -> Optional[Span]:
+        if parent_run_id in self._scopes:
+            return self._scopes[parent_run_id]
+        return _current_span.get()
+
+    def _begin(self, run_id, parent_run_id, name: str, category: str, **attrs):
+        span = self.tracer.begin(name, category, parent=self._parent(parent_run_id), **attrs)
+        self._scopes[run_id] = span
+        if span is not None:
+            self._spans[run_id] = span
+
+    def _finish(self, run_id, **attrs):
+        self._scopes.pop(run_id, None)
+        self.tracer.finish(self._spans.pop(run_id, None), **attrs)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            self._begin(run_id, parent_run_id, node, "node")
+        else:
+            # 不单独记录的链：子 span 挂到它的上级 span 下
+            self._scopes[run_id] = self._parent(parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=type(error).__name__)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or (metadata or {}).get("ls_model_name")
+        self._begin(run_id, parent_run_id, "llm", "llm", model=model)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._begin(run_id, parent_run_id, "llm", "llm")
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        span = self._spans.get(run_id)
+        if span is not None and "ttft_ms" not in span.attrs:
+            span.attrs["ttft_ms"] = round(span.duration_ms, 1)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        try:
+            usage = response.generations[0][0].message.usage_metadata or {}
+        except (AttributeError, IndexError):
+            usage = {}
+        attrs = {key: usage[key] for key in ("input_tokens", "output_tokens") if usage.get(key)}
+        self._finish(run_id, **attrs)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=type(error).__name__)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._begin(run_id, parent_run_id, name, "tool")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=type(error).__name__)
@@ -7,7 +7,9 @@ import json
 import importlib
 import re
 import signal
-import time
+import argparse
+from contextlib import contextmanager, nullcontext
+from functools import partial
 from pathlib import Path
 from typing import List, Dict, Optional, Any, Tuple
 
@@ -21,20 +23,39 @@ from rich.live import Live
 from rich.markdown import Markdown
 from rich.layout import Layout
 from rich.box import ROUNDED
+from rich.table import Table
+from rich.console import Group
+from rich.markup import escape
 from rich_gradient import Text as GradientText
 
+# 命令表（与自动补全共用）
+from commands import COMMAND_TABLE
+
 # 导入自动补全模块
 from autocomplete import (
     get_auto_suggest, 
     get_prompt_config,
     update_completer_agents, 
     update_completer_tool_count,
+    update_completer_tools,
+    add_completer_paths,
+    set_completer_history_index,
+    set_paste_handler,
     COMPLETION_STYLES,
     PROMPT_TOOLKIT_AVAILABLE
 )
 
 # 提示工具包将按需导入
 
+# 提示符各部分的样式
+PROMPT_TEXT_STYLES = {
+    'prompt.frame': 'ansibrightcyan',
+    'prompt.brand': 'bold ansiwhite',
+    'prompt.at': '#888888',
+    'prompt.agent': 'ansibrightmagenta',
+    'run-status': '#888888',
+}
+
 # 国际化配置
 I18N = {
     "en": {
@@ -67,6 +88,9 @@ I18N = {
   • [green]/lang[/green] - Show current language settings
   • [green]/set_lang <lang>[/green] - Set language (en/zh)
   • [green]/tool[/green] - Toggle tool call results display
+  • [green]/stats[/green] - Show performance statistics (tool cache hit rates, etc.)
+  • [green]/trace[/green] - Show the timing waterfall of the last turn
+  • [green]/trace export[/green] - Export recent turns in Chrome trace-event format
   • [green]show <n>[/green] - View detailed results of the nth tool call
 
 🔧 [yellow]Tool Results Viewer:[/yellow]
@@ -136,6 +160,7 @@ I18N = {
         # Confirmations
         "confirm_title": "🤔 Need Your Confirmation",
         "confirm_question": "Do you confirm to process this request? (yes/no)",
+        "queued_inputs": "{} queued",
         "confirm_accepted": "✨ Confirmed, processing...",
         "confirm_cancelled": "Operation cancelled",
         
@@ -143,6 +168,10 @@ I18N = {
         "goodbye": "👋 Thank you for using Su-Cli, goodbye!",
         "graceful_exit": "Gracefully exiting Su-Cli...",
         "force_exit": "Force exit...",
+        "run_cancelled": "Run cancelled, the partial answer was kept (press Ctrl+C again at the prompt to exit)",
+        "attachment_full": "📎 Attached {} ({:,} bytes)",
+        "attachment_excerpt": "📎 Attached an excerpt of {} ({:,} bytes)",
+        "attachment_not_found": "⚠️  @{} is not a readable file, sent as plain text",
         "user_label": "USER",
         "assistant_label": "Assistant",
         "processing": "Processing...",
@@ -158,6 +187,45 @@ I18N = {
         "tool_display_enabled": "Tool call results display is now [green]enabled[/green]",
         "tool_display_disabled": "Tool call results display is now [red]disabled[/red]",
         "tool_display_status": "Current status: Tool call results display is {}",
+        
+        # Statistics
+        "stats_title": "📊 Statistics",
+        "trace_title": "⏱️  Trace: {} ({:.0f} ms)",
+        "trace_no_data": "No trace yet, chat with an agent first",
+        "trace_exported": "Trace exported to {} (open it in chrome://tracing or https://ui.perfetto.dev)",
+        "trace_unknown_action": "Unknown /trace argument: {} (use /trace or /trace export)",
+        "trace_col_span": "Span",
+        "trace_col_start": "Start",
+        "trace_col_duration": "Duration",
+        "trace_col_timeline": "Timeline",
+        "trace_col_details": "Details",
+        "stats_tool_cache": "Tool result cache",
+        "stats_llm_cache": "LLM response cache ({} entries)",
+        "stats_semantic_cache": "Semantic response cache",
+        "stats_hedging": "Hedged LLM requests",
+        "stats_routes": "Model routing",
+        "stats_prefix_cache": "Provider prefix cache (this session)",
+        "stats_col_prompt_tokens": "Prompt tokens",
+        "stats_col_cached_tokens": "Cached tokens",
+        "stats_col_route": "Route",
+        "stats_col_model": "Model",
+        "stats_col_turns": "Turns",
+        "stats_col_avg_latency": "Avg latency",
+        "stats_col_max_latency": "Max latency",
+        "stats_col_requests": "Requests",
+        "stats_col_hedged": "Hedged",
+        "stats_col_hedge_wins": "Hedge wins",
+        "stats_col_budget_exhausted": "Over budget",
+        "stats_col_entries": "Entries",
+        "semantic_cache_hit": "♻️  Answered from semantic cache (similar to \"{}\", similarity {:.2f})",
+        "stats_no_data": "No statistics yet, chat with an agent first",
+        "stats_col_tool": "Tool",
+        "stats_col_cache": "Cache",
+        "stats_col_hits": "Hits",
+        "stats_col_misses": "Misses",
+        "stats_col_hit_rate": "Hit rate",
+        "stats_col_saved_time": "Saved time",
+        "stats_col_saved_tokens": "Saved tokens",
     },
     "zh": {
         # Welcome and titles
@@ -189,6 +257,9 @@ I18N = {
   • [green]/lang[/green] - 显示当前语言设置
   • [green]/set_lang <lang>[/green] - 设置语言 (en/zh)
   • [green]/tool[/green] - 切换工具调用结果显示开关
+  • [green]/stats[/green] - 显示性能统计（工具缓存命中率等）
+  • [green]/trace[/green] - 显示上一轮的耗时瀑布图
+  • [green]/trace export[/green] - 以 Chrome trace-event 格式导出最近的几轮
   • [green]show <n>[/green] - 查看第n个工具调用的详细结果
 
 🔧 [yellow]工具结果查看器：[/yellow]
@@ -258,6 +329,7 @@ I18N = {
         # Confirmations
         "confirm_title": "🤔 需要您的确认",
         "confirm_question": "您确认要处理这个请求吗？ (yes/no)",
+        "queued_inputs": "{} 条排队中",
         "confirm_accepted": "✨ 已确认，继续处理中...",
         "confirm_cancelled": "操作已取消",
         
@@ -265,6 +337,10 @@ I18N = {
         "goodbye": "👋 感谢使用 Su-Cli，再见！",
         "graceful_exit": "正在优雅退出 Su-Cli...",
         "force_exit": "强制退出...",
+        "run_cancelled": "已取消本轮运行，保留了已生成的部分回答（在输入提示处再按 Ctrl+C 退出）",
+        "attachment_full": "📎 已附加 {}（{:,} 字节）",
+        "attachment_excerpt": "📎 已附加 {} 的摘录（{:,} 字节）",
+        "attachment_not_found": "⚠️  @{} 不是可读取的文件，按普通文本发送",
         "user_label": "用户",
         "assistant_label": "助手",
         "processing": "正在处理...",
@@ -280,12 +356,51 @@ I18N = {
         "tool_display_enabled": "工具调用结果显示已[green]启用[/green]",
         "tool_display_disabled": "工具调用结果显示已[red]禁用[/red]",
         "tool_display_status": "当前状态：工具调用结果显示{}",
+        
+        # Statistics
+        "stats_title": "📊 统计信息",
+        "trace_title": "⏱️  耗时追踪：{}（{:.0f} ms）",
+        "trace_no_data": "还没有追踪记录，请先与 agent 对话",
+        "trace_exported": "追踪已导出到 {}（可在 chrome://tracing 或 https://ui.perfetto.dev 中打开）",
+        "trace_unknown_action": "未知的 /trace 参数：{}（可用 /trace 或 /trace export）",
+        "trace_col_span": "步骤",
+        "trace_col_start": "开始",
+        "trace_col_duration": "耗时",
+        "trace_col_timeline": "时间线",
+        "trace_col_details": "详情",
+        "stats_tool_cache": "工具结果缓存",
+        "stats_llm_cache": "LLM 响应缓存（{} 条）",
+        "stats_semantic_cache": "语义响应缓存",
+        "stats_hedging": "LLM 请求对冲",
+        "stats_routes": "模型路由",
+        "stats_prefix_cache": "模型服务前缀缓存（本次会话）",
+        "stats_col_prompt_tokens": "输入 tokens",
+        "stats_col_cached_tokens": "命中缓存 tokens",
+        "stats_col_route": "路由",
+        "stats_col_model": "模型",
+        "stats_col_turns": "轮数",
+        "stats_col_avg_latency": "平均耗时",
+        "stats_col_max_latency": "最大耗时",
+        "stats_col_requests": "请求数",
+        "stats_col_hedged": "对冲次数",
+        "stats_col_hedge_wins": "对冲胜出",
+        "stats_col_budget_exhausted": "超出预算",
+        "stats_col_entries": "条目",
+        "semantic_cache_hit": "♻️  来自语义缓存（与 \"{}\" 相似，相似度 {:.2f}）",
+        "stats_no_data": "暂无统计数据，请先与 agent 对话",
+        "stats_col_tool": "工具",
+        "stats_col_cache": "缓存",
+        "stats_col_hits": "命中",
+        "stats_col_misses": "未命中",
+        "stats_col_hit_rate": "命中率",
+        "stats_col_saved_time": "节省时间",
+        "stats_col_saved_tokens": "节省 token",
     }
 }
 
 # 配置常量
 CONFIG = {
-    "LOGGING_LEVEL": logging.WARNING,
+    "LOGGING_LEVEL": logging.WARNING,  # core、httpx、langgraph 等模块的日志级别
     "PROMPT_STYLES": {
         "modern": {"en": "Modern minimalist style (with border)", "zh": "现代简约风格 (带边框)"},
         "minimal": {"en": "Minimal style", "zh": "极简风格"},
@@ -293,42 +408,57 @@ CONFIG = {
         "colorful": {"en": "Colorful style (with icons)", "zh": "彩色风格 (带图标)"}
     },
     "DEFAULT_PROMPT_STYLE": "modern",
+    "INPUT_HISTORY_MAX_ENTRIES": 100000,  # 跨会话保存的输入历史条数上限
     "DEFAULT_LANGUAGE": "en",
     "CONFIRMATION_CHOICES": ["yes", "y", "是", "确认", "no", "n", "否", "取消"],
     "CONFIRMATION_YES": ["yes", "y", "是", "确认"],
-    "EXIT_COMMANDS": ['/exit', '/quit', '/q', 'exit', 'quit'],
-    "HELP_COMMANDS": ['/help', '/h', 'help'],
-    "CLEAR_COMMANDS": ['/clear', 'clear'],
-    "AGENTS_COMMANDS": ['/agents', 'agents'],
-    "HISTORY_COMMANDS": ['/history', 'history'],
-    "RESET_COMMANDS": ['/reset', 'reset'],
-    "STYLE_COMMANDS": ['/style', 'style'],
-    "LANG_COMMANDS": ['/lang', 'lang'],
-    "SHOW_COMMANDS": ['show'],
-    "TOOL_DISPLAY_COMMANDS": ['/tool_display', '/tool'],
+    "EXIT_COMMANDS": COMMAND_TABLE["exit"].aliases,
+    "HELP_COMMANDS": COMMAND_TABLE["help"].aliases,
+    "CLEAR_COMMANDS": COMMAND_TABLE["clear"].aliases,
+    "AGENTS_COMMANDS": COMMAND_TABLE["agents"].aliases,
+    "HISTORY_COMMANDS": COMMAND_TABLE["history"].aliases,
+    "RESET_COMMANDS": COMMAND_TABLE["reset"].aliases,
+    "STYLE_COMMANDS": COMMAND_TABLE["style"].aliases,
+    "LANG_COMMANDS": COMMAND_TABLE["lang"].aliases,
+    "SHOW_COMMANDS": COMMAND_TABLE["show"].aliases,
+    "TOOL_DISPLAY_COMMANDS": COMMAND_TABLE["tool_display"].aliases,
+    "STATS_COMMANDS": COMMAND_TABLE["stats"].aliases,
+    "TRACE_COMMANDS": COMMAND_TABLE["trace"].aliases,
+    "TOOL_MESSAGE_MAX_CHARS": 8000,  # 内存中保留的单条工具输出上限，超出部分转存到磁盘
+    "TOOL_MESSAGE_HEAD_CHARS": 2000,
+    "LOG_LEVEL": "INFO",  # 写入日志文件的级别，可用 --log-level 或 SU_CLI_LOG_LEVEL 环境变量修改
+    "CONTEXT_BUDGET_TOKENS": 24000,  # 每轮发送的历史对话（含摘要和当前输入）的 token 预算
+    "PASTE_INLINE_MAX_CHARS": 2000,  # 超过该长度的粘贴不进入输入框，以占位符代替
+    "ATTACHMENT_BUDGET_TOKENS": 6000,  # 每条消息中粘贴内容和 @path 附件合计的 token 预算
 }
 
-# 设置日志级别和格式
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('su-cli.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# 添加 core 模块到路径
+sys.path.insert(0, str(Path(__file__).parent / "core"))
+
+# 日志经队列由后台线程写入状态目录下轮转的 JSONL 文件，不在事件循环中写磁盘，也不输出到控制台
+from log_setup import configure_logging, set_log_level, stop_logging
+configure_logging(os.getenv("SU_CLI_LOG_LEVEL") or CONFIG["LOG_LEVEL"])
+
 # 设置第三方库的日志级别
 logging.getLogger("core").setLevel(CONFIG["LOGGING_LEVEL"])
 logging.getLogger("httpx").setLevel(CONFIG["LOGGING_LEVEL"])
 logging.getLogger("langgraph").setLevel(CONFIG["LOGGING_LEVEL"])
 
-# 添加 core 模块到路径
-sys.path.insert(0, str(Path(__file__).parent / "core"))
-
 try:
     from core import scanner, scan_agents, get_available_agents, get_valid_agents
+    from output_store import spill_text, load_text
+    from llm_factory import start_warm_up, configure_hedging, get_hedging_stats, close_clients
+    from llm_cache import configure_llm_cache, get_llm_cache_stats
+    from semantic_cache import (get_semantic_cache, get_semantic_cache_stats, has_side_effect_intent,
+                                is_cacheable_turn)
+    from context_budget import ContextBudgeter
+    from prompt_cache import PromptCacheStats
+    from shutdown import shutdown_async, kill_child_processes, register as register_shutdown
+    from input_history import InputHistory
+    from attachments import PasteStore, expand_attachments
+    from tracing import Tracer, TracingCallbackHandler, span_depths
 except ImportError as e:
     logger.error(f"Failed to import core module: {e}")
     sys.exit(1)
@@ -343,13 +473,30 @@ current_language = CONFIG["DEFAULT_LANGUAGE"]
 current_thread_id = str(uuid.uuid4())
 recent_tool_messages = []  # 存储最近的工具调用消息
 is_exiting = False  # 退出状态标志
+main_task: Optional[asyncio.Task] = None  # main() 所在的任务，退出时取消
+exit_started = False  # 退出流程（释放资源）是否已经开始
+current_run_task: Optional[asyncio.Task] = None  # 正在运行的 agent 任务，Ctrl+C 时取消
+input_queue: Optional[asyncio.Queue] = None  # 等待执行的用户输入（agent 运行期间可以继续输入）
+pending_confirmation: Optional[asyncio.Future] = None  # 等待用户确认时，下一行输入作为确认结果
+run_status: Optional[str] = None  # 正在运行的 agent 状态，显示在输入框右侧
+_prompt_sessions: Dict[str, Any] = {}  # 每种提示符风格一个持久的 PromptSession，启动时创建
 show_tool_messages = False  # 控制是否显示工具调用结果的开关
+llm_cache_enabled = False  # --llm-cache：本次运行对所有 agent 启用 LLM 响应缓存
+_agent_graph_cache: Dict[str, Tuple[Any, Optional[Any]]] = {}  # 已加载的 agent graph 缓存
+context_budgeter = ContextBudgeter(CONFIG["CONTEXT_BUDGET_TOKENS"])  # 历史对话的上下文预算
+paste_store = PasteStore(CONFIG["PASTE_INLINE_MAX_CHARS"])  # 本次会话中的大段粘贴
+tracer = Tracer()  # 每轮对话的耗时追踪（/trace 查看）
+tracing_callback = TracingCallbackHandler(tracer)  # 记录 LangGraph 节点、LLM 调用和工具调用的 span
+prompt_cache_stats = PromptCacheStats()  # 本次会话模型服务的前缀缓存命中统计
 
 
 def graceful_exit(signum=None, frame=None):
     """
     优雅退出处理函数
     
+    主任务运行中时取消主任务，由 main() 的 finally 在事件循环中完成退出；
+    否则（例如启动失败后）直接执行退出流程。
+    
     Args:
         signum: 信号编号
         frame: 当前堆栈帧
@@ -359,10 +506,31 @@ def graceful_exit(signum=None, frame=None):
     if is_exiting:
         # 如果已经在退出过程中，强制退出
         console.print(f"\n[red]{t('force_exit')}[/red]")
+        kill_child_processes()
         os._exit(0)
     
     is_exiting = True
     
+    task = main_task
+    if task is not None and not task.done():
+        # 信号处理函数可能在事件循环阻塞于 select 时执行，通过 call_soon_threadsafe 唤醒循环
+        task.get_loop().call_soon_threadsafe(_cancel_main_task, task)
+        return
+    asyncio.run(_exit_gracefully())
+
+
+def _cancel_main_task(task: asyncio.Task):
+    # 主任务已经进入退出流程时不再取消，以免打断资源释放
+    if not exit_started:
+        task.cancel()
+
+
+async def _exit_gracefully():
+    """显示退出动画，在时限内释放资源并结束残留的子进程，写出剩余日志后退出进程"""
+    global is_exiting, exit_started
+    is_exiting = True
+    exit_started = True
+    
     try:
         # 清除当前行并移动光标
         console.print("\n")
@@ -373,9 +541,9 @@ def graceful_exit(signum=None, frame=None):
             colors=["#f093fb", "#f5576c", "#4facfe"]
         )
         
-        # 显示退出提示
+        # 在时限内并行释放 MCP 会话、连接池等资源，并结束残留的子进程
         with console.status(exit_text, spinner="dots2"):
-            time.sleep(1.0)  # 短暂停顿让用户看到提示
+            await shutdown_async()
         
         # 显示告别消息
         goodbye_text = GradientText(
@@ -398,15 +566,74 @@ def graceful_exit(signum=None, frame=None):
         console.print(f"\n{t('goodbye')}")
     
     finally:
-        # 确保程序退出
+        # 写出队列中剩余的日志后退出
+        stop_logging()
+        logging.shutdown()
         os._exit(0)
 
 
+def handle_sigint(signum=None, frame=None):
+    """
+    Ctrl+C 处理函数：agent 正在运行时取消本轮运行，否则优雅退出
+    
+    取消请求已经发出后再按 Ctrl+C 会直接退出。
+    """
+    task = current_run_task
+    if task is None or task.done() or task.cancelling():
+        graceful_exit(signum, frame)
+        return
+    
+    # 信号处理函数可能在事件循环阻塞于 select 时执行，通过 call_soon_threadsafe 唤醒循环
+    task.get_loop().call_soon_threadsafe(task.cancel)
+
+
+async def run_cancellable(coro):
+    """
+    把一次 agent 运行放到可以被 Ctrl+C 取消的任务中执行
+    
+    Returns:
+        协程的返回值；任务在开始执行前就被取消时返回 None
+    """
+    global current_run_task
+    task = asyncio.ensure_future(coro)
+    current_run_task = task
+    try:
+        return await task
+    except asyncio.CancelledError:
+        # 外层任务本身被取消时继续向上传播
+        if asyncio.current_task().cancelling():
+            raise
+        return None
+    finally:
+        current_run_task = None
+
+
+def register_shutdown_resources():
+    """注册退出时需要释放的资源"""
+    register_shutdown("agent run", _cancel_current_run)
+    register_shutdown("agent resources", _close_agent_resources)
+    register_shutdown("llm clients", close_clients)
+
+
+async def _cancel_current_run():
+    """取消正在进行的 agent 运行，让进行中的 MCP 调用结束各自的服务器进程"""
+    task = current_run_task
+    if task is not None and not task.done():
+        task.cancel()
+        await asyncio.wait([task])
+
+
+async def _close_agent_resources():
+    """调用已加载 agent 的 graph 模块提供的 close_resources()"""
+    closers = [getattr(module, "close_resources", None) for _, module in _agent_graph_cache.values()]
+    await asyncio.gather(*(closer() for closer in closers if callable(closer)), return_exceptions=True)
+
+
 def setup_signal_handlers():
     """设置信号处理器"""
     try:
-        # 设置 SIGINT (Ctrl+C) 处理器
-        signal.signal(signal.SIGINT, graceful_exit)
+        # 设置 SIGINT (Ctrl+C) 处理器：取消正在进行的运行或退出
+        signal.signal(signal.SIGINT, handle_sigint)
         
         # 在支持的系统上设置 SIGTERM 处理器
         if hasattr(signal, 'SIGTERM'):
@@ -476,33 +703,6 @@ def set_language(lang: str) -> bool:
     return False
 
 
-def create_beautiful_prompt(agent_name: Optional[str] = None, style: str = "modern") -> str:
-    """
-    创建美观的命令行提示符
-    
-    Args:
-        agent_name: 当前使用的 agent 名称，可为 None
-        style: 提示符风格，支持 modern, minimal, classic, colorful
-    
-    Returns:
-        str: 用户输入的内容，或者退出命令
-    
-    Raises:
-        KeyboardInterrupt: 用户按下 Ctrl+C
-        EOFError: 用户按下 Ctrl+D
-    """
-    try:
-        agent_display = _format_agent_name(agent_name)
-        user_input = _get_styled_input(agent_display, style)
-        
-        return user_input
-        
-    except (KeyboardInterrupt, EOFError):
-        # 如果在输入过程中按下 Ctrl+C，触发优雅退出
-        graceful_exit()
-        return "/exit"
-
-
 def _format_agent_name(agent_name: Optional[str]) -> str:
     """格式化 agent 名称用于显示"""
     if agent_name:
@@ -511,20 +711,6 @@ def _format_agent_name(agent_name: Optional[str]) -> str:
     return "CLI"
 
 
-def _get_styled_input(agent_display: str, style: str) -> str:
-    """根据风格获取用户输入"""
-    if style == "modern":
-        return _get_modern_input(agent_display)
-    elif style == "minimal":
-        return _get_minimal_input(agent_display)
-    elif style == "classic":
-        return _get_classic_input(agent_display)
-    elif style == "colorful":
-        return _get_colorful_input(agent_display)
-    else:
-        return _get_default_input(agent_display)
-
-
 def _get_prompt_text(agent_display: str, style: str) -> str:
     """生成提示符文本"""
     if style == "modern":
@@ -551,176 +737,167 @@ def _get_prompt_text(agent_display: str, style: str) -> str:
         return "SuCli > "
 
 
-def _get_modern_input(agent_display: str) -> str:
-    """现代简约风格输入"""
-    # 首先显示第一行
-    first_line = Text()
-    first_line.append("┌─ ", style="bright_cyan")
-    first_line.append("SuCli", style="bold bright_white")
-    if agent_display != "CLI":
-        first_line.append(" @ ", style="dim")
-        first_line.append(agent_display, style="bright_magenta")
-    first_line.append(" ─┐", style="bright_cyan")
+def _get_prompt_message(style: str):
+    """
+    生成输入框的提示符（每次重绘时调用，切换 agent 后立即生效）
     
-    console.print(first_line)
+    等待用户确认时显示确认问题。
+    """
+    if pending_confirmation is not None:
+        return f"{t('confirm_question')} "
     
-    # 使用自动补全的输入
-    try:
-        if PROMPT_TOOLKIT_AVAILABLE:
-            from prompt_toolkit import prompt
-            from prompt_toolkit.history import InMemoryHistory
-            from prompt_toolkit.styles import Style
-            import nest_asyncio
-            nest_asyncio.apply()
-            
-            # 创建自定义样式，包含自动建议样式
-            style = Style.from_dict(COMPLETION_STYLES)
-            
-            # 获取完整的 prompt 配置
-            config = get_prompt_config()
-            
-            return prompt(
-                "└─ ❯ ", 
-                history=InMemoryHistory(),
-                auto_suggest=config['auto_suggest'],
-                key_bindings=config['key_bindings'],
-                style=style
-            ).strip()
-        else:
-            raise ImportError("prompt_toolkit not available")
-    except (ImportError, RuntimeError):
-        # Fallback 使用 rich prompt
-        from rich.prompt import Prompt
-        return Prompt.ask("└─ ❯ ").strip()
+    agent_display = _format_agent_name(current_agent)
+    if style != "modern":
+        return _get_prompt_text(agent_display, style)
+    
+    # 现代简约风格：带颜色的两行提示符
+    message = [("class:prompt.frame", "┌─ "), ("class:prompt.brand", "SuCli")]
+    if agent_display != "CLI":
+        message += [("class:prompt.at", " @ "), ("class:prompt.agent", agent_display)]
+    message += [("class:prompt.frame", " ─┐\n└─ "), ("", "❯ ")]
+    return message
 
 
-def _get_minimal_input(agent_display: str) -> str:
-    """极简风格输入"""
-    if agent_display != "CLI":
-        prompt_text = f"su:{agent_display.lower()} ❯ "
-    else:
-        prompt_text = "su ❯ "
+def _get_run_status():
+    """在输入框右侧显示 agent 运行状态和排队的输入数，空闲时不显示"""
+    parts = []
+    if run_status:
+        parts.append(f"⏳ {run_status}")
+    if input_queue is not None and input_queue.qsize():
+        parts.append(t("queued_inputs", input_queue.qsize()))
+    return [("class:run-status", "  ·  ".join(parts))] if parts else None
+
+
+def init_prompt_sessions():
+    """
+    为每种提示符风格创建持久的 PromptSession（启动时调用一次）
     
-    try:
-        if PROMPT_TOOLKIT_AVAILABLE:
-            from prompt_toolkit import prompt
-            from prompt_toolkit.history import InMemoryHistory
-            from prompt_toolkit.styles import Style
-            import nest_asyncio
-            nest_asyncio.apply()
-            
-            # 创建自定义样式，包含自动建议样式
-            style = Style.from_dict(COMPLETION_STYLES)
-            
-            # 获取完整的 prompt 配置
-            config = get_prompt_config()
-            
-            return prompt(
-                prompt_text,
-                history=InMemoryHistory(),
-                auto_suggest=config['auto_suggest'],
-                key_bindings=config['key_bindings'],
-                style=style
-            ).strip()
-        else:
-            raise ImportError("prompt_toolkit not available")
-    except (ImportError, RuntimeError):
+    所有会话共用一份保存在状态目录中的输入历史和同一套补全、按键配置，
+    之后每次显示提示符都不再有初始化开销。
+    """
+    if not PROMPT_TOOLKIT_AVAILABLE or _prompt_sessions:
+        return
+    
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.styles import Style
+    
+    history = InputHistory(max_entries=CONFIG["INPUT_HISTORY_MAX_ENTRIES"])
+    set_completer_history_index(history.index)
+    set_paste_handler(paste_store.handle_paste)
+    style = Style.from_dict({**COMPLETION_STYLES, **PROMPT_TEXT_STYLES})
+    # 获取完整的 prompt 配置
+    config = get_prompt_config()
+    
+    for style_name in CONFIG["PROMPT_STYLES"]:
+        _prompt_sessions[style_name] = PromptSession(
+            message=partial(_get_prompt_message, style_name),
+            history=history,
+            completer=config['completer'],
+            complete_while_typing=False,
+            auto_suggest=config['auto_suggest'],
+            key_bindings=config['key_bindings'],
+            style=style,
+            rprompt=_get_run_status,
+            refresh_interval=0.5,
+        )
+
+
+def _get_prompt_session():
+    """获取当前提示符风格的 PromptSession"""
+    return _prompt_sessions.get(prompt_style) or _prompt_sessions[CONFIG["DEFAULT_PROMPT_STYLE"]]
+
+
+async def _prompt_input() -> str:
+    """读取一行用户输入"""
+    if not PROMPT_TOOLKIT_AVAILABLE:
         from rich.prompt import Prompt
-        return Prompt.ask(prompt_text).strip()
+        prompt_text = _get_prompt_text(_format_agent_name(current_agent), prompt_style)
+        return (await asyncio.to_thread(Prompt.ask, prompt_text)).strip()
+    
+    return (await _get_prompt_session().prompt_async()).strip()
 
 
-def _get_classic_input(agent_display: str) -> str:
-    """经典风格输入"""
-    if agent_display != "CLI":
-        prompt_text = f"[SuCli@{agent_display}]$ "
-    else:
-        prompt_text = "[SuCli]$ "
+async def read_inputs():
+    """
+    持续读取用户输入并放入输入队列
     
-    try:
-        if PROMPT_TOOLKIT_AVAILABLE:
-            from prompt_toolkit import prompt
-            from prompt_toolkit.history import InMemoryHistory
-            from prompt_toolkit.styles import Style
-            
-            # 创建自定义样式，包含自动建议样式
-            style = Style.from_dict(COMPLETION_STYLES)
-            
-            # 获取完整的 prompt 配置
-            config = get_prompt_config()
-            
-            return prompt(
-                prompt_text,
-                history=InMemoryHistory(),
-                auto_suggest=config['auto_suggest'],
-                key_bindings=config['key_bindings'],
-                style=style
-            ).strip()
-        else:
-            raise ImportError("prompt_toolkit not available")
-    except ImportError:
-        from rich.prompt import Prompt
-        return Prompt.ask(prompt_text).strip()
+    输入框常驻在屏幕底部，agent 运行期间也可以继续输入下一条消息或命令，
+    它们会在当前轮结束后依次执行。等待确认时，下一行输入作为确认结果。
+    
+    Ctrl+C 取消正在进行的运行或确认，空闲时退出；Ctrl+D 退出。
+    """
+    while not is_exiting:
+        # 没有 prompt_toolkit 时无法在输出的同时输入，等上一条输入处理完再读取
+        if not PROMPT_TOOLKIT_AVAILABLE:
+            await input_queue.join()
+        
+        # 用户输入期间在后台预热 LLM 连接
+        start_warm_up()
+        
+        try:
+            user_input = await _prompt_input()
+        except KeyboardInterrupt:
+            if pending_confirmation is not None and not pending_confirmation.done():
+                pending_confirmation.set_result(None)
+            else:
+                handle_sigint()
+            continue
+        except EOFError:
+            # EOF (Ctrl+D) 也触发优雅退出
+            graceful_exit()
+            return
+        
+        if pending_confirmation is not None and not pending_confirmation.done():
+            pending_confirmation.set_result(user_input)
+        elif user_input:
+            input_queue.put_nowait(user_input)
 
 
-def _get_colorful_input(agent_display: str) -> str:
-    """彩色风格输入"""
-    if agent_display != "CLI":
-        prompt_text = f"🚀 SuCli 🤖 {agent_display} ➤ "
-    else:
-        prompt_text = "🚀 SuCli ➤ "
+async def ask_confirmation() -> Optional[str]:
+    """
+    等待用户输入确认结果
     
-    try:
-        if PROMPT_TOOLKIT_AVAILABLE:
-            from prompt_toolkit import prompt
-            from prompt_toolkit.history import InMemoryHistory
-            from prompt_toolkit.styles import Style
-            
-            # 创建自定义样式，包含自动建议样式
-            style = Style.from_dict(COMPLETION_STYLES)
-            
-            # 获取完整的 prompt 配置
-            config = get_prompt_config()
-            
-            return prompt(
-                prompt_text,
-                history=InMemoryHistory(),
-                auto_suggest=config['auto_suggest'],
-                key_bindings=config['key_bindings'],
-                style=style
-            ).strip()
-        else:
-            raise ImportError("prompt_toolkit not available")
-    except ImportError:
+    Returns:
+        Optional[str]: 用户输入，按 Ctrl+C 取消时返回 None
+    """
+    global pending_confirmation
+    
+    if not PROMPT_TOOLKIT_AVAILABLE:
         from rich.prompt import Prompt
-        return Prompt.ask(prompt_text).strip()
+        return await asyncio.to_thread(
+            Prompt.ask,
+            f"{t('confirm_question')}",
+            choices=CONFIG["CONFIRMATION_CHOICES"],
+            default="yes",
+            show_choices=False
+        )
+    
+    pending_confirmation = asyncio.get_running_loop().create_future()
+    _get_prompt_session().app.invalidate()
+    try:
+        return await pending_confirmation
+    finally:
+        pending_confirmation = None
 
 
-def _get_default_input(agent_display: str) -> str:
-    """默认输入方式"""
+@contextmanager
+def agent_status(text: str):
+    """
+    显示 agent 的运行状态
+    
+    输入框常驻时状态显示在输入框右侧，避免旋转指示器与输入框争用终端；否则显示旋转指示器。
+    """
+    global run_status
+    if not PROMPT_TOOLKIT_AVAILABLE:
+        with console.status(text, spinner="dots"):
+            yield
+        return
+    
+    run_status = Text.from_markup(text).plain
     try:
-        if PROMPT_TOOLKIT_AVAILABLE:
-            from prompt_toolkit import prompt
-            from prompt_toolkit.history import InMemoryHistory
-            from prompt_toolkit.styles import Style
-            
-            # 创建自定义样式，包含自动建议样式
-            style = Style.from_dict(COMPLETION_STYLES)
-            
-            # 获取完整的 prompt 配置
-            config = get_prompt_config()
-            
-            return prompt(
-                "SuCli > ",
-                history=InMemoryHistory(),
-                auto_suggest=config['auto_suggest'],
-                key_bindings=config['key_bindings'],
-                style=style
-            ).strip()
-        else:
-            raise ImportError("prompt_toolkit not available")
-    except ImportError:
-        from rich.prompt import Prompt
-        return Prompt.ask("SuCli > ").strip()
+        yield
+    finally:
+        run_status = None
 
 
 def initialize_agent_system() -> bool:
@@ -728,9 +905,10 @@ def initialize_agent_system() -> bool:
     global available_agents, current_agent
     
     try:
-        agents = scan_agents()
-        # 只获取有效的 agents
-        valid_agents = get_valid_agents()
+        with tracer.span("agent scan"):
+            agents = scan_agents()
+            # 只获取有效的 agents
+            valid_agents = get_valid_agents()
         available_agents = list(valid_agents.keys())
         
         if not available_agents:
@@ -758,15 +936,22 @@ def initialize_agent_system() -> bool:
 def create_message_state(user_input: str, message_history: List[Dict] = None) -> Dict[str, Any]:
     """
     创建符合 Langgraph State 格式的消息状态
+    
+    历史消息只保留上下文预算内最近的几轮，更早的对话以摘要的形式放在 summary 中，
+    由 agent 合并进系统提示
     """
     try:
         from langchain_core.messages import HumanMessage, AIMessage
         
         messages = []
+        summary = None
         
         # 添加历史消息
         if message_history:
-            for msg in message_history:
+            window = context_budgeter.select(message_history, user_input)
+            summary = context_budgeter.summary or None
+            
+            for msg in window:
                 if msg.get("role") == "user":
                     messages.append(HumanMessage(content=msg["content"]))
                 elif msg.get("role") == "assistant":
@@ -777,6 +962,7 @@ def create_message_state(user_input: str, message_history: List[Dict] = None) ->
         
         return {
             "messages": messages,
+            "summary": summary,
             "confirmed": None,
             "user_input": None
         }
@@ -796,29 +982,48 @@ def load_agent_graph(agent_name: str) -> Tuple[Optional[Any], Optional[Any]]:
     """
     加载指定 agent 的 graph 对象
     
+    agent 模块在首次加载后会被缓存，后续轮次复用同一模块，
+    这样模块级的工具、MCP 连接和工具结果缓存可以跨轮次保留。
+    带内存的 graph 每轮重新编译，保持每轮独立的 checkpointer。
+    
     Returns:
         tuple: (graph, graph_with_memory) - 普通graph和带内存的graph
     """
     try:
-        # 加载 agent 模块
-        module = scanner.load_agent_module(agent_name)
-        if not module:
-            return None, None
-        
-        # 获取 graph 对象
-        if not hasattr(module, 'graph'):
-            return None, None
+        cached = _agent_graph_cache.get(agent_name)
+        if cached is None:
+            # 加载 agent 模块
+            with tracer.span("module load", agent=agent_name):
+                module = scanner.load_agent_module(agent_name)
+            if not module:
+                return None, None
+            
+            # 获取 graph 对象
+            if not hasattr(module, 'graph'):
+                return None, None
+            
+            # 尝试导入定义 build_graph_with_memory 的 graph 模块
+            graph_module = None
+            try:
+                agent_info = scanner.get_agent_info(agent_name)
+                if agent_info:
+                    graph_module = _import_graph_module(agent_info)
+            except Exception:
+                pass
+            
+            cached = (module.graph, graph_module)
+            _agent_graph_cache[agent_name] = cached
         
-        graph = module.graph
+        graph, graph_module = cached
         graph_with_memory = None
         
         # 尝试获取带内存的 graph
-        try:
-            agent_info = scanner.get_agent_info(agent_name)
-            if agent_info:
-                graph_with_memory = _build_graph_with_memory(agent_info)
-        except Exception:
-            pass
+        if graph_module is not None and hasattr(graph_module, 'build_graph_with_memory'):
+            try:
+                with tracer.span("graph compile"):
+                    graph_with_memory = graph_module.build_graph_with_memory()
+            except Exception:
+                pass
         
         return graph, graph_with_memory
         
@@ -827,9 +1032,50 @@ def load_agent_graph(agent_name: str) -> Tuple[Optional[Any], Optional[Any]]:
         return None, None
 
 
-def _build_graph_with_memory(agent_info: Dict) -> Optional[Any]:
+def _get_agent_config(agent_name: str) -> Dict[str, Any]:
+    """获取 agent 目录下 config.json 等配置文件的内容"""
+    agent_info = scanner.get_agent_info(agent_name) or {}
+    return agent_info.get("config", {})
+
+
+def _apply_llm_settings(agent_name: str):
+    """
+    应用 agent 的 LLM 设置
+    
+    - 根据 --llm-cache 参数和 agent 配置中的 llmCache 启用或关闭 LLM 响应缓存
+    - 根据 agent 配置中的 llmHedging 设置请求对冲（对之后创建的模型生效）
+    """
+    agent_config = _get_agent_config(agent_name)
+    cache_config = agent_config.get("llmCache", {})
+    try:
+        configure_llm_cache(llm_cache_enabled or cache_config.get("enabled", False), cache_config)
+    except Exception as e:
+        logger.warning(f"配置 LLM 响应缓存失败: {e}")
+    
+    configure_hedging(agent_config.get("llmHedging"))
+
+
+def _get_semantic_cache(agent_name: str):
+    """获取 agent 的语义缓存，agent 配置中未启用 semanticCache 时返回 None"""
+    cache_config = _get_agent_config(agent_name).get("semanticCache", {})
+    if not cache_config.get("enabled"):
+        return None
+    try:
+        return get_semantic_cache(agent_name, cache_config)
+    except Exception as e:
+        logger.warning(f"加载语义缓存失败: {e}")
+        return None
+
+
+def get_agent_graph_module(agent_name: str) -> Optional[Any]:
+    """获取已加载 agent 的 graph 模块，未加载时返回 None"""
+    cached = _agent_graph_cache.get(agent_name)
+    return cached[1] if cached else None
+
+
+def _import_graph_module(agent_info: Dict) -> Optional[Any]:
     """
-    构建带内存的 graph 对象
+    导入 agent 的 graph 模块（用于构建带内存的 graph）
     """
     agent_path = scanner.project_root / agent_info["path"]
     src_path = agent_path / "src"
@@ -883,12 +1129,8 @@ def _build_graph_with_memory(agent_info: Dict) -> Optional[Any]:
             if mod in sys.modules:
                 del sys.modules[mod]
         
-        # 尝试导入模块并查找 build_graph_with_memory 函数
-        graph_module = importlib.import_module(module_path)
-        if hasattr(graph_module, 'build_graph_with_memory'):
-            return graph_module.build_graph_with_memory()
-        
-        return None
+        # 导入模块，由调用方查找 build_graph_with_memory 函数
+        return importlib.import_module(module_path)
         
     except Exception:
         return None
@@ -898,22 +1140,63 @@ def _build_graph_with_memory(agent_info: Dict) -> Optional[Any]:
         os.chdir(original_cwd)
 
 
+# 文件工具参数中表示路径的字段
+PATH_ARGUMENT_KEYS = ("path", "paths", "source", "destination")
+
+
+def _tool_call_paths(tool_calls) -> List[str]:
+    """从 AI 消息的工具调用参数中取出文件路径（供 @path 补全）"""
+    paths = []
+    for tool_call in tool_calls or []:
+        args = tool_call.get("args") or {}
+        for key in PATH_ARGUMENT_KEYS:
+            value = args.get(key)
+            if isinstance(value, str):
+                paths.append(value)
+            elif isinstance(value, list):
+                paths.extend(item for item in value if isinstance(item, str))
+    return paths
+
+
+def _result_paths(content: str) -> List[str]:
+    """从 search_files 的结果中取出文件路径（每行一个绝对路径）"""
+    return [line.strip() for line in content.splitlines() if os.path.isabs(line.strip())]
+
+
+def _refresh_completer_tools():
+    """用当前 Agent 已加载的工具名称更新补全索引（工具列表没有变化时不重建）"""
+    graph_module = get_agent_graph_module(current_agent) if current_agent else None
+    get_tool_names = getattr(graph_module, "get_tool_names", None)
+    if callable(get_tool_names):
+        update_completer_tools(get_tool_names())
+
+
 async def process_stream_chunks(graph, state, config):
     """
     处理流式响应的数据块，区分不同role的消息
     
+    同时订阅 messages 流逐 token 累积回答，运行被 Ctrl+C 取消时保留已生成的部分。
+    
     Returns:
-        tuple: (full_response, current_interrupt, tool_messages)
+        tuple: (full_response, current_interrupt, tool_messages, cancelled)
     """
     full_response = ""
+    partial_response = ""
     current_interrupt = None
     tool_messages = []
+    cancelled = False
     
     try:
-        async for chunk in graph.astream(state, config=config):
+        async for mode, chunk in graph.astream(state, config=config, stream_mode=["updates", "messages"]):
             # 检查是否正在退出
             if is_exiting:
                 break
+            
+            if mode == "messages":
+                message_chunk = chunk[0]
+                if getattr(message_chunk, "type", None) == "AIMessageChunk" and isinstance(message_chunk.content, str):
+                    partial_response += message_chunk.content
+                continue
                 
             # 检查是否有中断
             if '__interrupt__' in chunk:
@@ -954,25 +1237,46 @@ async def process_stream_chunks(graph, state, config):
                             message_role = message.get('role', 'unknown')
                             message_content = message.get('content', '')
                         
+                        if message_role == 'ai':
+                            prompt_cache_stats.record(message)
+                            add_completer_paths(_tool_call_paths(getattr(message, 'tool_calls', None)))
+                        
                         if message_content:
                             # 只有 user 和 assistant 的消息加入主响应
                             if message_role in ['user', 'assistant', 'ai', 'human']:
                                 full_response += message_content
-                            # tool 和 function 消息单独收集
+                            # tool 和 function 消息单独收集，过大的输出只保留开头，完整内容转存到磁盘
                             elif message_role in ['tool', 'function']:
+                                if not isinstance(message_content, str):
+                                    message_content = str(message_content)
+                                if getattr(message, 'name', None) == 'search_files':
+                                    add_completer_paths(_result_paths(message_content))
+                                content, handle = spill_text(
+                                    message_content,
+                                    CONFIG["TOOL_MESSAGE_MAX_CHARS"],
+                                    CONFIG["TOOL_MESSAGE_HEAD_CHARS"]
+                                )
                                 tool_messages.append({
                                     'role': message_role,
-                                    'content': message_content,
+                                    'name': getattr(message, 'name', None),
+                                    'duration_ms': getattr(message, 'response_metadata', {}).get('duration_ms'),
+                                    'content': content,
+                                    'size': len(message_content),
+                                    'handle': handle,
                                     'node': node_name
                                 })
+    except asyncio.CancelledError:
+        # 本轮运行被取消：HTTP 流和进行中的工具调用随任务一起取消，保留已生成的回答
+        cancelled = True
+        full_response = max(full_response, partial_response, key=len)
     except Exception as e:
         logger.error(f"处理流式响应时发生错误: {e}", exc_info=True)
         raise
     
-    return full_response, current_interrupt, tool_messages
+    return full_response, current_interrupt, tool_messages, cancelled
 
 
-def handle_user_interrupt(interrupt_data) -> Optional[str]:
+async def handle_user_interrupt(interrupt_data) -> Optional[str]:
     """
     处理用户中断确认
     
@@ -1000,48 +1304,18 @@ def handle_user_interrupt(interrupt_data) -> Optional[str]:
     ))
     console.print()
     
-    # 获取用户输入 - 使用 prompt_toolkit 支持中文输入
-    try:
-        try:
-            from prompt_toolkit.shortcuts import confirm
-            result = confirm(f"{t('confirm_question')}", default=True)
-            if result:
-                console.print(f"✨ {t('confirm_accepted')}")
-                console.print()
-                return "[ACCEPTED]"
-            else:
-                return "[REJECTED]"
-        except ImportError:
-            # Fallback 手动输入
-            try:
-                from prompt_toolkit import prompt
-                from prompt_toolkit.history import InMemoryHistory
-                user_confirmation = prompt(
-                    f"{t('confirm_question')} ",
-                    history=InMemoryHistory()
-                ).strip().lower()
-            except ImportError:
-                # 最终 fallback 使用 rich prompt
-                from rich.prompt import Prompt
-                user_confirmation = Prompt.ask(
-                    f"{t('confirm_question')}",
-                    choices=CONFIG["CONFIRMATION_CHOICES"],
-                    default="yes",
-                    show_choices=False
-                ).strip().lower()
-            
-            # 标准化用户输入
-            if user_confirmation in CONFIG["CONFIRMATION_YES"]:
-                console.print(f"✨ {t('confirm_accepted')}")
-                console.print()
-                return "[ACCEPTED]"
-            else:
-                return "[REJECTED]"
-            
-    except (KeyboardInterrupt, EOFError):
-        # 在确认过程中按下 Ctrl+C，触发优雅退出
-        graceful_exit()
+    # 确认结果从常驻的输入框读取，直接回车视为确认
+    user_confirmation = await ask_confirmation()
+    if user_confirmation is None:
         return None
+    
+    # 标准化用户输入
+    user_confirmation = user_confirmation.strip().lower()
+    if not user_confirmation or user_confirmation in CONFIG["CONFIRMATION_YES"]:
+        console.print(f"✨ {t('confirm_accepted')}")
+        console.print()
+        return "[ACCEPTED]"
+    return "[REJECTED]"
 
 
 async def resume_after_interrupt(graph_with_memory, user_confirmation: str, config: Dict) -> str:
@@ -1216,16 +1490,24 @@ def display_tool_messages_summary(tool_messages: List[Dict[str, Any]]):
         msg = tool_messages[0]
         content_preview = msg['content'][:50] + "..." if len(msg['content']) > 50 else msg['content']
         console.print(f"🔧 检测到 1 个工具调用结果")
-        console.print(f"  📦 {msg.get('node', 'unknown')} ({len(msg['content'])} 字符) - 输入 'show 1' 查看详细结果")
+        console.print(f"  📦 {_format_tool_summary(msg)} - 输入 'show 1' 查看详细结果")
     else:
         console.print(f"🔧 检测到 {total_count} 个工具调用结果")
         for node, messages in tool_groups.items():
             for idx, (msg_num, msg) in enumerate(messages):
-                console.print(f"  📦 {node} ({len(msg['content'])} 字符) - 输入 'show {msg_num}' 查看详细结果")
+                console.print(f"  📦 {_format_tool_summary(msg)} - 输入 'show {msg_num}' 查看详细结果")
     
     console.print()
 
 
+def _format_tool_summary(msg: Dict[str, Any]) -> str:
+    """格式化单个工具消息的摘要：工具名、大小和耗时"""
+    details = f"{msg.get('size', len(msg['content']))} 字符"
+    if msg.get('duration_ms') is not None:
+        details += f", {msg['duration_ms']:.0f} ms"
+    return f"{msg.get('name') or msg.get('node', 'unknown')} ({details})"
+
+
 def show_tool_message(index: int):
     """
     显示指定索引的工具消息详细内容
@@ -1253,6 +1535,10 @@ def show_tool_message(index: int):
     
     content = msg['content']
     
+    # 转存到磁盘的输出按需读回完整内容
+    if msg.get('handle'):
+        content = load_text(msg['handle']) or content
+    
     # 尝试格式化JSON内容
     try:
         import json
@@ -1300,7 +1586,19 @@ def _display_plain_text(text: str):
 async def stream_agent_response(user_input: str) -> Optional[str]:
     """
     流式调用 agent 并处理响应，支持中断功能
+
+    每轮的各个步骤记录为一组 span，/trace 显示上一轮的耗时瀑布图。
     """
+    label = user_input if len(user_input) <= 40 else user_input[:40] + "…"
+    tracer.start_turn(label)
+    try:
+        return await _stream_agent_response(user_input)
+    finally:
+        tracer.end_turn()
+
+
+async def _stream_agent_response(user_input: str) -> Optional[str]:
+    """执行一轮对话"""
     global current_agent, conversation_history, current_thread_id
     
     if not current_agent:
@@ -1308,14 +1606,43 @@ async def stream_agent_response(user_input: str) -> Optional[str]:
         return None
     
     # 加载 agent 的 graph 对象
-    graph, graph_with_memory = load_agent_graph(current_agent)
+    with tracer.span("graph load", agent=current_agent):
+        graph, graph_with_memory = load_agent_graph(current_agent)
     if not graph:
         console.print(f"❌ [red]{t('error_agent_load', current_agent)}[/red]")
         return None
     
-    # 构造输入状态和配置
-    state = create_message_state(user_input, conversation_history)
-    config = {"configurable": {"thread_id": current_thread_id}}
+    # 按运行参数和 agent 配置启用 LLM 响应缓存和请求对冲
+    _apply_llm_settings(current_agent)
+    
+    # 展开大段粘贴和 @path 附件（只放入预算内的摘录），读取文件不占用事件循环
+    with tracer.span("attachments"):
+        message_input, attachments, unresolved = await asyncio.to_thread(
+            expand_attachments, user_input, paste_store, CONFIG["ATTACHMENT_BUDGET_TOKENS"]
+        )
+    for attachment in attachments:
+        key = "attachment_full" if attachment.complete else "attachment_excerpt"
+        console.print(f"[dim]{t(key, escape(attachment.name), attachment.size)}[/dim]")
+    for name in unresolved:
+        console.print(f"[yellow]{t('attachment_not_found', escape(name))}[/yellow]")
+    
+    # 新对话的第一个问题先查语义缓存，相近的问题直接返回之前的回答（带附件的问题不使用缓存）
+    # 有副作用的请求（删除、移动等）必须真正执行，不从缓存回答
+    use_semantic_cache = not conversation_history and not attachments and not has_side_effect_intent(user_input)
+    semantic_cache = _get_semantic_cache(current_agent) if use_semantic_cache else None
+    if semantic_cache is not None:
+        hit = semantic_cache.lookup(user_input)
+        if hit is not None:
+            console.print(f"[dim]{t('semantic_cache_hit', escape(hit.prompt), hit.similarity)}[/dim]")
+            display_agent_response(hit.answer, current_agent)
+            conversation_history.append({"role": "user", "content": user_input})
+            conversation_history.append({"role": "assistant", "content": hit.answer})
+            return hit.answer
+    
+    # 构造输入状态和配置，回调为 LangGraph 节点、LLM 调用和工具调用记录 span
+    with tracer.span("state construction"):
+        state = create_message_state(message_input, conversation_history)
+    config = {"configurable": {"thread_id": current_thread_id}, "callbacks": [tracing_callback]}
     
     # 选择合适的 graph：如果有支持 checkpointer 的版本，优先使用它
     target_graph = graph_with_memory if graph_with_memory is not None else graph
@@ -1324,46 +1651,60 @@ async def stream_agent_response(user_input: str) -> Optional[str]:
     full_response = ""
     current_interrupt = None
     
-    with console.status(f"[cyan]{current_agent}[/cyan] {t('agent_thinking', current_agent)}", spinner="dots"):
+    with agent_status(f"[cyan]{current_agent}[/cyan] {t('agent_thinking', current_agent)}"):
         try:
-            # 处理流式响应
-            full_response, current_interrupt, tool_messages = await process_stream_chunks(
-                target_graph, state, config
-            )
+            # 处理流式响应，运行期间按 Ctrl+C 可以取消
+            with tracer.span("agent run", agent=current_agent):
+                result = await run_cancellable(process_stream_chunks(target_graph, state, config))
         except Exception as invoke_error:
             logger.error(t("error_agent_call", invoke_error), exc_info=True)
             console.print(f"❌ [red]{t('error_agent_call', invoke_error)}[/red]")
             return None
     
+    full_response, current_interrupt, tool_messages, cancelled = result or ("", None, [], True)
+    _refresh_completer_tools()
+    if cancelled:
+        console.print(f"⏹️  [yellow]{t('run_cancelled')}[/yellow]")
+        current_interrupt = None
+    
     # 处理中断情况
     if current_interrupt:
         interrupt_data = current_interrupt.value
-        user_confirmation = handle_user_interrupt(interrupt_data)
+        with tracer.span("confirmation"):
+            user_confirmation = await handle_user_interrupt(interrupt_data)
         
         if user_confirmation is None:
             return None
         
         # 恢复执行
-        with console.status(f"[cyan]{current_agent}[/cyan] {t('agent_processing', current_agent)}", spinner="dots"):
-            resume_response = await resume_after_interrupt(
-                graph_with_memory, user_confirmation, config
-            )
+        with agent_status(f"[cyan]{current_agent}[/cyan] {t('agent_processing', current_agent)}"):
+            with tracer.span("agent resume", agent=current_agent):
+                resume_response = await run_cancellable(resume_after_interrupt(
+                    graph_with_memory, user_confirmation, config
+                ))
             if resume_response:
                 full_response = resume_response
     
     # 显示响应并更新历史
     if full_response:
-        display_agent_response(full_response, current_agent)
-        
-        # 处理工具消息
-        global recent_tool_messages
-        recent_tool_messages = tool_messages
-        # 工具调用结果显示开关控制 (使用 /tool 命令切换显示状态)
-        if tool_messages and show_tool_messages:
-            display_tool_messages_summary(tool_messages)
-        
-        # 添加到对话历史
-        conversation_history.append({"role": "user", "content": user_input})
+        with tracer.span("render"):
+            display_agent_response(full_response, current_agent)
+            
+            # 处理工具消息
+            global recent_tool_messages
+            recent_tool_messages = tool_messages
+            # 工具调用结果显示开关控制 (使用 /tool 命令切换显示状态)
+            if tool_messages and show_tool_messages:
+                display_tool_messages_summary(tool_messages)
+        
+        # 没有产生副作用的轮次写入语义缓存
+        if semantic_cache is not None and not current_interrupt and not cancelled:
+            safe_tools = _get_agent_config(current_agent).get("semanticCache", {}).get("safeTools", [])
+            if is_cacheable_turn((msg.get('name') for msg in tool_messages), safe_tools):
+                semantic_cache.add(user_input, full_response)
+        
+        # 添加到对话历史（附件摘录随消息保留，后续轮次仍可引用）
+        conversation_history.append({"role": "user", "content": message_input})
         conversation_history.append({"role": "assistant", "content": full_response})
     
     return full_response
@@ -1479,7 +1820,7 @@ async def handle_command(command: str) -> bool:
         return True
         
     if command.lower() in CONFIG["EXIT_COMMANDS"]:
-        console.print(f"\n{t('goodbye')}")
+        # 由 main() 的 finally 统一完成退出
         return False
     elif command.lower() in CONFIG["HELP_COMMANDS"]:
         _show_help()
@@ -1504,6 +1845,12 @@ async def handle_command(command: str) -> bool:
         _show_language()
     elif command.lower() in CONFIG["TOOL_DISPLAY_COMMANDS"]:
         _toggle_tool_display()
+    elif command.lower() in CONFIG["STATS_COMMANDS"]:
+        _show_stats()
+    elif command.lower() in CONFIG["TRACE_COMMANDS"]:
+        _show_trace()
+    elif command.lower().startswith('/trace '):
+        _show_trace(command[7:].strip().lower())
     elif command.lower().startswith('show '):
         # 处理show命令
         try:
@@ -1587,6 +1934,7 @@ def _reset_conversation():
     global conversation_history, current_thread_id
     
     conversation_history.clear()
+    context_budgeter.reset()
     current_thread_id = str(uuid.uuid4())
     console.print(f"🔄 [green]{t('history_reset')}[/green]")
 
@@ -1667,54 +2015,305 @@ def _toggle_tool_display():
     console.print(f"💡 {t('tool_display_status', status)}")
 
 
+def _show_stats():
+    """显示性能统计信息"""
+    graph_module = get_agent_graph_module(current_agent) if current_agent else None
+    get_cache_stats = getattr(graph_module, "get_tool_cache_stats", None)
+    cache_stats = get_cache_stats() if callable(get_cache_stats) else {}
+    llm_cache_stats = get_llm_cache_stats()
+    semantic_cache_stats = get_semantic_cache_stats()
+    hedging_stats = get_hedging_stats()
+    get_routes = getattr(graph_module, "get_route_stats", None)
+    route_stats = get_routes() if callable(get_routes) else {}
+    prefix_cache_stats = prompt_cache_stats.get_stats()
+    
+    sections = []
+    if cache_stats:
+        sections.append(_build_tool_cache_table(cache_stats))
+    if llm_cache_stats:
+        sections.append(_build_llm_cache_table(llm_cache_stats))
+    if semantic_cache_stats:
+        sections.append(_build_semantic_cache_table(semantic_cache_stats))
+    if hedging_stats:
+        sections.append(_build_hedging_table(hedging_stats))
+    if route_stats:
+        sections.append(_build_route_table(route_stats))
+    if prefix_cache_stats["requests"]:
+        sections.append(_build_prefix_cache_table(prefix_cache_stats))
+    
+    if not sections:
+        console.print(f"📊 [yellow]{t('stats_no_data')}[/yellow]")
+        return
+    
+    console.print(Panel.fit(Group(*sections), title=t("stats_title"), border_style="cyan"))
+
+
+# 瀑布图中各类 span 的颜色
+TRACE_CATEGORY_STYLES = {"turn": "bold white", "cli": "cyan", "node": "magenta", "llm": "green", "tool": "yellow"}
+TRACE_BAR_WIDTH = 40
+
+
+def _show_trace(action: str = ""):
+    """显示上一轮的耗时瀑布图，或导出 Chrome trace"""
+    if action == "export":
+        if not tracer.turns:
+            console.print(f"⏱️  [yellow]{t('trace_no_data')}[/yellow]")
+            return
+        path = tracer.export_chrome_trace()
+        console.print(f"✅ [green]{t('trace_exported', path)}[/green]")
+        return
+    if action:
+        console.print(f"❌ [red]{t('trace_unknown_action', escape(action))}[/red]")
+        return
+    
+    turn = tracer.last_turn
+    if turn is None:
+        console.print(f"⏱️  [yellow]{t('trace_no_data')}[/yellow]")
+        return
+    console.print(_build_trace_table(turn))
+
+
+def _build_trace_table(turn) -> Table:
+    """构建一轮对话的耗时瀑布图"""
+    root = turn.root
+    total_us = max(root.end_us - root.start_us, 1)
+    depths = span_depths(turn.spans)
+    
+    table = Table(title=t("trace_title", escape(turn.label), total_us / 1000), box=ROUNDED, border_style="cyan")
+    table.add_column(t("trace_col_span"))
+    table.add_column(t("trace_col_start"), justify="right", style="dim")
+    table.add_column(t("trace_col_duration"), justify="right")
+    table.add_column(t("trace_col_timeline"), no_wrap=True)
+    table.add_column(t("trace_col_details"), style="dim")
+    
+    for span in sorted(turn.spans, key=lambda s: s.start_us):
+        style = TRACE_CATEGORY_STYLES.get(span.category, "white")
+        offset = min((span.start_us - root.start_us) * TRACE_BAR_WIDTH // total_us, TRACE_BAR_WIDTH - 1)
+        length = max(1, round((span.end_us - span.start_us) * TRACE_BAR_WIDTH / total_us))
+        bar = Text(" " * offset)
+        bar.append("█" * min(length, TRACE_BAR_WIDTH - offset), style=style)
+        
+        details = []
+        if span.attrs.get("model"):
+            details.append(str(span.attrs["model"]))
+        if "ttft_ms" in span.attrs:
+            details.append(f"TTFT {span.attrs['ttft_ms']:.0f} ms")
+        if span.attrs.get("input_tokens"):
+            details.append(f"{span.attrs['input_tokens']}→{span.attrs.get('output_tokens', 0)} tokens")
+        if span.attrs.get("error"):
+            details.append(f"[red]{escape(str(span.attrs['error']))}[/red]")
+        if span.attrs.get("unfinished"):
+            details.append("[yellow]unfinished[/yellow]")
+        
+        table.add_row(
+            Text("  " * depths[span.span_id] + span.name, style=style),
+            f"{(span.start_us - root.start_us) / 1000:.0f} ms",
+            f"{span.duration_ms:.1f} ms",
+            bar,
+            ", ".join(details),
+        )
+    
+    return table
+
+
+def _build_tool_cache_table(cache_stats: Dict[str, Dict[str, Any]]) -> Table:
+    """构建工具结果缓存统计表"""
+    table = Table(title=t("stats_tool_cache"), box=ROUNDED, border_style="cyan")
+    table.add_column(t("stats_col_tool"), style="cyan")
+    table.add_column(t("stats_col_hits"), justify="right")
+    table.add_column(t("stats_col_misses"), justify="right")
+    table.add_column(t("stats_col_hit_rate"), justify="right", style="green")
+    table.add_column(t("stats_col_saved_time"), justify="right")
+    table.add_column(t("stats_col_saved_tokens"), justify="right")
+    
+    for tool_name, stats in cache_stats.items():
+        table.add_row(
+            tool_name,
+            str(stats["hits"]),
+            str(stats["misses"]),
+            f"{stats['hit_rate']:.0%}",
+            f"{stats['saved_seconds'] * 1000:.0f} ms",
+            str(stats["saved_tokens"]),
+        )
+    
+    return table
+
+
+def _build_llm_cache_table(stats: Dict[str, Any]) -> Table:
+    """构建 LLM 响应缓存统计表"""
+    table = Table(title=t("stats_llm_cache", stats["entries"]), box=ROUNDED, border_style="cyan")
+    table.add_column(t("stats_col_cache"), style="cyan")
+    table.add_column(t("stats_col_hits"), justify="right")
+    table.add_column(t("stats_col_misses"), justify="right")
+    table.add_column(t("stats_col_hit_rate"), justify="right", style="green")
+    table.add_row("llm", str(stats["hits"]), str(stats["misses"]), f"{stats['hit_rate']:.0%}")
+    return table
+
+
+def _build_hedging_table(stats: Dict[str, Any]) -> Table:
+    """构建 LLM 请求对冲统计表"""
+    table = Table(title=t("stats_hedging"), box=ROUNDED, border_style="cyan")
+    table.add_column(t("stats_col_requests"), justify="right")
+    table.add_column(t("stats_col_hedged"), justify="right")
+    table.add_column(t("stats_col_hedge_wins"), justify="right", style="green")
+    table.add_column(t("stats_col_budget_exhausted"), justify="right")
+    table.add_row(
+        str(stats["requests"]),
+        str(stats["hedged"]),
+        str(stats["hedge_wins"]),
+        str(stats["budget_exhausted"]),
+    )
+    return table
+
+
+def _build_route_table(route_stats: Dict[str, Dict[str, Any]]) -> Table:
+    """构建模型路由统计表"""
+    table = Table(title=t("stats_routes"), box=ROUNDED, border_style="cyan")
+    table.add_column(t("stats_col_route"), style="cyan")
+    table.add_column(t("stats_col_model"))
+    table.add_column(t("stats_col_turns"), justify="right")
+    table.add_column(t("stats_col_avg_latency"), justify="right", style="green")
+    table.add_column(t("stats_col_max_latency"), justify="right")
+    for route, stats in route_stats.items():
+        table.add_row(
+            route,
+            str(stats["model"]),
+            str(stats["turns"]),
+            f"{stats['avg_latency']:.2f} s",
+            f"{stats['max_latency']:.2f} s",
+        )
+    return table
+
+
+def _build_semantic_cache_table(cache_stats: Dict[str, Dict[str, Any]]) -> Table:
+    """构建语义缓存统计表（按 agent）"""
+    table = Table(title=t("stats_semantic_cache"), box=ROUNDED, border_style="cyan")
+    table.add_column("Agent", style="cyan")
+    table.add_column(t("stats_col_entries"), justify="right")
+    table.add_column(t("stats_col_hits"), justify="right")
+    table.add_column(t("stats_col_misses"), justify="right")
+    table.add_column(t("stats_col_hit_rate"), justify="right", style="green")
+    for agent_name, stats in cache_stats.items():
+        table.add_row(
+            agent_name,
+            str(stats["entries"]),
+            str(stats["hits"]),
+            str(stats["misses"]),
+            f"{stats['hit_rate']:.0%}",
+        )
+    return table
+
+
+def _build_prefix_cache_table(stats: Dict[str, Any]) -> Table:
+    """构建模型服务前缀缓存统计表"""
+    table = Table(title=t("stats_prefix_cache"), box=ROUNDED, border_style="cyan")
+    table.add_column(t("stats_col_requests"), justify="right")
+    table.add_column(t("stats_col_prompt_tokens"), justify="right")
+    table.add_column(t("stats_col_cached_tokens"), justify="right")
+    table.add_column(t("stats_col_hit_rate"), justify="right", style="green")
+    table.add_row(
+        str(stats["requests"]),
+        str(stats["prompt_tokens"]),
+        str(stats["cached_tokens"]),
+        f"{stats['hit_ratio']:.0%}",
+    )
+    return table
+
+
 async def main():
     """主函数"""
+    global main_task
+    main_task = asyncio.current_task()
     
-    # 设置信号处理器
+    # 设置信号处理器和退出时需要释放的资源
     setup_signal_handlers()
+    register_shutdown_resources()
     
     # 显示欢迎界面
     create_welcome_screen()
     
-    # 初始化 agent 系统
+    # 初始化 agent 系统（启动过程也记录一份追踪）
+    tracer.start_turn("startup")
     if not initialize_agent_system():
         console.print(f"⚠️ [yellow]{t('system_init_warning')}[/yellow]")
+    tracer.end_turn()
     
     console.print()
     
-    # 主循环 - 处理用户输入
-    while True and not is_exiting:
+    # 输入框常驻底部，输出显示在输入框上方
+    global input_queue
+    input_queue = asyncio.Queue()
+    init_prompt_sessions()
+    if PROMPT_TOOLKIT_AVAILABLE:
+        from prompt_toolkit.patch_stdout import patch_stdout
+        output_context = patch_stdout(raw=True)
+    else:
+        output_context = nullcontext()
+    
+    with output_context:
+        reader = asyncio.create_task(read_inputs())
+        try:
+            await _process_inputs()
+        except asyncio.CancelledError:
+            # graceful_exit() 取消了主任务，继续在下面完成退出
+            main_task.uncancel()
+        except Exception as e:
+            logger.error(f"程序异常退出: {e}", exc_info=True)
+            console.print(f"❌ [red]程序异常退出: {e}[/red]")
+        finally:
+            reader.cancel()
+            # 所有退出方式（退出命令、Ctrl+C、Ctrl+D、SIGTERM）都在这里释放资源并退出
+            await _exit_gracefully()
+
+
+async def _process_inputs():
+    """主循环 - 按顺序处理输入队列中的消息和命令"""
+    while not is_exiting:
+        user_input = await input_queue.get()
         try:
-            # 使用美观的命令行提示符
-            user_input = create_beautiful_prompt(current_agent, prompt_style)
-            
             # 检查是否正在退出
             if is_exiting:
                 break
             
-            # 处理退出命令
-            if user_input in ["/exit", "/q"]:
-                graceful_exit()
-                break
-            
-            # 处理命令
+            # 处理命令（退出命令返回 False）
             should_continue = await handle_command(user_input)
             if not should_continue:
                 break
                 
-        except EOFError:
-            # EOF (Ctrl+D) 也触发优雅退出
-            graceful_exit()
-            break
         except Exception as e:
             # 处理其他意外错误
             if not is_exiting:
                 logger.error(f"主循环发生错误: {e}", exc_info=True)
                 console.print(f"❌ [red]发生错误: {e}[/red]")
                 console.print("[yellow]程序继续运行，如需退出请按 Ctrl+C[/yellow]")
+        finally:
+            input_queue.task_done()
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="Su-Cli")
+    parser.add_argument(
+        "--llm-cache",
+        action="store_true",
+        help="本次运行对所有 agent 启用 LLM 响应缓存（相同请求直接重放缓存的响应）",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        type=str.upper,
+        help="写入日志文件的级别（默认 INFO）",
+    )
+    return parser.parse_args()
+
 
 def run_main():
     """运行主函数的包装器"""
+    global llm_cache_enabled
+    args = parse_args()
+    llm_cache_enabled = args.llm_cache
+    if args.log_level:
+        set_log_level(args.log_level)
+    
     try:
         asyncio.run(main())
     except Exception as e:
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+自动补全命令表测试
+检查 main.py 的 CONFIG 中每个命令都能被补全，带参数的命令能补全参数
+"""
+
+import ast
+import sys
+from pathlib import Path
+
+# 添加项目路径到 sys.path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+from autocomplete import COMMANDS, COMMAND_ARGUMENTS, parse_input
+from commands import COMMAND_TABLE
+
+
+def _config_commands() -> dict:
+    """读取 main.py 中 CONFIG 的 *_COMMANDS（main.py 依赖 rich，这里不直接导入）"""
+    tree = ast.parse((project_root / "main.py").read_text(encoding="utf-8"))
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(target, "id", None) == "CONFIG" for target in node.targets):
+            return {
+                key.value: eval(compile(ast.Expression(value), "main.py", "eval"), {"COMMAND_TABLE": COMMAND_TABLE})
+                for key, value in zip(node.value.keys, node.value.values)
+                if isinstance(key, ast.Constant) and key.value.endswith("_COMMANDS")
+            }
+    raise AssertionError("main.py 中没有找到 CONFIG")
+
+
+def test_every_config_command_is_completed():
+    config_commands = _config_commands()
+    assert "EXIT_COMMANDS" in config_commands and "TOOL_DISPLAY_COMMANDS" in config_commands
+    for name, commands in config_commands.items():
+        for command in commands:
+            assert command in COMMANDS, f"{name}: {command}"
+
+
+def test_argument_commands():
+    for command, argument in COMMAND_ARGUMENTS.items():
+        assert command in COMMANDS
+        text = command + " "
+        assert parse_input(text, len(text)).type == argument, command
+
+
+if __name__ == "__main__":
+    test_every_config_command_is_completed()
+    test_argument_commands()
+    print("✅ 自动补全命令表测试通过")